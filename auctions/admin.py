@@ -1,9 +1,98 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import User, ListingModel, BidModel, CommentModel
+from django.utils.translation import gettext_lazy as _
 
-# Register your models here.
+from .cache import invalidate_updated_listings
+from .models import (User, ListingModel, BidModel, BidIncrementModel,
+                     CommentModel, ProxyBidModel, ApiTokenModel)
+from .pagination import EstimatedCountPaginator
+
+# Changelists: related objects are joined (list_select_related), foreign
+# keys are picked by autocomplete (search_fields of related admin) and
+# big tables aren't counted twice (show_full_result_count).
 admin.site.register(User, UserAdmin)
-admin.site.register(ListingModel)
-admin.site.register(BidModel)
-admin.site.register(CommentModel)
+
+
+@admin.register(ListingModel)
+class ListingAdmin(admin.ModelAdmin):
+    list_display = ('title', 'seller', 'category', 'condition',
+                    'current_price', 'bid_count', 'end_datetime', 'closed')
+    list_select_related = ('seller',)
+    # Indexed columns (listing_category_idx, listing_closed_end_idx)
+    list_filter = ('closed', 'category', 'condition')
+    search_fields = ('title',)
+    date_hierarchy = 'end_datetime'
+    ordering = ('-listing_id',)
+    autocomplete_fields = ('seller',)
+    readonly_fields = ('bid_count', 'high_bid_amount', 'current_price',
+                       'comment_count', 'closed_datetime', 'final_price')
+    show_full_result_count = False
+    actions = ('close_listings', 'recount_bids')
+
+    @admin.action(description=_("Close selected listings"))
+    def close_listings(self, request, queryset):
+        listings = dict(queryset.filter(closed=False)
+                        .values_list('pk', 'category'))
+        # One UPDATE, recording highest bid as the winning one
+        closed = ListingModel.objects.filter(pk__in=listings).close()
+        invalidate_updated_listings(listings, closed=True)
+        self.message_user(request, _("Closed %(count)d listing(s).") % {
+            'count': closed})
+
+    @admin.action(description=_("Recompute bid counters"))
+    def recount_bids(self, request, queryset):
+        listings = dict(queryset.values_list('pk', 'category'))
+        # One UPDATE with correlated subqueries
+        updated = ListingModel.objects.filter(pk__in=listings).recount_bids()
+        invalidate_updated_listings(listings)
+        self.message_user(request, _(
+            "Recounted bids of %(count)d listing(s).") % {'count': updated})
+
+
+@admin.register(BidModel)
+class BidAdmin(admin.ModelAdmin):
+    list_display = ('bid', 'listing', 'bidder', 'created_datetime')
+    list_select_related = ('listing', 'bidder')
+    autocomplete_fields = ('listing', 'bidder')
+    # Primary key order: no sort of the whole table
+    ordering = ('-pk',)
+    # COUNT(*) of the biggest table replaced by row estimate
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+@admin.register(ProxyBidModel)
+class ProxyBidAdmin(admin.ModelAdmin):
+    list_display = ('max_bid', 'listing', 'bidder', 'placed_datetime')
+    list_select_related = ('listing', 'bidder')
+    autocomplete_fields = ('listing', 'bidder')
+    ordering = ('-pk',)
+    show_full_result_count = False
+
+
+@admin.register(CommentModel)
+class CommentAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'listing', 'user', 'post_datetime')
+    list_select_related = ('listing', 'user')
+    autocomplete_fields = ('listing', 'user')
+    ordering = ('-pk',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+@admin.register(BidIncrementModel)
+class BidIncrementAdmin(admin.ModelAdmin):
+    list_display = ('min_price', 'increment')
+    list_editable = ('increment',)
+
+
+@admin.register(ApiTokenModel)
+class ApiTokenAdmin(admin.ModelAdmin):
+    # Keys are issued by the API (POST api/v1/tokens/), admin revokes
+    list_display = ('user', 'created_datetime', '__str__')
+    list_select_related = ('user',)
+    search_fields = ('user__username',)
+    ordering = ('-pk',)
+
+    def has_add_permission(self, request):
+        return False
@@ -0,0 +1,340 @@
+"""
+JSON API (version 1) for listings, bids, comments and watchlist.
+
+Serializers are plain functions over rows fetched with only() (listed
+columns), pages are keyset-paginated ({"results": [...], "next": cursor})
+and GET responses carry ETag of the body (If-None-Match -> 304).
+Clients authenticate with "Authorization: Token <key>" header (keys
+are issued by POST tokens/) or the site session (CSRF checked on
+writes). Writes accept JSON or form encoded bodies.
+"""
+import json
+import secrets
+from functools import wraps
+from hashlib import md5
+
+from django.contrib.auth import authenticate
+from django.http import HttpResponse, JsonResponse
+from django.middleware.csrf import CsrfViewMiddleware
+from django.utils.cache import get_conditional_response
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods
+
+from .bidding import bid_history, can_view_bids, place_bid
+from .cache import watched_ids
+from .forms import BidForm, CommentForm, SearchForm
+from .models import ApiTokenModel, ListingModel, CommentModel
+from .pagination import keyset_paginate, page_size, InvalidCursor
+from .search import search_listings
+
+# Columns of listing list items and of listing detail
+LISTING_FIELDS = ('title', 'category', 'condition', 'starting_price',
+                  'high_bid_amount', 'bid_count', 'start_datetime',
+                  'end_datetime', 'closed', 'photo_url', 'photo',
+                  'photo_status')
+LISTING_DETAIL_FIELDS = LISTING_FIELDS + (
+    'description', 'seller', 'seller__username', 'closed_datetime',
+    'final_price')
+
+
+def error(message, status):
+    return JsonResponse({'error': str(message)}, status=status)
+
+
+def api_response(request, data, status=200):
+    """JsonResponse with ETag of its body (304 if client has it)."""
+    response = JsonResponse(data, status=status)
+    if request.method == 'GET' and status == 200:
+        etag = f'"{md5(response.content).hexdigest()}"'
+        response['ETag'] = etag
+        conditional = get_conditional_response(request, etag=etag,
+                                               response=response)
+        if conditional is not response:
+            return conditional
+    return response
+
+
+def issue_token(user):
+    """New API token key of user (shown once, digest is stored)."""
+    key = secrets.token_urlsafe(32)
+    ApiTokenModel.objects.create(user=user,
+                                 digest=ApiTokenModel.digest_of(key))
+    return key
+
+
+def _token(request):
+    """ApiTokenModel of Authorization header, None if invalid."""
+    scheme, sep, key = request.headers['Authorization'].partition(' ')
+    if scheme != 'Token' or not key:
+        return None
+    token = (ApiTokenModel.objects.select_related('user')
+             .filter(digest=ApiTokenModel.digest_of(key.strip())).first())
+    if token is None or not token.user.is_active:
+        return None
+    return token
+
+
+def api_view(view):
+    """
+    Authenticate by token header, else by session: CSRF is checked for
+    writes of session users only (cookies aren't sent by API clients).
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if 'Authorization' in request.headers:
+            token = _token(request)
+            if token is None:
+                return error("Invalid token.", 401)
+            request.api_token, request.user = token, token.user
+        elif (request.method not in ('GET', 'HEAD', 'OPTIONS', 'TRACE') and
+              request.user.is_authenticated):
+            reason = CsrfViewMiddleware(lambda request: None).process_view(
+                request, None, (), {})
+            if reason is not None:
+                return error("CSRF verification failed.", 403)
+        return view(request, *args, **kwargs)
+    return csrf_exempt(wrapper)
+
+
+def api_login_required(view):
+    """401 JSON error instead of login page redirect."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return error("Authentication required.", 401)
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+def _payload(request):
+    """Request data of JSON or form encoded body."""
+    if request.content_type == 'application/json':
+        try:
+            data = json.loads(request.body or b'{}')
+        except ValueError:
+            data = None
+        return data if isinstance(data, dict) else {}
+    return request.POST
+
+
+def _form_error(form):
+    return error('; '.join(f'{field}: {message}'
+                           for field, messages in form.errors.items()
+                           for message in messages), 400)
+
+
+def serialize_listing(listing):
+    return {
+        'id': listing.pk,
+        'title': listing.title,
+        'category': listing.category,
+        'condition': listing.condition,
+        'starting_price': listing.starting_price,
+        'current_bid': listing.current_bid,
+        'bid_count': listing.bid_count,
+        'start': listing.start_datetime,
+        'end': listing.end_datetime,
+        'closed': listing.closed,
+        'photo_url': listing.photo_url,
+        'thumbnail_url': listing.thumbnail_url,
+    }
+
+
+def serialize_listing_detail(listing):
+    data = serialize_listing(listing)
+    data.update({
+        'description': listing.description,
+        'seller': listing.seller.username,
+        'closed_datetime': listing.closed_datetime,
+        'final_price': listing.final_price,
+    })
+    return data
+
+
+def serialize_comment(comment):
+    return {
+        'id': comment.pk,
+        'user': comment.user.username,
+        'comment': comment.comment,
+        'posted': comment.post_datetime,
+    }
+
+
+def serialize_bid(bid):
+    return {
+        'id': bid.pk,
+        'bidder': bid.bidder.username,
+        'bid': bid.bid,
+        'placed': bid.created_datetime,
+    }
+
+
+def _page_data(page, serialize):
+    return {'results': [serialize(row) for row in page],
+            'next': page.next_cursor}
+
+
+def _page_response(request, queryset, key, serialize, descending=False):
+    """Keyset page of queryset ordered by key."""
+    try:
+        page = keyset_paginate(queryset, key,
+                               cursor=request.GET.get('cursor'),
+                               size=page_size(request),
+                               descending=descending)
+    except InvalidCursor:
+        return error("Invalid cursor.", 400)
+    return api_response(request, _page_data(page, serialize))
+
+
+@require_http_methods(['GET'])
+@api_view
+def listings(request):
+    """Active listings, ending soonest first."""
+    queryset = ListingModel.objects.active().only(*LISTING_FIELDS)
+    return _page_response(request, queryset, 'end_datetime',
+                          serialize_listing)
+
+
+@require_http_methods(['GET'])
+@api_view
+def listing(request, listing_id):
+    try:
+        l = (ListingModel.objects.select_related('seller')
+             .only(*LISTING_DETAIL_FIELDS).get(pk=listing_id))
+    except ListingModel.DoesNotExist:
+        return error("Listing not found.", 404)
+    return api_response(request, serialize_listing_detail(l))
+
+
+@require_http_methods(['GET'])
+@api_view
+def search(request):
+    """Listings matching q and filters (SearchForm fields)."""
+    form = SearchForm(request.GET)
+    if not form.is_valid():
+        return _form_error(form)
+    filters = dict(form.cleaned_data)
+    query = filters.pop('q')
+    try:
+        page = search_listings(query, cursor=request.GET.get('cursor'),
+                               size=page_size(request), **filters)
+    except InvalidCursor:
+        return error("Invalid cursor.", 400)
+    return api_response(request, _page_data(page, serialize_listing))
+
+
+@require_http_methods(['GET', 'POST'])
+@api_view
+@api_login_required
+def bids(request, listing_id):
+    """
+    Bid history (seller/staff, newest first) / place bid
+    {"bid", "automatic"} (bid is the maximum of automatic bids).
+    """
+    if request.method == 'GET':
+        l = ListingModel.objects.only('seller').filter(pk=listing_id).first()
+        if l is None:
+            return error("Listing not found.", 404)
+        if not can_view_bids(request.user, l):
+            return error("Only listing seller can view its bids.", 403)
+        try:
+            page = bid_history(listing_id, cursor=request.GET.get('cursor'),
+                               size=page_size(request))
+        except InvalidCursor:
+            return error("Invalid cursor.", 400)
+        return api_response(request, _page_data(page, serialize_bid))
+
+    form = BidForm(data=_payload(request))
+    if not form.is_valid():
+        return _form_error(form)
+    try:
+        result = place_bid(listing_id, request.user, form.cleaned_data['bid'],
+                           proxy=form.cleaned_data['automatic'])
+    except ListingModel.DoesNotExist:
+        return error("Listing not found.", 404)
+
+    if not result.placed:
+        # Concurrent bids: client can retry
+        status = 409 if result.status == result.CONFLICT else 400
+        return error(result.message, status)
+    # Raised own automatic bid maximum: no bid placed
+    bid = result.bid
+    return JsonResponse({'id': bid and bid.pk, 'bid': bid and bid.bid,
+                         'bid_count': result.listing.bid_count,
+                         'current_bid': result.listing.current_bid,
+                         'high_bidder': result.accepted},
+                        status=201 if bid else 200)
+
+
+@require_http_methods(['GET', 'POST'])
+@api_view
+def comments(request, listing_id):
+    """Listing comments (newest first) / post comment {"comment"}."""
+    if not ListingModel.objects.filter(pk=listing_id).exists():
+        return error("Listing not found.", 404)
+
+    if request.method == 'GET':
+        queryset = (CommentModel.objects.filter(listing=listing_id)
+                    .select_related('user')
+                    .only('comment', 'post_datetime', 'user',
+                          'user__username'))
+        return _page_response(request, queryset, 'post_datetime',
+                              serialize_comment, descending=True)
+
+    if not request.user.is_authenticated:
+        return error("Authentication required.", 401)
+    form = CommentForm(data=_payload(request))
+    if not form.is_valid():
+        return _form_error(form)
+    comment = form.save(commit=False)
+    comment.listing_id = listing_id
+    comment.user = request.user
+    comment.save()
+    return JsonResponse(serialize_comment(comment), status=201)
+
+
+@require_http_methods(['GET'])
+@api_view
+@api_login_required
+def watchlist(request):
+    """Watched listings, ending soonest first."""
+    queryset = ListingModel.objects.filter(
+        watchers=request.user).only(*LISTING_FIELDS)
+    return _page_response(request, queryset, 'end_datetime',
+                          serialize_listing)
+
+
+@require_http_methods(['PUT', 'DELETE'])
+@api_view
+@api_login_required
+def watch(request, listing_id):
+    """Watch (PUT) / unwatch (DELETE) listing, 204."""
+    if request.method == 'PUT':
+        if listing_id not in watched_ids(request.user):
+            if not ListingModel.objects.filter(pk=listing_id).exists():
+                return error("Listing not found.", 404)
+            request.user.watchlist.add(listing_id)
+    else:
+        request.user.watchlist.remove(listing_id)
+    return HttpResponse(status=204)
+
+
+@require_http_methods(['POST', 'DELETE'])
+@api_view
+def tokens(request):
+    """
+    Issue token of {"username", "password"} (POST, 201 {"token"}) /
+    revoke the token of the request (DELETE, 204).
+    """
+    if request.method == 'DELETE':
+        token = getattr(request, 'api_token', None)
+        if token is None:
+            return error("Token authentication required.", 401)
+        token.delete()
+        return HttpResponse(status=204)
+    data = _payload(request)
+    user = authenticate(request, username=data.get('username'),
+                        password=data.get('password'))
+    if user is None:
+        return error("Invalid username or password.", 400)
+    return JsonResponse({'token': issue_token(user)}, status=201)
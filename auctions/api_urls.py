@@ -0,0 +1,21 @@
+from django.urls import path
+
+from . import api
+
+# JSON API version 1 (mounted at api/v1/, without language prefix)
+app_name = 'api'
+urlpatterns = [
+    # Token authentication
+    path("tokens/", api.tokens, name="tokens"),
+    # Listings
+    path("listings/", api.listings, name="listings"),
+    path("listings/search/", api.search, name="search"),
+    path("listings/<int:listing_id>/", api.listing, name="listing"),
+    # Listing bids and comments
+    path("listings/<int:listing_id>/bids/", api.bids, name="bid"),
+    path("listings/<int:listing_id>/comments/", api.comments,
+         name="comments"),
+    # Watchlist
+    path("watchlist/", api.watchlist, name="watchlist"),
+    path("watchlist/<int:listing_id>/", api.watch, name="watch"),
+]
@@ -0,0 +1,349 @@
+"""
+View benchmark harness.
+
+Seed synthetic dataset (users, listings, bids, comments, watchlists)
+and drive every URL of auctions/urls.py through the test client,
+recording query count, p50/p95 latency and rendered bytes per view
+(HTML views are compared with their JSON API counterparts).
+
+Used by ViewBenchmarkTests and `manage.py benchmark_views`.
+"""
+import json
+import math
+import os
+import random
+import time
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .cache import (invalidate_listing, invalidate_listings,
+                    invalidate_category_stats, invalidate_watched)
+from .models import ListingModel, BidModel, CommentModel
+from .search import index_listings
+
+UserModel = get_user_model()
+
+# Committed query count per view (manage.py benchmark_views --update-baseline)
+BASELINE_PATH = os.path.join(os.path.dirname(__file__),
+                             'benchmark_baseline.json')
+
+# Dataset size of scale=1
+DATASET_SIZE = {
+    'users': 20,
+    'listings': 100,
+    'bids': 500,
+    'comments': 200,
+    'watches': 100,
+}
+
+BENCH_PASSWORD = 'benchmark-password'
+
+
+def seed(users, listings, bids, comments, watches, rng=None):
+    """
+    Bulk create synthetic dataset.
+    Can be called repeatedly to grow the dataset.
+    """
+    rng = rng or random.Random(0)
+    now = timezone.now()
+    first_user = UserModel.objects.count()
+    password = make_password(None)  # unusable, skip hashing per user
+    UserModel.objects.bulk_create([
+        UserModel(username=f'bench{i}', phone=f'+7900{i:07d}',
+                  email=f'bench{i}@example.com', password=password)
+        for i in range(first_user, first_user + users)
+    ])
+    user_ids = list(UserModel.objects.values_list('pk', flat=True))
+
+    new_listings = []
+    for i in range(listings):
+        # Mostly active, some ended or upcoming
+        kind = rng.random()
+        if kind < 0.7:
+            start, end = -rng.randint(1, 72), rng.randint(1, 240)
+        elif kind < 0.9:
+            start, end = -rng.randint(73, 240), -rng.randint(1, 72)
+        else:
+            start, end = rng.randint(1, 72), rng.randint(73, 240)
+        new_listings.append(ListingModel(
+            seller_id=rng.choice(user_ids),
+            title=f'Item {i}',
+            description='Synthetic listing ' * rng.randint(1, 20),
+            condition=rng.choice(ListingModel.Condition.values),
+            starting_price=rng.randint(1, 500),
+            start_datetime=now + timedelta(hours=start),
+            end_datetime=now + timedelta(hours=end),
+            closed=rng.random() < 0.05,
+            category=rng.choice(ListingModel.Category.values),
+        ))
+    last_listing = ListingModel.objects.order_by('-pk').values_list(
+        'pk', flat=True).first() or 0
+    ListingModel.objects.bulk_create(new_listings)
+    index_listings(ListingModel.objects.filter(pk__gt=last_listing))
+    listings = list(ListingModel.objects.values_list(
+        'pk', 'seller_id', 'starting_price'))
+
+    # Increasing bids per listing
+    prices = {pk: price for pk, seller, price in listings}
+    new_bids = []
+    for i in range(bids):
+        pk, seller, _ = rng.choice(listings)
+        prices[pk] += rng.randint(1, 20)
+        bidder = rng.choice(user_ids)
+        if bidder != seller:
+            new_bids.append(BidModel(listing_id=pk, bidder_id=bidder,
+                                     bid=prices[pk]))
+    BidModel.objects.bulk_create(new_bids)
+    ListingModel.objects.recount_bids()
+
+    new_comments = CommentModel.objects.bulk_create([
+        CommentModel(listing_id=rng.choice(listings)[0],
+                     user_id=rng.choice(user_ids),
+                     comment='Synthetic comment ' * rng.randint(1, 10))
+        for i in range(comments)
+    ])
+    ListingModel.objects.filter(
+        pk__in={c.listing_id for c in new_comments}).recount_comments()
+
+    Watch = UserModel.watchlist.through
+    Watch.objects.bulk_create([
+        Watch(user_id=rng.choice(user_ids),
+              listingmodel_id=rng.choice(listings)[0])
+        for i in range(watches)
+    ], ignore_conflicts=True)
+
+    # bulk_create doesn't send signals
+    invalidate_listings()
+    for category in ListingModel.Category.values:
+        invalidate_category_stats(category)
+    invalidate_watched(user_ids)
+    for listing_id in {c.listing_id for c in new_comments}:
+        invalidate_listing(listing_id)
+
+
+def seed_scale(scale, rng=None):
+    """Seed scale * DATASET_SIZE rows."""
+    seed(rng=rng, **{k: v * scale for k, v in DATASET_SIZE.items()})
+
+
+class Case:
+    """
+    One benchmarked request.
+    path and data can be callables of repeat number (prepared untimed).
+    conditional - revalidate ETag of untimed request (If-None-Match).
+    """
+
+    def __init__(self, name, path, method='get', data=None, login=True,
+                 conditional=False):
+        self.name = name
+        self.path = path
+        self.method = method
+        self.data = data
+        self.login = login
+        self.conditional = conditional
+
+    def prepare(self, i):
+        path = self.path(i) if callable(self.path) else self.path
+        data = self.data(i) if callable(self.data) else self.data
+        return path, data or {}
+
+
+def bench_user():
+    """User driving the benchmark (owns listings, watches and bids)."""
+    user = UserModel.objects.filter(username='bench-driver').first()
+    if user is None:
+        user = UserModel.objects.create_user(
+            'bench-driver', 'driver@example.com', BENCH_PASSWORD,
+            phone='+79999999999')
+    return user
+
+
+def cases(user):
+    """Benchmark cases for every URL in auctions/urls.py (and API)."""
+    now = timezone.now()
+
+    def new_listing(i):
+        return ListingModel.objects.create(
+            seller=user, title=f'Bench {i}', condition='NEW',
+            starting_price=1, category=1,
+            start_datetime=now - timedelta(hours=1),
+            end_datetime=now + timedelta(hours=1))
+
+    # Listing of other seller with the longest bid/comment history
+    hot = (ListingModel.objects.active(now).exclude(seller=user)
+           .order_by('-bid_count').first())
+    own = new_listing('own')
+    category = hot.category
+
+    return [
+        Case('index', reverse('index')),
+        Case('index_not_modified', reverse('index'), conditional=True),
+        Case('login', reverse('login'), login=False),
+        Case('login_post', reverse('login'), 'post', login=False, data={
+            'username': user.username, 'password': BENCH_PASSWORD}),
+        Case('logout', reverse('logout')),
+        Case('register', reverse('register'), login=False),
+        Case('register_post', reverse('register'), 'post', login=False,
+             data=lambda i: {
+                 'username': f'bench-new-{time.time_ns()}',
+                 'email': 'new@example.com',
+                 'phone': f'+7955{time.time_ns() % 10 ** 7:07d}',
+                 'password': BENCH_PASSWORD, 'confirmation': BENCH_PASSWORD}),
+        Case('listing', reverse('listing', args=[hot.pk])),
+        Case('listing_not_modified', reverse('listing', args=[hot.pk]),
+             conditional=True),
+        Case('add_listing', reverse('add_listing')),
+        Case('delete_listing', lambda i: reverse(
+            'delete_listing', args=[new_listing(i).pk])),
+        Case('update_listing', reverse('update_listing', args=[own.pk])),
+        Case('close_listing', lambda i: reverse(
+            'close_listing', args=[new_listing(i).pk])),
+        Case('my_listings', reverse('my_listings')),
+        Case('listing_categories', reverse('listing_categories')),
+        Case('listing_category', reverse('listing_category', args=[category])),
+        Case('search', reverse('search'), data={
+            'q': 'synthetic listing', 'active': 'on'}),
+        Case('bid', reverse('bid', args=[hot.pk]), 'post', data=lambda i: {
+            'bid': int(ListingModel.objects.get(pk=hot.pk).current_bid) + 1}),
+        Case('listing_bids', reverse('listing_bids', args=[own.pk])),
+        Case('comment', reverse('comment', args=[hot.pk]), 'post',
+             data={'comment': 'Benchmark comment'}),
+        Case('listing_comments', reverse('listing_comments', args=[hot.pk])),
+        Case('watch', reverse('watch', args=[hot.pk])),
+        Case('watchlist', reverse('watchlist')),
+        Case('watchlist_not_modified', reverse('watchlist'),
+             conditional=True),
+        # JSON API
+        Case('api_listings', reverse('api:listings')),
+        Case('api_listing', reverse('api:listing', args=[hot.pk])),
+        Case('api_search', reverse('api:search'), data={
+            'q': 'synthetic listing', 'active': 'on'}),
+        Case('api_bid', reverse('api:bid', args=[hot.pk]), 'post',
+             data=lambda i: {'bid': int(ListingModel.objects.get(
+                 pk=hot.pk).current_bid) + 1}),
+        Case('api_bids', reverse('api:bid', args=[own.pk])),
+        Case('api_comments', reverse('api:comments', args=[hot.pk])),
+        Case('api_comment', reverse('api:comments', args=[hot.pk]), 'post',
+             data={'comment': 'Benchmark comment'}),
+        Case('api_watch', reverse('api:watch', args=[own.pk]), 'put'),
+        Case('api_watchlist', reverse('api:watchlist')),
+    ]
+
+
+# HTML view and JSON API case serving the same data
+API_COMPARISON = [
+    ('index', 'api_listings'),
+    ('listing', 'api_listing'),
+    ('search', 'api_search'),
+    ('bid', 'api_bid'),
+    ('listing_bids', 'api_bids'),
+    ('comment', 'api_comment'),
+    ('watch', 'api_watch'),
+    ('watchlist', 'api_watchlist'),
+]
+
+
+def percentile(values, p):
+    """Nearest-rank percentile of non-empty list."""
+    values = sorted(values)
+    k = max(0, math.ceil(p / 100 * len(values)) - 1)
+    return values[k]
+
+
+def count_queries(captured):
+    """
+    Number of captured statements without savepoint bookkeeping
+    (depends on whether request runs inside outer transaction, e.g. test).
+    """
+    return sum(1 for q in captured
+               if 'SAVEPOINT' not in q['sql'][:30].upper())
+
+
+def run(cases, repeat=5):
+    """
+    Request every case repeat times.
+    Return {case name: {queries, p50_ms, p95_ms, bytes, status}}.
+    """
+    user = bench_user()
+    results = {}
+    for case in cases:
+        client = Client()
+        if case.login:
+            client.force_login(user)
+        timings, queries, size, status = [], 0, 0, None
+        for i in range(repeat):
+            path, data = case.prepare(i)
+            request = getattr(client, case.method)
+            headers = {}
+            if case.conditional:
+                etag = request(path, data).get('ETag')
+                headers['HTTP_IF_NONE_MATCH'] = etag
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = request(path, data, **headers)
+                timings.append((time.perf_counter() - started) * 1000)
+            queries = max(queries, count_queries(captured))
+            size = max(size, len(response.content))
+            status = response.status_code
+            if case.name == 'logout':
+                client.force_login(user)
+        results[case.name] = {
+            'queries': queries,
+            'p50_ms': round(percentile(timings, 50), 2),
+            'p95_ms': round(percentile(timings, 95), 2),
+            'bytes': size,
+            'status': status,
+        }
+    return results
+
+
+def query_growth(small, large):
+    """Views which query count grew with dataset size."""
+    return sorted(name for name in small
+                  if large[name]['queries'] > small[name]['queries'])
+
+
+def load_baseline(path=BASELINE_PATH):
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_baseline(results, path=BASELINE_PATH):
+    baseline = {name: r['queries'] for name, r in sorted(results.items())}
+    with open(path, 'w') as f:
+        json.dump(baseline, f, indent=4)
+        f.write('\n')
+
+
+def baseline_regressions(results, baseline):
+    """Views which query count exceeds committed baseline."""
+    return sorted(name for name, r in results.items()
+                  if r['queries'] > baseline.get(name, 0))
+
+
+def format_comparison(results, pairs=API_COMPARISON):
+    """Plain text table of HTML view vs JSON API latency and bytes."""
+    lines = [f'{"html / api":<30}{"p50 ms":>16}{"bytes":>18}']
+    for html, api in pairs:
+        h, a = results[html], results[api]
+        lines.append(f'{html + " / " + api:<30}'
+                     f'{h["p50_ms"]:>8}{a["p50_ms"]:>8}'
+                     f'{h["bytes"]:>9}{a["bytes"]:>9}')
+    return '\n'.join(lines)
+
+
+def format_results(results):
+    """Plain text table of results."""
+    lines = [f'{"view":<24}{"queries":>8}{"p50 ms":>10}'
+             f'{"p95 ms":>10}{"bytes":>10}{"status":>8}']
+    for name, r in results.items():
+        lines.append(f'{name:<24}{r["queries"]:>8}{r["p50_ms"]:>10}'
+                     f'{r["p95_ms"]:>10}{r["bytes"]:>10}{r["status"]:>8}')
+    return '\n'.join(lines)
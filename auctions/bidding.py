@@ -0,0 +1,247 @@
+"""
+Bid placement service (used by views.bid and any other bid source).
+
+Bid is validated and inserted in one transaction with the listing row
+locked (SELECT ... FOR UPDATE). Bid must be at least the current price
+plus the increment of its price band (BidIncrementModel). Denormalized
+listing bid columns are updated with a conditional UPDATE guarded by
+the bid_count read under the lock, so a concurrent writer on a backend
+without row locks (SQLite) is detected as a conflict instead of
+silently overwriting the high bid.
+Conflicts and lock errors are retried with bounded exponential backoff.
+Accepted bids queue notifications to prior bidders and watchers in the
+same transaction (auctions.notifications outbox).
+
+Proxy (automatic) bids store the bidder's private maximum
+(ProxyBidModel). Under the same lock a new bid is resolved against the
+high bidder's maximum at once: only the outcome is written - the loser's
+final bid and the winner's, which is the loser's plus one increment
+(capped by the winner's maximum). Bidders no longer have to re-bid
+whenever they are outbid.
+"""
+import random
+import time
+from decimal import Decimal
+
+from django.db import OperationalError, transaction
+from django.db.models import F
+from django.utils.translation import gettext as _
+
+from .models import (DEFAULT_BID_INCREMENT, BidIncrementModel, BidModel,
+                     ListingModel, ProxyBidModel, touched)
+from .notifications import notify_bid
+from .pagination import DEFAULT_PAGE_SIZE, keyset_paginate
+from .realtime import publish_bid
+from .util_datetime import current_datetime
+
+# Bids are placed in whole cents
+CENT = Decimal('0.01')
+
+# Retry policy on write conflicts
+MAX_ATTEMPTS = 5
+BACKOFF_BASE = 0.005  # seconds, doubled on every attempt
+BACKOFF_MAX = 0.2
+
+
+class BidConflict(Exception):
+    """Listing bid columns were changed by a concurrent bid."""
+
+
+class BidResult:
+    """Outcome of place_bid()."""
+    ACCEPTED = 'accepted'
+    OUTBID = 'outbid'  # amount is below current bid + increment
+    PROXY_OUTBID = 'proxy_outbid'  # placed, outbid by a proxy at once
+    INACTIVE = 'inactive'  # listing not started, ended or closed
+    INVALID = 'invalid'  # bidder is not allowed to bid
+    CONFLICT = 'conflict'  # gave up retrying concurrent writes
+
+    def __init__(self, status, listing, bid=None, message='', attempts=1):
+        self.status = status
+        self.listing = listing
+        self.bid = bid
+        self.message = message
+        self.attempts = attempts
+
+    def __repr__(self):
+        return f'<BidResult {self.status} {self.bid}>'
+
+    @property
+    def accepted(self):
+        return self.status == self.ACCEPTED
+
+    @property
+    def placed(self):
+        """Bid was recorded (even if a proxy outbid it)."""
+        return self.status in (self.ACCEPTED, self.PROXY_OUTBID)
+
+
+def _is_retryable(error):
+    """Lock timeouts, deadlocks and SQLite 'database is locked' errors."""
+    return 'lock' in str(error).lower()
+
+
+def _backoff(attempt):
+    """Sleep before next attempt (exponential backoff with full jitter)."""
+    delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt)
+    time.sleep(random.uniform(0, delay))
+
+
+def increment(price):
+    """Bid increment of price band (BidIncrementModel)."""
+    return (BidIncrementModel.objects.filter(min_price__lte=price)
+            .order_by('-min_price').values_list('increment', flat=True)
+            .first() or DEFAULT_BID_INCREMENT)
+
+
+def _resolve(listing, bidder, amount, proxy):
+    """
+    Bids (bidder, amount) resolving the new bid against the high bidder's
+    proxy, in placement order, and the winning one of them.
+    """
+    high = listing.high_bidder_id
+    defender = None
+    if high is not None and high != bidder.pk:
+        defender = (ProxyBidModel.objects.filter(listing=listing, bidder=high)
+                    .values_list('max_bid', flat=True).first())
+    if defender is None or defender <= listing.current_price:
+        # Nobody bids back: proxy pays the minimum, plain bid its amount
+        winner = (bidder.pk, listing.min_bid if proxy else amount)
+        return [winner], winner
+
+    if defender >= amount:
+        # High bidder's proxy outbids (and wins a tie, set earlier)
+        price = min(defender, amount + increment(amount))
+        winner = (high, price)
+        bids = [(bidder.pk, amount), winner]
+        if price == amount:
+            bids.reverse()
+        return bids, winner
+    # New bid beats the proxy, which bid up to its maximum
+    price = amount
+    if proxy:
+        price = max(listing.min_bid,
+                    min(amount, defender + increment(defender)))
+    winner = (bidder.pk, price)
+    return [(high, defender), winner], winner
+
+
+def _place_bid(listing_id, bidder, amount, proxy=False):
+    """Single placement attempt, raise BidConflict on concurrent write."""
+    amount = Decimal(amount).quantize(CENT)
+    with transaction.atomic():
+        # Raise ListingModel.DoesNotExist for unknown listing
+        listing = (ListingModel.objects.select_for_update().with_min_bid()
+                   .get(pk=listing_id))
+
+        if not listing.active:
+            return BidResult(BidResult.INACTIVE, listing,
+                             message=_("Listing is not active to bid."))
+        if bidder.pk == listing.seller_id:
+            return BidResult(
+                BidResult.INVALID, listing,
+                message=_("Listing owner can not be it's bidder."))
+
+        if proxy and bidder.pk == listing.high_bidder_id:
+            # Raising own maximum bids nothing
+            current = (ProxyBidModel.objects
+                       .filter(listing=listing, bidder=bidder)
+                       .values_list('max_bid', flat=True).first())
+            lowest = max(current or 0, listing.current_price)
+            if amount <= lowest:
+                return BidResult(BidResult.OUTBID, listing, message=_(
+                    'Maximum bid must be > %(max_bid)s') % {
+                        'max_bid': lowest})
+            ProxyBidModel.objects.update_or_create(
+                listing=listing, bidder=bidder,
+                defaults={'max_bid': amount,
+                          'placed_datetime': current_datetime()})
+            return BidResult(BidResult.ACCEPTED, listing, message=_(
+                'Automatic bids up to %(max_bid)s') % {'max_bid': amount})
+
+        if amount < listing.min_bid:
+            return BidResult(BidResult.OUTBID, listing, message=_(
+                'Bid must be >= %(current_bid)s - current bid') % {
+                    'current_bid': listing.min_bid})
+
+        if proxy:
+            ProxyBidModel.objects.update_or_create(
+                listing=listing, bidder=bidder,
+                defaults={'max_bid': amount,
+                          'placed_datetime': current_datetime()})
+        bids, (winner, price) = _resolve(listing, bidder, amount, proxy)
+        # At most two rows (bulk_create returns no pk on MySQL)
+        created = [BidModel.objects.create(listing=listing,
+                                           bidder_id=bidder_id, bid=bid_amount)
+                   for bidder_id, bid_amount in bids]
+        bid = next(bid for bid in created
+                   if (bid.bidder_id, bid.bid) == (winner, price))
+        # Apply only if nobody bid since the row was read
+        updated = ListingModel.objects.filter(
+            pk=listing.pk, bid_count=listing.bid_count
+        ).update(**touched(), bid_count=F('bid_count') + len(created),
+                 high_bid=bid, high_bid_amount=price,
+                 high_bidder_id=winner, current_price=price)
+        if not updated:
+            # Roll back inserted bids
+            raise BidConflict()
+
+        # Outbox: notifications are committed with the bids
+        notify_bid(bid)
+
+        listing.bid_count += len(created)
+        listing.high_bid, listing.high_bid_amount = bid, price
+        listing.current_price = price
+        listing.high_bidder_id = winner
+        # Push new high bid to listing subscribers once it's visible
+        transaction.on_commit(lambda: publish_bid(listing))
+    if winner != bidder.pk:
+        own = next(own for own in created if own.bidder_id == bidder.pk)
+        return BidResult(BidResult.PROXY_OUTBID, listing, bid=own, message=_(
+            "You have been outbid by an automatic bid, current bid is "
+            "%(current_bid)s.") % {'current_bid': price})
+    message = ''
+    if proxy:
+        message = _('Bid %(bid)s, automatic bids up to %(max_bid)s') % {
+            'bid': price, 'max_bid': amount}
+    return BidResult(BidResult.ACCEPTED, listing, bid=bid, message=message)
+
+
+def place_bid(listing_id, bidder, amount, proxy=False,
+              attempts=MAX_ATTEMPTS):
+    """
+    Validate and place bid of bidder (User) on listing, amount is the
+    bidder's maximum of an automatic bid if proxy.
+
+    Return BidResult, raise ListingModel.DoesNotExist for unknown listing.
+    """
+    for attempt in range(attempts):
+        try:
+            result = _place_bid(listing_id, bidder, amount, proxy)
+        except BidConflict:
+            pass
+        except OperationalError as e:
+            if not _is_retryable(e):
+                raise
+        else:
+            result.attempts = attempt + 1
+            return result
+        if attempt + 1 < attempts:
+            _backoff(attempt)
+
+    return BidResult(BidResult.CONFLICT, None, attempts=attempts, message=_(
+        "Too many bids at the same time, please try again."))
+
+
+def can_view_bids(user, listing):
+    """Bid history (bidders) is visible to listing seller and staff."""
+    return user.is_staff or user.pk == listing.seller_id
+
+
+def bid_history(listing_id, cursor=None, size=DEFAULT_PAGE_SIZE):
+    """KeysetPage of listing bids, newest first."""
+    bids = (BidModel.objects.filter(listing=listing_id)
+            .select_related('bidder')
+            .only('bid', 'created_datetime', 'bidder', 'bidder__username'))
+    return keyset_paginate(bids, 'created_datetime', cursor, size,
+                           descending=True)
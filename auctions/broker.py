@@ -0,0 +1,129 @@
+"""
+Publish/subscribe broker for real-time events.
+
+Subscribers are asyncio consumers (ASGI connections), publishers can be
+any thread (sync views). Broker class is pluggable with
+settings.AUCTIONS_BROKER (dotted path): InProcessBroker fans out events
+inside one worker process, RedisBroker across all processes (several
+server workers, settings_production) through Redis pub/sub.
+"""
+import asyncio
+import json
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+DEFAULT_BROKER = 'auctions.broker.InProcessBroker'
+
+# Events buffered per subscriber, oldest are dropped for slow consumers
+QUEUE_SIZE = 100
+
+
+class Subscription:
+    """Event queue of one subscriber, bound to its event loop."""
+
+    def __init__(self, channel, loop, maxsize=QUEUE_SIZE):
+        self.channel = channel
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize)
+
+    def put(self, event):
+        """Enqueue event (in subscriber loop), drop oldest if full."""
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(event)
+
+    async def get(self):
+        return await self.queue.get()
+
+
+class InProcessBroker:
+    """Fan-out of events to subscribers of this process."""
+
+    def __init__(self):
+        self._subscriptions = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, channel):
+        """Subscribe running event loop to channel, return Subscription."""
+        subscription = Subscription(channel, asyncio.get_running_loop())
+        with self._lock:
+            self._subscriptions[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.channel)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.channel]
+
+    def publish(self, channel, event):
+        """Send event to all channel subscribers (thread-safe)."""
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(channel, ()))
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(
+                    subscription.put, event)
+            except RuntimeError:
+                # Event loop of subscriber is closed
+                self.unsubscribe(subscription)
+        return len(subscriptions)
+
+    def subscriber_count(self, channel=None):
+        with self._lock:
+            if channel is not None:
+                return len(self._subscriptions.get(channel, ()))
+            return sum(len(s) for s in self._subscriptions.values())
+
+
+class RedisBroker(InProcessBroker):
+    """
+    Events are published to Redis (settings.REDIS_URL), a listener
+    thread of every process delivers them to its own subscribers.
+    """
+    # Redis channel of broker channel
+    PREFIX = 'auctions:events:'
+
+    def __init__(self, url=None):
+        super().__init__()
+        import redis  # optional dependency (production)
+        self._redis = redis.Redis.from_url(url or settings.REDIS_URL)
+        self._listener = None
+
+    def subscribe(self, channel):
+        with self._lock:
+            if self._listener is None:
+                # Started on first use: in server worker, after fork
+                pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+                pubsub.psubscribe(**{f'{self.PREFIX}*': self._deliver})
+                self._listener = pubsub.run_in_thread(sleep_time=1,
+                                                      daemon=True)
+        return super().subscribe(channel)
+
+    def _deliver(self, message):
+        channel = message['channel'].decode()[len(self.PREFIX):]
+        super().publish(channel, tuple(json.loads(message['data'])))
+
+    def publish(self, channel, event):
+        """Send event (JSON) to subscribers of all processes."""
+        return self._redis.publish(self.PREFIX + channel, json.dumps(event))
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    """Return process-wide broker instance (settings.AUCTIONS_BROKER)."""
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                path = getattr(settings, 'AUCTIONS_BROKER', DEFAULT_BROKER)
+                _broker = import_string(path)()
+    return _broker
@@ -0,0 +1,193 @@
+"""
+Cache of rendered listing page fragments.
+
+Fragments ({% cache %} template tag, default cache from CACHES) are
+keyed by version counters stored in the cache. Signals (auctions.signals)
+bump the version of a listing on bid, comment and listing changes and
+the version of listing collections on listing changes, so old fragments
+are never read again and expire by themselves.
+Fragments rendered from replica reads (commerce.db) may lag behind the
+version, they are cached apart and renewed every REPLICA_PIN_SECONDS.
+"""
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Max, Min
+
+from commerce.db import replica_reads
+
+from .models import ListingModel
+
+# Listing page fragments live until invalidated (or evicted)
+FRAGMENT_TIMEOUT = 600
+# List pages depend on current time too (listings start/end)
+LIST_FRAGMENT_TIMEOUT = 60
+
+LISTING_VERSION_KEY = 'auctions:listing:{}:version'
+LISTINGS_VERSION_KEY = 'auctions:listings:version'
+
+
+def _get_version(key):
+    """Return current version stored at key (create if missing)."""
+    version = cache.get(key)
+    if version is None:
+        # Start from unique value, so version lost by eviction
+        # doesn't match fragments cached under old counter
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    if replica_reads():
+        period = getattr(settings, 'REPLICA_PIN_SECONDS', 10)
+        return f'{version}-r{int(time.time()) // period}'
+    return version
+
+
+def _bump_version(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), None)
+
+
+def listing_version(listing_id):
+    """Version of single listing page content."""
+    return _get_version(LISTING_VERSION_KEY.format(listing_id))
+
+
+def listings_version():
+    """Version of listing collections (index, category pages)."""
+    return _get_version(LISTINGS_VERSION_KEY)
+
+
+def _invalidate(key):
+    _bump_version(key)
+    # Again after commit: concurrent request could cache
+    # not yet committed state in between
+    transaction.on_commit(lambda: _bump_version(key))
+
+
+def invalidate_listing(listing_id):
+    """Drop cached fragments of listing page."""
+    _invalidate(LISTING_VERSION_KEY.format(listing_id))
+
+
+def invalidate_listings():
+    """Drop cached fragments of listing collections."""
+    _invalidate(LISTINGS_VERSION_KEY)
+
+
+# Per-category open listing statistics: count is adjusted incrementally
+# (atomic incr/decr) on listing changes, price range is dropped when it
+# may change and recomputed with the missing categories on next read.
+CATEGORY_STATS_TIMEOUT = 3600
+CATEGORY_COUNT_KEY = 'auctions:category:{}:count'
+CATEGORY_PRICES_KEY = 'auctions:category:{}:prices'
+
+
+def _compute_category_stats(categories):
+    """One GROUP BY query of open listing count/price range per category."""
+    rows = (ListingModel.objects
+            .filter(closed=False, category__in=categories)
+            .values('category')
+            .annotate(count=Count('pk'), min_price=Min('current_price'),
+                      max_price=Max('current_price'))
+            .order_by())
+    stats = {c: {'count': 0, 'min_price': None, 'max_price': None}
+             for c in categories}
+    for row in rows:
+        stats[row.pop('category')] = row
+    return stats
+
+
+def category_stats(categories):
+    """Return {category: {count, min_price, max_price}} of open listings."""
+    keys = {}
+    for c in categories:
+        keys[CATEGORY_COUNT_KEY.format(c)] = (c, 'count')
+        keys[CATEGORY_PRICES_KEY.format(c)] = (c, 'prices')
+    cached = cache.get_many(keys)
+
+    stats = {c: {} for c in categories}
+    for key, value in cached.items():
+        c, kind = keys[key]
+        if kind == 'count':
+            stats[c]['count'] = value
+        else:
+            stats[c]['min_price'], stats[c]['max_price'] = value
+
+    missing = [c for c in categories if len(stats[c]) < 3]
+    if missing:
+        computed = _compute_category_stats(missing)
+        cache.set_many({
+            key: (computed[c]['count'] if kind == 'count' else
+                  (computed[c]['min_price'], computed[c]['max_price']))
+            for key, (c, kind) in keys.items() if c in computed
+        }, CATEGORY_STATS_TIMEOUT)
+        stats.update(computed)
+    return stats
+
+
+def adjust_category_count(category, delta):
+    """Add delta to cached open listing count (if it's cached)."""
+    if category is None:
+        return
+    try:
+        cache.incr(CATEGORY_COUNT_KEY.format(category), delta)
+    except ValueError:
+        # Not cached: will be computed on next read
+        pass
+
+
+def invalidate_category_prices(category):
+    if category is not None:
+        cache.delete(CATEGORY_PRICES_KEY.format(category))
+
+
+def invalidate_category_stats(category):
+    if category is not None:
+        cache.delete_many([CATEGORY_COUNT_KEY.format(category),
+                           CATEGORY_PRICES_KEY.format(category)])
+
+
+def invalidate_updated_listings(categories, closed=False):
+    """
+    Drop cached fragments and category statistics of listings changed by
+    UPDATE (no model signals), categories - {listing_id: category}.
+    closed - listings were open before and are closed now.
+    """
+    for listing_id in categories:
+        invalidate_listing(listing_id)
+    for category, count in Counter(categories.values()).items():
+        if closed:
+            adjust_category_count(category, -count)
+        invalidate_category_prices(category)
+    if categories:
+        invalidate_listings()
+
+
+# Per-user set of watched listing ids ("is watched" checks without
+# queries), dropped on watchlist changes (m2m_changed signal)
+WATCHED_TIMEOUT = 3600
+WATCHED_KEY = 'auctions:user:{}:watched'
+
+
+def watched_ids(user):
+    """Return frozenset of listing ids watched by user."""
+    if not user.is_authenticated:
+        return frozenset()
+    key = WATCHED_KEY.format(user.pk)
+    ids = cache.get(key)
+    if ids is None:
+        ids = frozenset(user.watchlist.values_list('pk', flat=True))
+        cache.set(key, ids, WATCHED_TIMEOUT)
+    return ids
+
+
+def invalidate_watched(user_ids):
+    """Drop cached watched listing ids of users."""
+    keys = [WATCHED_KEY.format(user_id) for user_id in user_ids]
+    cache.delete_many(keys)
+    # Again after commit (see _invalidate)
+    transaction.on_commit(lambda: cache.delete_many(keys))
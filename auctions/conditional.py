@@ -0,0 +1,135 @@
+"""
+Conditional GET (ETag/Last-Modified) of listing page and listing lists.
+
+Validators are computed from version stamps before any rendering work:
+- listing page: ListingModel.version/modified_datetime (one primary key
+  row lookup), listing phase (upcoming/active/ended) and the minute
+  while active (time left);
+- index/category pages: listings collection version (cache) and time
+  bucket of LIST_FRAGMENT_TIMEOUT (active set changes with time);
+- watchlist: max modified_datetime of watched listings (one aggregate).
+Every ETag includes the user dependent state (user, watched listings,
+language), so an unchanged page answers 304 Not Modified.
+Pages with pending flash messages are never answered with 304.
+
+cache_headers() marks anonymous pages public (shared caches/CDN may
+store them for PUBLIC_MAX_AGE) and other pages private.
+"""
+import time
+from functools import wraps
+from hashlib import md5
+
+from django.contrib import messages
+from django.db.models import Count, Max
+from django.utils.cache import patch_cache_control, patch_vary_headers
+
+from .cache import LIST_FRAGMENT_TIMEOUT, listings_version, watched_ids
+from .models import ListingModel
+from .util_datetime import current_datetime
+
+# Shared cache lifetime of anonymous pages (seconds)
+PUBLIC_MAX_AGE = 60
+
+
+def _has_messages(request):
+    # len() doesn't mark messages as read
+    return len(messages.get_messages(request)) > 0
+
+
+def _digest(*parts):
+    return md5('|'.join(map(str, parts)).encode()).hexdigest()
+
+
+def _watched_digest(request):
+    return _digest(*sorted(watched_ids(request.user)))
+
+
+def _listing_state(request, listing_id):
+    """Version columns of listing (cached on request for both validators)."""
+    if getattr(request, 'listing_state', None) is None:
+        request.listing_state = (ListingModel.objects.filter(pk=listing_id)
+                                 .values('version', 'modified_datetime',
+                                         'start_datetime', 'end_datetime',
+                                         'closed')
+                                 .first())
+    return request.listing_state
+
+
+def _phase(state, cur_datetime):
+    if state['closed']:
+        return ListingModel.Status.CLOSED
+    if cur_datetime <= state['start_datetime']:
+        return ListingModel.Status.UPCOMING
+    if cur_datetime < state['end_datetime']:
+        return ListingModel.Status.ACTIVE
+    return ListingModel.Status.ENDED
+
+
+def listing_etag(request, listing_id):
+    state = _listing_state(request, listing_id)
+    if state is None or _has_messages(request):
+        return None
+    phase = _phase(state, current_datetime())
+    # Active listing page shows time left (in minutes)
+    minute = (int(time.time()) // 60
+              if phase == ListingModel.Status.ACTIVE else '')
+    watched = listing_id in watched_ids(request.user)
+    return (f'{listing_id}-{state["version"]}-{phase}{minute}-'
+            f'{request.user.pk}-{int(watched)}-{request.LANGUAGE_CODE}')
+
+
+def listing_last_modified(request, listing_id):
+    state = _listing_state(request, listing_id)
+    if state is None or _has_messages(request):
+        return None
+    # Page changes when listing starts/ends too
+    now = current_datetime()
+    stamps = [state['modified_datetime'], state['start_datetime'],
+              state['end_datetime']]
+    if _phase(state, now) == ListingModel.Status.ACTIVE:
+        # and every minute while active (time left)
+        stamps.append(now.replace(second=0, microsecond=0))
+    # Stamps ahead of request time (e.g. upcoming listing modified after
+    # the request started) aren't known yet, never in the future
+    return max((stamp for stamp in stamps if stamp <= now),
+               default=min(state['modified_datetime'], now))
+
+
+def listings_etag(request, category=None):
+    """ETag of index (category=None) and category pages."""
+    if _has_messages(request):
+        return None
+    bucket = int(time.time()) // LIST_FRAGMENT_TIMEOUT
+    return _digest(listings_version(), bucket, category, request.user.pk,
+                   _watched_digest(request), request.LANGUAGE_CODE)
+
+
+def watchlist_etag(request):
+    if _has_messages(request):
+        return None
+    stamps = ListingModel.objects.filter(watchers=request.user).aggregate(
+        count=Count('pk'), modified=Max('modified_datetime'))
+    bucket = int(time.time()) // LIST_FRAGMENT_TIMEOUT
+    return _digest(stamps['count'], stamps['modified'], bucket,
+                   request.user.pk, _watched_digest(request),
+                   request.LANGUAGE_CODE)
+
+
+def cache_headers(view):
+    """Public Cache-Control for anonymous pages, private for others."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        public = (request.method in ('GET', 'HEAD') and
+                  not request.user.is_authenticated and
+                  not _has_messages(request))
+        response = view(request, *args, **kwargs)
+        if public and response.status_code in (200, 304) \
+                and not response.cookies:
+            patch_cache_control(response, public=True,
+                                max_age=PUBLIC_MAX_AGE)
+        else:
+            # Browser revalidates (ETag) on every use
+            patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ('Cookie',))
+        return response
+    return wrapper
@@ -0,0 +1,8 @@
+"""Template context processors (TEMPLATES setting)."""
+from .cache import watched_ids
+
+
+def watchlist(request):
+    """Watchlist size of current user from cached watched ids."""
+    # Callable: evaluated only if template uses it
+    return {'watchlist_count': lambda: len(watched_ids(request.user))}
@@ -0,0 +1,119 @@
+"""
+Streaming CSV/NDJSON export of bids and listings.
+
+Rows are read in primary key order in keyset batches of CHUNK_SIZE rows
+and written to StreamingHttpResponse batch by batch, so memory use of
+an export doesn't depend on the number of rows (one batch at a time,
+also with MySQLdb which buffers whole result set of every query).
+Staff export all rows, other users rows of their own listings.
+"""
+import csv
+import json
+
+from django.contrib.auth.decorators import login_required
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import Http404, StreamingHttpResponse
+from django.views.decorators.http import require_http_methods
+
+from .models import BidModel, ListingModel
+
+# Rows fetched per query (and per written chunk)
+CHUNK_SIZE = 2000
+CONTENT_TYPES = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+
+# Exported columns: (header, field lookup), primary key first
+BID_COLUMNS = (
+    ('id', 'pk'),
+    ('listing', 'listing'),
+    ('title', 'listing__title'),
+    ('bidder', 'bidder__username'),
+    ('bid', 'bid'),
+    ('placed', 'created_datetime'),
+)
+LISTING_COLUMNS = (
+    ('id', 'pk'),
+    ('title', 'title'),
+    ('seller', 'seller__username'),
+    ('category', 'category'),
+    ('condition', 'condition'),
+    ('starting_price', 'starting_price'),
+    ('current_price', 'current_price'),
+    ('bid_count', 'bid_count'),
+    ('start', 'start_datetime'),
+    ('end', 'end_datetime'),
+    ('closed', 'closed'),
+    ('final_price', 'final_price'),
+)
+
+
+def batches(queryset, lookups, chunk_size=CHUNK_SIZE):
+    """Lists of value tuples (lookups, pk first) of queryset in pk order."""
+    queryset = queryset.order_by('pk').values_list(*lookups)
+    last_pk = None
+    while True:
+        batch = queryset if last_pk is None else queryset.filter(
+            pk__gt=last_pk)
+        rows = list(batch[:chunk_size])
+        if not rows:
+            return
+        yield rows
+        last_pk = rows[-1][0]
+
+
+class _Echo:
+    """File-like object returning written line (csv.writer target)."""
+
+    def write(self, value):
+        return value
+
+
+def csv_chunks(headers, batches):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(headers)
+    for rows in batches:
+        yield ''.join(writer.writerow(row) for row in rows)
+
+
+def ndjson_chunks(headers, batches):
+    for rows in batches:
+        yield ''.join(json.dumps(dict(zip(headers, row)),
+                                 cls=DjangoJSONEncoder) + '\n'
+                      for row in rows)
+
+
+def export_response(queryset, columns, fmt, name):
+    """StreamingHttpResponse of queryset rows as CSV or NDJSON file."""
+    if fmt not in CONTENT_TYPES:
+        raise Http404()
+    headers, lookups = zip(*columns)
+    chunks = csv_chunks if fmt == 'csv' else ndjson_chunks
+    response = StreamingHttpResponse(
+        chunks(headers, batches(queryset, lookups)),
+        content_type=CONTENT_TYPES[fmt])
+    response['Content-Disposition'] = f'attachment; filename="{name}.{fmt}"'
+    return response
+
+
+@require_http_methods(['GET'])
+@login_required(login_url='/login/')
+def bids(request, fmt):
+    """Bids of user listings (all for staff), ?listing= of one listing."""
+    queryset = BidModel.objects.all()
+    if not request.user.is_staff:
+        queryset = queryset.filter(listing__seller=request.user)
+    listing_id = request.GET.get('listing')
+    if listing_id:
+        if not listing_id.isdigit():
+            raise Http404()
+        queryset = queryset.filter(listing=listing_id)
+    return export_response(queryset, BID_COLUMNS, fmt, 'bids')
+
+
+@require_http_methods(['GET'])
+@login_required(login_url='/login/')
+def listings(request, fmt):
+    """User listings (all for staff)."""
+    queryset = ListingModel.objects.all()
+    if not request.user.is_staff:
+        queryset = queryset.filter(seller=request.user)
+    return export_response(queryset, LISTING_COLUMNS, fmt, 'listings')
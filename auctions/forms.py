@@ -1,8 +1,13 @@
 from django.contrib.auth import forms, get_user_model
+from django.core.exceptions import ValidationError
+from django.core.validators import MinValueValidator
 from django.forms import (
-    ModelForm, modelform_factory, TimeField, DateField,
-    TimeInput, DateInput, DateTimeInput, Textarea, NumberInput, HiddenInput
+    Form, ModelForm, modelform_factory, TimeField, DateField,
+    TimeInput, DateInput, DateTimeInput, Textarea, NumberInput, HiddenInput,
+    CharField, ChoiceField, TypedChoiceField, DecimalField, BooleanField,
+    ModelMultipleChoiceField, MultipleHiddenInput, CheckboxInput
 )
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
 from .models import ListingModel, BidModel, CommentModel
@@ -40,7 +45,7 @@ class DateWidget(DateInput):
 
 def round_current_time_string():
     """Custom hour rounding time str formatting."""
-    cur_dt = current_datetime()
+    cur_dt = timezone.localtime(current_datetime())
     cur_dt += timedelta(hours=1)
     cur_time = cur_dt.strftime('%H:00')
     return cur_time
@@ -73,7 +78,7 @@ class ListingForm(ModelForm):
         """
         model = ListingModel
         # Editable form fields
-        fields = ["title", "category", "condition", "starting_price", "photo_url",
+        fields = ["title", "category", "condition", "starting_price", "photo_url", "photo",
                   "start_time", "start_date", "end_time", "end_date", "description", "start_datetime", "end_datetime"]
         widgets = {"description": Textarea(
             attrs={'cols': 80, 'rows': 10, 'class': 'form-control'}),
@@ -102,14 +107,13 @@ class ListingForm(ModelForm):
             if not kwargs.get('initial'):
                 kwargs['initial'] = {}
             # Split datetime fields from instance (initials from instance)
-            kwargs['initial']['start_date'] = kwargs['instance'].start_datetime.strftime(
-                '%Y-%m-%d')
-            kwargs['initial']['start_time'] = kwargs['instance'].start_datetime.strftime(
-                '%H:%M')
-            kwargs['initial']['end_date'] = kwargs['instance'].end_datetime.strftime(
-                '%Y-%m-%d')
-            kwargs['initial']['end_time'] = kwargs['instance'].end_datetime.strftime(
-                '%H:%M')
+            # (in the current time zone, the one data is parsed in)
+            start = timezone.localtime(kwargs['instance'].start_datetime)
+            end = timezone.localtime(kwargs['instance'].end_datetime)
+            kwargs['initial']['start_date'] = start.strftime('%Y-%m-%d')
+            kwargs['initial']['start_time'] = start.strftime('%H:%M')
+            kwargs['initial']['end_date'] = end.strftime('%Y-%m-%d')
+            kwargs['initial']['end_time'] = end.strftime('%H:%M')
         # GET request: create new
         else:
             if not kwargs.get('initial'):
@@ -129,10 +133,110 @@ class ListingForm(ModelForm):
             # Change <p class="form-text">Help text</p>
             boundfield.field.help_text = f'<small class="form-text text-muted">{boundfield.field.help_text}</small>'
 
+    def clean(self):
+        """
+        Start/end time of new listing or changed one can't be in the past
+        (edits of running listing keep its start).
+        """
+        cleaned_data = super().clean()
+        now = current_datetime()
+        for field in ('start_datetime', 'end_datetime'):
+            value = cleaned_data.get(field)
+            current = getattr(self.instance, field)
+            # Form fields have minute precision
+            if value is None or (current is not None and value == current
+                                 .replace(second=0, microsecond=0)):
+                continue
+            try:
+                MinValueValidator(now)(value)
+            except ValidationError as error:
+                self.add_error(field, error)
+        return cleaned_data
+
+    def save(self, commit=True):
+        """Queue new photo (upload or URL) for the image worker."""
+        changed = {'photo', 'photo_url'} & set(self.changed_data)
+        if changed:
+            listing = self.instance
+            if changed == {'photo_url'}:
+                # Copy of the former URL photo
+                listing.photo = ''
+            listing.photo_status = (
+                ListingModel.PhotoStatus.PENDING
+                if listing.photo or listing.photo_url
+                else ListingModel.PhotoStatus.NONE)
+        return super().save(commit)
+
+
+class BidForm(ModelForm):
+    """Bid amount, the maximum of automatic (proxy) bids if automatic."""
+    automatic = BooleanField(
+        required=False, label=_("Bid automatically up to this amount"),
+        widget=CheckboxInput(attrs={'class': 'form-check-input'}))
+
+    class Meta:
+        model = BidModel
+        fields = ('bid',)
+        widgets = {'bid': NumberInput(
+            attrs={'class': 'form-control', 'placeholder': _('Bid in $')})}
 
-BidForm = modelform_factory(BidModel, fields=('bid',),
-                            widgets={'bid': NumberInput(
-                                attrs={'class': 'form-control',
-                                       'placeholder': _('Bid in $')})})
 
 CommentForm = modelform_factory(CommentModel, fields=['comment'])
+
+
+def price_field(label):
+    """Optional price filter field (dollars and cents)."""
+    return DecimalField(required=False, min_value=0, max_digits=12,
+                        decimal_places=2, label=label)
+
+
+class PriceRangeForm(Form):
+    """Current price range filter of listing pages (GET form)."""
+    min_price = price_field(_("Price from"))
+    max_price = price_field(_("Price to"))
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        for field in self.fields.values():
+            field.widget.attrs['class'] = 'form-control'
+
+    def filters(self):
+        """current_price lookups of valid bounds ({} if invalid)."""
+        if not self.is_valid():
+            return {}
+        lookups = {'current_price__gte': self.cleaned_data['min_price'],
+                   'current_price__lte': self.cleaned_data['max_price']}
+        return {lookup: value for lookup, value in lookups.items()
+                if value is not None}
+
+
+class SearchForm(Form):
+    """Listing search query and filters (GET form)."""
+    q = CharField(required=False, max_length=200, label=_("Search"))
+    category = TypedChoiceField(
+        required=False, coerce=int, empty_value=None, label=_("Category"),
+        choices=[('', _("Any category"))] + ListingModel.Category.choices)
+    condition = ChoiceField(
+        required=False, label=_("Condition"),
+        choices=[('', _("Any condition"))] + ListingModel.Condition.choices)
+    min_price = price_field(_("Price from"))
+    max_price = price_field(_("Price to"))
+    active = BooleanField(required=False, label=_("Active only"))
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        for name, field in self.fields.items():
+            if name != 'active':
+                field.widget.attrs['class'] = 'form-control'
+
+
+class WatchlistBulkForm(Form):
+    """Add/remove many listings to/from watchlist at once."""
+    ADD = 'add'
+    REMOVE = 'remove'
+
+    action = ChoiceField(choices=[(ADD, _("Watch")), (REMOVE, _("Unwatch"))])
+    # Existing listings are fetched with one pk IN (...) query
+    listings = ModelMultipleChoiceField(
+        queryset=ListingModel.objects.only('pk'),
+        widget=MultipleHiddenInput)
@@ -0,0 +1,233 @@
+"""
+Listing photo pipeline.
+
+Listing photo is uploaded with the listing form or given as photo_url;
+either way the listing is queued (photo_status PENDING) and the image
+worker (manage.py process_images) then
+1. reads the upload or downloads photo_url (public hosts only, every
+   redirect checked too);
+2. decodes it and re-encodes JPEG of the original and of PHOTO_WIDTHS
+   variants in a process pool (CPU-bound, in parallel with downloads of
+   the next photos);
+3. stores them under names of its own (uploads are kept apart under
+   uploads/ and deleted), so pages never hotlink third-party hosts and
+   only images it encoded itself are ever served;
+4. marks the listing READY (version bump, page caches invalidated), or
+   FAILED with nothing stored.
+List pages show the small variant, the listing page the large one with
+srcset of all variants.
+
+Stored names never change content (random names, variant names derive
+from them), media() serves them cacheable forever.
+"""
+import ipaddress
+import re
+import secrets
+import socket
+import time
+import urllib.parse
+import urllib.request
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.http import FileResponse, Http404
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import require_http_methods
+from PIL import Image, ImageOps
+
+from .cache import invalidate_listing, invalidate_listings
+from .models import (PHOTO_WIDTHS, ListingModel, photo_variant_name,
+                     touched)
+
+PhotoStatus = ListingModel.PhotoStatus
+
+# Listings taken from the queue per round
+BATCH_SIZE = 20
+# Worker loop sleep when queue is empty (seconds)
+INTERVAL = 10
+DOWNLOAD_TIMEOUT = 10
+MAX_PHOTO_BYTES = 10 * 1024 * 1024
+JPEG_QUALITY = 80
+# Stored photo is scaled down to this width
+ORIGINAL_WIDTH = 2048
+# Cache lifetime of stored photos (immutable names)
+MEDIA_MAX_AGE = 365 * 24 * 3600
+# Names of photos stored by save() and of their variants
+STORED_NAME = re.compile(
+    r'(thumbnails/)?listings/\d{4}/\d{2}/\d+-[0-9a-f]{16}(-\d+w)?\.jpg')
+
+# Pillow < 9.1 has no Image.Resampling
+LANCZOS = getattr(Image, 'Resampling', Image).LANCZOS
+
+
+def encode(data, widths, quality=JPEG_QUALITY):
+    """
+    Decode image data, return JPEG bytes of it (up to ORIGINAL_WIDTH)
+    and of it scaled down to every width (not up),
+    (original, {width: bytes}). Runs in worker processes: no Django
+    access.
+    """
+    with Image.open(BytesIO(data)) as image:
+        # JPEG decoder scales down while decoding (much less work)
+        image.draft('RGB', (ORIGINAL_WIDTH, ORIGINAL_WIDTH))
+        image = ImageOps.exif_transpose(image).convert('RGB')
+    original = _jpeg(image, ORIGINAL_WIDTH, quality)
+    return original, {width: _jpeg(image, width, quality)
+                      for width in widths}
+
+
+def _jpeg(image, width, quality):
+    """JPEG bytes of image scaled down to width."""
+    if image.width > width:
+        height = max(1, round(image.height * width / image.width))
+        image = image.resize((width, height), LANCZOS)
+    output = BytesIO()
+    image.save(output, 'JPEG', quality=quality, optimize=True,
+               progressive=True)
+    return output.getvalue()
+
+
+def _check_public_url(url):
+    """Refuse non-http(s) URLs and loopback/private hosts."""
+    parts = urllib.parse.urlsplit(url)
+    if parts.scheme not in ('http', 'https'):
+        raise ValueError(f"Unsupported photo URL {url!r}")
+    if not parts.hostname:
+        raise ValueError(f"Invalid photo URL {url!r}")
+    for info in socket.getaddrinfo(parts.hostname, None):
+        if not ipaddress.ip_address(info[4][0]).is_global:
+            raise ValueError(f"Photo host {parts.hostname} is not public")
+
+
+class _PublicRedirectHandler(urllib.request.HTTPRedirectHandler):
+    """Follow redirects to public http(s) URLs only."""
+
+    def redirect_request(self, request, fp, code, msg, headers, newurl):
+        _check_public_url(newurl)
+        return super().redirect_request(request, fp, code, msg, headers,
+                                        newurl)
+
+
+_opener = urllib.request.build_opener(_PublicRedirectHandler)
+
+
+def download(url):
+    """Bytes of image at public http(s) URL, up to MAX_PHOTO_BYTES."""
+    _check_public_url(url)
+    request = urllib.request.Request(
+        url, headers={'User-Agent': 'auction-commerce image worker'})
+    with _opener.open(request, timeout=DOWNLOAD_TIMEOUT) as response:
+        data = response.read(MAX_PHOTO_BYTES + 1)
+    if len(data) > MAX_PHOTO_BYTES:
+        raise ValueError(f"Photo at {url} is larger than {MAX_PHOTO_BYTES}")
+    return data
+
+
+def read(listing):
+    """Bytes of listing photo (upload or photo_url), nothing is stored."""
+    if listing.photo:
+        with default_storage.open(listing.photo.name) as file:
+            return file.read(MAX_PHOTO_BYTES + 1)
+    return download(listing.photo_url)
+
+
+def save(listing, original, variants):
+    """Store encoded photo under a new name, return the name."""
+    name = default_storage.save(
+        timezone.now().strftime('listings/%Y/%m/') +
+        f'{listing.pk}-{secrets.token_hex(8)}.jpg', ContentFile(original))
+    for width, data in variants.items():
+        default_storage.save(photo_variant_name(name, width),
+                             ContentFile(data))
+    return name
+
+
+def delete(name):
+    """Delete stored photo and its variants."""
+    for stored in [name] + [photo_variant_name(name, width)
+                            for width in PHOTO_WIDTHS.values()]:
+        default_storage.delete(stored)
+
+
+def finish(listing, name, status):
+    """
+    Record result unless listing photo changed meanwhile, return whether
+    it was recorded.
+    """
+    updated = ListingModel.objects.filter(
+        pk=listing.pk, photo_status=PhotoStatus.PENDING,
+        photo=listing.photo.name, photo_url=listing.photo_url,
+    ).update(**touched(), photo=name, photo_status=status)
+    if updated:
+        invalidate_listing(listing.pk)
+        invalidate_listings()
+        if listing.photo:
+            # Upload is replaced (or refused)
+            default_storage.delete(listing.photo.name)
+    return bool(updated)
+
+
+def process_pending(executor, batch_size=BATCH_SIZE, log=None):
+    """Process one batch of queued photos, return number processed."""
+    listings = list(ListingModel.objects.filter(
+        photo_status=PhotoStatus.PENDING).order_by('pk').only(
+            'photo', 'photo_url', 'photo_status')[:batch_size])
+    widths = list(PHOTO_WIDTHS.values())
+    jobs = []
+    for listing in listings:
+        try:
+            data = read(listing)
+        except (OSError, ValueError) as error:
+            if log:
+                log(f"Listing {listing.pk}: {error}")
+            finish(listing, '', PhotoStatus.FAILED)
+            continue
+        # Encoded while the next photos are downloaded
+        jobs.append((listing, executor.submit(encode, data, widths)))
+
+    for listing, future in jobs:
+        try:
+            original, variants = future.result()
+        except (OSError, ValueError, Image.DecompressionBombError) as error:
+            # Not an image (UnidentifiedImageError is OSError) or too big
+            if log:
+                log(f"Listing {listing.pk}: {error}")
+            finish(listing, '', PhotoStatus.FAILED)
+            continue
+        name = save(listing, original, variants)
+        if not finish(listing, name, PhotoStatus.READY):
+            # Photo changed meanwhile (queued again)
+            delete(name)
+    return len(listings)
+
+
+def run(interval=INTERVAL, batch_size=BATCH_SIZE, workers=None, log=None):
+    """Worker loop: process queued photos, sleep when queue is empty."""
+    with ProcessPoolExecutor(workers) as executor:
+        while True:
+            processed = process_pending(executor, batch_size, log)
+            if processed and log:
+                log(f"Processed {processed} photo(s)")
+            if processed < batch_size:
+                time.sleep(interval)
+
+
+@require_http_methods(['GET', 'HEAD'])
+def media(request, path):
+    """Stored photo or variant (MEDIA_URL), cacheable forever."""
+    # Only JPEG encoded by the worker is served (not pending uploads)
+    if not STORED_NAME.fullmatch(path):
+        raise Http404()
+    try:
+        file = default_storage.open(path)
+    except (OSError, SuspiciousFileOperation):
+        raise Http404()
+    response = FileResponse(file, content_type='image/jpeg')
+    response['X-Content-Type-Options'] = 'nosniff'
+    patch_cache_control(response, public=True, max_age=MEDIA_MAX_AGE,
+                        immutable=True)
+    return response
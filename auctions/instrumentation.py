@@ -0,0 +1,329 @@
+"""
+Opt-in per-request instrumentation (settings.INSTRUMENTATION).
+
+InstrumentationMiddleware records per view name (auctions/urls.py):
+- total latency, DB query count and time (execute_wrapper of every
+  connection), template render time, cache hits and misses;
+- duplicate queries: SQL fingerprint (literals and IN lists collapsed)
+  executed DUPLICATE_THRESHOLD or more times in one request, logged
+  with the project stack frame which executed it (N+1 queries);
+- cProfile capture of every INSTRUMENTATION_PROFILE_EVERY-th request,
+  written to INSTRUMENTATION_PROFILE_DIR (pstats/snakeviz format).
+
+Aggregates are kept per process (every gunicorn worker exposes its own)
+and served by metrics() in Prometheus text exposition format to staff
+and INTERNAL_IPS.
+"""
+import cProfile
+import itertools
+import logging
+import os
+import re
+import threading
+import time
+import traceback
+from contextlib import ExitStack
+
+from asgiref.local import Local
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+from django.http import Http404, HttpResponse
+from django.template.backends.django import Template
+from django.views.decorators.http import require_http_methods
+
+logger = logging.getLogger(__name__)
+
+# Executions of one SQL fingerprint per request reported as duplicates
+DUPLICATE_THRESHOLD = 3
+
+# Histogram buckets (le)
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERIES_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+
+# Recorded request (thread or async task)
+_state = Local()
+
+_LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_IN_LIST_RE = re.compile(r'\bIN \((?:\s*(?:%s|\?)\s*,?)+\)', re.IGNORECASE)
+# Frames not reported as origin of a query
+_SKIPPED_FRAMES = (os.path.abspath(__file__), 'site-packages')
+
+
+def fingerprint(sql):
+    """SQL with literals and IN lists replaced (same query, any values)."""
+    sql = _LITERAL_RE.sub('?', sql)
+    return _IN_LIST_RE.sub('IN (...)', sql)
+
+
+def origin():
+    """Innermost project frame of current stack ('file:line in function')."""
+    base = str(settings.BASE_DIR)
+    for frame in reversed(traceback.extract_stack()):
+        if frame.filename.startswith(base) and \
+                not any(part in frame.filename for part in _SKIPPED_FRAMES):
+            return (f'{os.path.relpath(frame.filename, base)}:{frame.lineno} '
+                    f'in {frame.name}')
+    return 'unknown'
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.count += 1
+        self.sum += value
+
+
+class Registry:
+    """Histograms and counters labelled with view name."""
+    # name: (type, help, buckets)
+    METRICS = {
+        'auctions_request_duration_seconds': (
+            'histogram', 'Request latency.', SECONDS_BUCKETS),
+        'auctions_request_queries': (
+            'histogram', 'Database queries per request.', QUERIES_BUCKETS),
+        'auctions_request_db_duration_seconds': (
+            'histogram', 'Database time per request.', SECONDS_BUCKETS),
+        'auctions_request_template_duration_seconds': (
+            'histogram', 'Template render time per request.',
+            SECONDS_BUCKETS),
+        'auctions_cache_hits_total': ('counter', 'Cache hits.', None),
+        'auctions_cache_misses_total': ('counter', 'Cache misses.', None),
+        'auctions_duplicate_queries_total': (
+            'counter', 'Repeated SQL fingerprints (N+1 queries).', None),
+    }
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.values = {name: {} for name in self.METRICS}
+
+    def record(self, view, **observations):
+        with self.lock:
+            for name, value in observations.items():
+                kind, help_text, buckets = self.METRICS[name]
+                values = self.values[name]
+                if kind == 'histogram':
+                    values.setdefault(view, Histogram(buckets)).observe(value)
+                else:
+                    values[view] = values.get(view, 0) + value
+
+    def exposition(self):
+        """Prometheus text format of all metrics."""
+        lines = []
+        with self.lock:
+            for name, (kind, help_text, buckets) in self.METRICS.items():
+                lines += [f'# HELP {name} {help_text}',
+                          f'# TYPE {name} {kind}']
+                for view, value in sorted(self.values[name].items()):
+                    label = f'view="{view}"'
+                    if kind == 'counter':
+                        lines.append(f'{name}{{{label}}} {value}')
+                        continue
+                    for bound, count in zip(value.buckets, value.counts):
+                        lines.append(
+                            f'{name}_bucket{{{label},le="{bound}"}} {count}')
+                    lines += [
+                        f'{name}_bucket{{{label},le="+Inf"}} {value.count}',
+                        f'{name}_sum{{{label}}} {value.sum}',
+                        f'{name}_count{{{label}}} {value.count}']
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+class RequestStats:
+    """Measurements of one request."""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0
+        self.template_time = 0
+        self.template_depth = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.cache_depth = 0
+        # fingerprint: [count, origin of first execution]
+        self.fingerprints = {}
+
+    def duplicates(self):
+        return {sql: where for sql, (count, where)
+                in self.fingerprints.items() if count >= DUPLICATE_THRESHOLD}
+
+
+def _current():
+    return getattr(_state, 'stats', None)
+
+
+def _query_wrapper(execute, sql, params, many, context):
+    stats = _current()
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        if stats is not None:
+            stats.queries += 1
+            stats.db_time += time.perf_counter() - started
+            key = fingerprint(sql)
+            if key in stats.fingerprints:
+                stats.fingerprints[key][0] += 1
+            else:
+                stats.fingerprints[key] = [1, origin()]
+
+
+def _timed_render(render):
+    """Template.render timing (outermost render of nested render calls)."""
+    def wrapper(self, *args, **kwargs):
+        stats = _current()
+        if stats is None:
+            return render(self, *args, **kwargs)
+        stats.template_depth += 1
+        started = time.perf_counter()
+        try:
+            return render(self, *args, **kwargs)
+        finally:
+            stats.template_depth -= 1
+            if not stats.template_depth:
+                stats.template_time += time.perf_counter() - started
+    wrapper.instrumented = True
+    return wrapper
+
+
+_MISSING = object()
+
+
+def _counted_get(get):
+    def wrapper(self, key, default=None, version=None):
+        stats = _current()
+        if stats is None or stats.cache_depth:
+            return get(self, key, default, version)
+        stats.cache_depth += 1
+        try:
+            value = get(self, key, _MISSING, version)
+        finally:
+            stats.cache_depth -= 1
+        if value is _MISSING:
+            stats.cache_misses += 1
+            return default
+        stats.cache_hits += 1
+        return value
+    wrapper.instrumented = True
+    return wrapper
+
+
+def _counted_get_many(get_many):
+    def wrapper(self, keys, version=None):
+        stats = _current()
+        if stats is None or stats.cache_depth:
+            return get_many(self, keys, version)
+        keys = list(keys)
+        stats.cache_depth += 1
+        try:
+            values = get_many(self, keys, version)
+        finally:
+            stats.cache_depth -= 1
+        stats.cache_hits += len(values)
+        stats.cache_misses += len(keys) - len(values)
+        return values
+    wrapper.instrumented = True
+    return wrapper
+
+
+def install():
+    """Wrap template rendering and get methods of configured caches."""
+    if not getattr(Template.render, 'instrumented', False):
+        Template.render = _timed_render(Template.render)
+    for alias in settings.CACHES:
+        backend = type(caches[alias])
+        for name, wrap in (('get', _counted_get),
+                           ('get_many', _counted_get_many)):
+            method = getattr(backend, name)
+            if not getattr(method, 'instrumented', False):
+                setattr(backend, name, wrap(method))
+
+
+class InstrumentationMiddleware:
+    """Record measurements of every request (see module docstring)."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.profile_every = getattr(
+            settings, 'INSTRUMENTATION_PROFILE_EVERY', 0)
+        self.profile_dir = getattr(settings, 'INSTRUMENTATION_PROFILE_DIR',
+                                   None)
+        self.requests = itertools.count(1)
+        # One cProfile at a time (process-wide profiling hooks)
+        self.profile_lock = threading.Lock()
+        install()
+
+    def __call__(self, request):
+        stats = _state.stats = RequestStats()
+        profile = None
+        number = next(self.requests)
+        if self.profile_every and number % self.profile_every == 0 and \
+                self.profile_lock.acquire(blocking=False):
+            profile = cProfile.Profile()
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(_query_wrapper))
+                if profile is None:
+                    response = self.get_response(request)
+                else:
+                    try:
+                        response = profile.runcall(self.get_response,
+                                                   request)
+                    finally:
+                        self.profile_lock.release()
+        finally:
+            _state.stats = None
+        duration = time.perf_counter() - started
+
+        match = request.resolver_match
+        if match is None:
+            # Not a view (static files, 404 of unknown URL)
+            return response
+        view = match.view_name
+        duplicates = stats.duplicates()
+        for sql, where in duplicates.items():
+            logger.warning("%s: query executed %d times (N+1?) at %s: %s",
+                           view, stats.fingerprints[sql][0], where, sql)
+        registry.record(
+            view,
+            auctions_request_duration_seconds=duration,
+            auctions_request_queries=stats.queries,
+            auctions_request_db_duration_seconds=stats.db_time,
+            auctions_request_template_duration_seconds=stats.template_time,
+            auctions_cache_hits_total=stats.cache_hits,
+            auctions_cache_misses_total=stats.cache_misses,
+            auctions_duplicate_queries_total=len(duplicates))
+        if profile is not None and self.profile_dir:
+            self.save_profile(profile, view, number)
+        return response
+
+    def save_profile(self, profile, view, number):
+        os.makedirs(self.profile_dir, exist_ok=True)
+        name = f'{view.replace(":", "-")}-{os.getpid()}-{number}'
+        profile.dump_stats(os.path.join(self.profile_dir, f'{name}.prof'))
+
+
+@require_http_methods(['GET'])
+def metrics(request):
+    """Prometheus scrape endpoint (staff or INTERNAL_IPS)."""
+    if not getattr(settings, 'INSTRUMENTATION', False):
+        raise Http404()
+    if not request.user.is_staff and \
+            request.META.get('REMOTE_ADDR') not in settings.INTERNAL_IPS:
+        raise Http404()
+    return HttpResponse(registry.exposition(),
+                        content_type='text/plain; version=0.0.4')
@@ -0,0 +1,222 @@
+"""
+HTTP load driver (manage.py loadtest) for a running server.
+
+Every worker thread logs in as one generated user (auctions.marketplace)
+and replays a browse/bid/comment/watch mix (MIX, action: weight) for the
+run duration: listing targets are active listings read from the JSON
+API, picked with Zipf skew towards the hottest. Records latency of every
+request per action, reports throughput, errors and tail latency.
+"""
+import http.cookiejar
+import itertools
+import json
+import random
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from decimal import Decimal
+
+from django.conf import settings
+
+from .benchmark import percentile
+from .marketplace import (GENERATED_PASSWORD, USERNAME_PREFIX, WORDS,
+                          zipf_weights)
+from .models import ListingModel
+
+# Action: relative frequency
+MIX = {
+    'index': 25,
+    'category': 15,
+    'search': 10,
+    'listing': 35,
+    'bid': 8,
+    'comment': 3,
+    'watch': 4,
+}
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    """Measure the POST itself, not the page it redirects to."""
+
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class Session:
+    """Cookie (session, CSRF) keeping HTTP client of one virtual user."""
+
+    def __init__(self, base_url, language=None, timeout=30):
+        self.base_url = base_url.rstrip('/')
+        # Pages are served under language prefix (i18n_patterns)
+        self.prefix = f'/{language or settings.LANGUAGE_CODE}'
+        self.timeout = timeout
+        self.cookies = http.cookiejar.CookieJar()
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(self.cookies), _NoRedirect)
+
+    def csrf_token(self):
+        for cookie in self.cookies:
+            if cookie.name == 'csrftoken':
+                return cookie.value
+        return ''
+
+    def request(self, path, data=None):
+        """Return response status (redirects are not followed)."""
+        headers = {}
+        if data is not None:
+            token = self.csrf_token()
+            data = urllib.parse.urlencode(
+                dict(data, csrfmiddlewaretoken=token)).encode()
+            headers = {'X-CSRFToken': token, 'Referer': self.base_url + '/'}
+        request = urllib.request.Request(
+            self.base_url + self.prefix + path, data, headers)
+        try:
+            with self.opener.open(request, timeout=self.timeout) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as error:
+            # Including not followed redirects
+            return error.code
+
+    def login(self, username, password=GENERATED_PASSWORD):
+        self.request('/login/')  # CSRF cookie
+        return self.request('/login/', {'username': username,
+                                        'password': password}) == 302
+
+
+def active_listings(base_url, language=None, limit=1000):
+    """(pk, current bid) of active listings from API (ending soonest)."""
+    session = Session(base_url, language)
+    listings, cursor = [], None
+    while len(listings) < limit:
+        query = {'size': 100}
+        if cursor:
+            query['cursor'] = cursor
+        url = (f'{session.base_url}/api/v1/listings/?'
+               f'{urllib.parse.urlencode(query)}')
+        with urllib.request.urlopen(url, timeout=session.timeout) as response:
+            page = json.loads(response.read())
+        listings += [(row['id'], Decimal(row['current_bid']))
+                     for row in page['results']]
+        cursor = page['next']
+        if not cursor:
+            break
+    return listings[:limit]
+
+
+class LoadTest:
+    """Run workers against base_url, collect latencies per action."""
+
+    def __init__(self, base_url, users, concurrency=10, duration=60,
+                 mix=None, think_time=0, seed=0, language=None):
+        self.base_url = base_url
+        self.language = language
+        self.users = users
+        self.concurrency = concurrency
+        self.duration = duration
+        self.mix = mix or MIX
+        self.think_time = think_time
+        self.seed = seed
+        self.lock = threading.Lock()
+        # action: [latency seconds], [error status or exception name]
+        self.latencies = {action: [] for action in self.mix}
+        self.errors = {action: [] for action in self.mix}
+
+    def run(self):
+        listings = active_listings(self.base_url, self.language)
+        if not listings:
+            raise ValueError("No active listings to load (generate some).")
+        rng = random.Random(self.seed)
+        rng.shuffle(listings)
+        self.listings = listings
+        self.weights = zipf_weights(len(listings))
+        # Shared current prices: bids of all workers raise them
+        self.prices = dict(listings)
+
+        self.deadline = time.monotonic() + self.duration
+        started = time.monotonic()
+        workers = [threading.Thread(target=self.worker, args=(number,))
+                   for number in range(self.concurrency)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.elapsed = time.monotonic() - started
+        return self.report()
+
+    def worker(self, number):
+        rng = random.Random(self.seed * 1000 + number)
+        session = Session(self.base_url, self.language)
+        # Distinct users while there are enough of them
+        if not session.login(self.users[number % len(self.users)]):
+            self.record('login', None, 'login failed')
+            return
+        actions, weights = zip(*self.mix.items())
+        cum_weights = list(itertools.accumulate(weights))
+        while time.monotonic() < self.deadline:
+            action = rng.choices(actions, cum_weights=cum_weights)[0]
+            path, data = self.request_of(action, rng)
+            started = time.perf_counter()
+            try:
+                status = session.request(path, data)
+                error = status if status >= 400 else None
+            except OSError as exception:
+                error = type(exception).__name__
+            self.record(action, time.perf_counter() - started, error)
+            if self.think_time:
+                time.sleep(rng.expovariate(1 / self.think_time))
+
+    def request_of(self, action, rng):
+        """(path, POST data or None) of one action."""
+        pk = rng.choices(self.listings, cum_weights=self.weights)[0][0]
+        if action == 'index':
+            return '/', None
+        if action == 'category':
+            category = rng.choice(ListingModel.Category.values)
+            return f'/listings/categories/{category}/', None
+        if action == 'search':
+            return f'/listings/search/?q={rng.choice(WORDS)}', None
+        if action == 'listing':
+            return f'/listings/{pk}', None
+        if action == 'bid':
+            with self.lock:
+                self.prices[pk] += Decimal(rng.randint(1, 5))
+                amount = self.prices[pk]
+            return f'/bid/{pk}/', {'bid': amount}
+        if action == 'comment':
+            return f'/comment/{pk}/', {'comment': ' '.join(
+                rng.choices(WORDS, k=rng.randint(3, 15)))}
+        if action == 'watch':
+            return f'/watch/{pk}/', {}
+        raise ValueError(f"Unknown action {action!r}")
+
+    def record(self, action, latency, error=None):
+        with self.lock:
+            if latency is not None:
+                self.latencies.setdefault(action, []).append(latency)
+            if error is not None:
+                self.errors.setdefault(action, []).append(error)
+
+    def report(self):
+        """Rows of action, requests, errors, req/s and latency ms."""
+        rows = []
+        for action in sorted(set(self.latencies) | set(self.errors)):
+            latencies = [l * 1000 for l in self.latencies.get(action, [])]
+            rows.append({
+                'action': action,
+                'requests': len(latencies),
+                'errors': len(self.errors.get(action, [])),
+                'rps': len(latencies) / self.elapsed,
+                'p50': percentile(latencies, 50) if latencies else 0,
+                'p95': percentile(latencies, 95) if latencies else 0,
+                'p99': percentile(latencies, 99) if latencies else 0,
+                'max': max(latencies, default=0),
+            })
+        return rows
+
+
+def usernames(count):
+    """Usernames of generated users (marketplace.Generator)."""
+    return [f'{USERNAME_PREFIX}{i}' for i in range(count)]
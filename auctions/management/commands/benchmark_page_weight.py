@@ -0,0 +1,111 @@
+import os
+import random
+import re
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from io import BytesIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.staticfiles import finders
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from auctions import images
+from auctions.models import ListingModel
+
+IMG_SRC_RE = re.compile(r'<img [^>]*src="([^"]+)"')
+LISTING_ID_RE = re.compile(r'data-listing-id="(\d+)"')
+
+
+def camera_photo(rng, size=(2400, 1800)):
+    """JPEG of camera-like size and entropy (gradient with noise)."""
+    noise = Image.effect_noise(size, 40).convert('RGB')
+    gradient = Image.linear_gradient('L').resize(size).convert('RGB')
+    tint = Image.new('RGB', size, tuple(rng.randrange(256) for i in range(3)))
+    image = Image.blend(Image.blend(gradient, tint, 0.5), noise, 0.3)
+    output = BytesIO()
+    image.save(output, 'JPEG', quality=90)
+    return output.getvalue()
+
+
+class Command(BaseCommand):
+    help = ("Seed listings with camera-size photos into a throwaway test "
+            "database, process them (auctions.images) and compare index "
+            "page weight (HTML + images) of full-size photos and thumbnails.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--listings', type=int, default=20,
+                            help="Listings with photos (one index page).")
+        parser.add_argument('--workers', type=int, default=None,
+                            help="Resizing processes.")
+
+    def handle(self, *args, **options):
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        media_root = tempfile.mkdtemp()
+        try:
+            with override_settings(MEDIA_ROOT=media_root,
+                                   ALLOWED_HOSTS=['testserver']):
+                self.measure(options['listings'], options['workers'])
+        finally:
+            shutil.rmtree(media_root)
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def measure(self, count, workers):
+        rng = random.Random(0)
+        seller = get_user_model().objects.create_user(
+            'photo-bench', phone='+79999999997')
+        now = timezone.now()
+        originals = {}
+        for i in range(count):
+            listing = ListingModel(
+                seller=seller, title=f'Photo {i}', condition='NEW',
+                starting_price=10, category=1,
+                start_datetime=now - timedelta(hours=1),
+                end_datetime=now + timedelta(hours=1 + i))
+            data = camera_photo(rng)
+            listing.photo.save(f'bench-{i}.jpg', ContentFile(data),
+                               save=False)
+            listing.photo_status = ListingModel.PhotoStatus.PENDING
+            listing.save()
+            originals[listing.pk] = len(data)
+
+        started = time.perf_counter()
+        with ProcessPoolExecutor(workers) as executor:
+            while images.process_pending(executor):
+                pass
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f"Processed {count} photos in {elapsed:.2f} s "
+                          f"({count / elapsed:.1f} photos/s)")
+
+        client = Client()
+        response = client.get(reverse('index'))
+        page = response.content.decode()
+        html = len(response.content)
+        # Former template: full-size photo of every listing
+        before = html + sum(originals[int(pk)]
+                            for pk in LISTING_ID_RE.findall(page))
+        after = html
+        for src in set(IMG_SRC_RE.findall(page)):
+            if src.startswith(settings.MEDIA_URL):
+                after += len(b''.join(client.get(src).streaming_content))
+            else:
+                # Placeholder of unprocessed photos
+                after += os.path.getsize(
+                    finders.find(src[len(settings.STATIC_URL):]))
+        self.stdout.write(f'{"":>12}{"HTML KB":>10}{"images KB":>11}'
+                          f'{"total KB":>10}')
+        for name, total in (('full-size', before), ('thumbnails', after)):
+            self.stdout.write(f'{name:>12}{html / 1024:>10.1f}'
+                              f'{(total - html) / 1024:>11.1f}'
+                              f'{total / 1024:>10.1f}')
@@ -0,0 +1,113 @@
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+
+from auctions.benchmark import percentile
+from auctions.models import ListingModel
+
+# (min_price, max_price) of measured filters
+RANGES = {
+    'narrow': (Decimal('100.00'), Decimal('101.00')),
+    'wide': (Decimal('10.00'), Decimal('900.00')),
+}
+PAGE_SIZE = 20
+
+
+def indexed(min_price, max_price):
+    """Filter on stored current_price (listing_open_price_idx)."""
+    return ListingModel.objects.filter(
+        closed=False, current_price__gte=min_price,
+        current_price__lte=max_price)
+
+
+def computed(min_price, max_price):
+    """Former filter: highest bid, or starting price before first bid."""
+    return ListingModel.objects.filter(
+        Q(high_bid_amount__gte=min_price) |
+        Q(high_bid_amount__isnull=True, starting_price__gte=min_price),
+        Q(high_bid_amount__lte=max_price) |
+        Q(high_bid_amount__isnull=True, starting_price__lte=max_price),
+        closed=False)
+
+
+class Command(BaseCommand):
+    help = ("Grow listing table in a throwaway test database and compare "
+            "price range queries on indexed current_price with the "
+            "computed price filter at every size.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', type=int, nargs='+', default=[1000, 10000, 100000],
+            help="Listing table sizes to measure.")
+        parser.add_argument(
+            '--repeat', type=int, default=20,
+            help="Runs of every query per size.")
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            self.run(options['sizes'], options['repeat'],
+                     options['batch_size'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def run(self, sizes, repeat, batch_size):
+        rng = random.Random(0)
+        seller = get_user_model().objects.create_user(
+            'price-bench', phone='+79999999998')
+        filters = {'indexed': indexed, 'computed': computed}
+
+        self.stdout.write(f'{"listings":>10}' + ''.join(
+            f'{f"{name} {kind} ms":>20}'
+            for name in RANGES for kind in filters))
+        count = 0
+        for size in sorted(sizes):
+            while count < size:
+                batch = min(batch_size, size - count)
+                self.add_listings(seller, batch, rng)
+                count += batch
+            timings = []
+            for bounds in RANGES.values():
+                for queryset in filters.values():
+                    runs = []
+                    for i in range(repeat):
+                        started = time.perf_counter()
+                        # Result size and first page (cheapest first)
+                        queryset(*bounds).count()
+                        list(queryset(*bounds).order_by(
+                            'current_price', 'pk')[:PAGE_SIZE])
+                        runs.append((time.perf_counter() - started) * 1000)
+                    timings.append(percentile(runs, 50))
+            self.stdout.write(f'{count:>10}' +
+                              ''.join(f'{t:>20.2f}' for t in timings))
+
+    def add_listings(self, seller, count, rng):
+        now = timezone.now()
+        listings = []
+        for i in range(count):
+            price = Decimal(rng.randint(100, 100000)) / 100
+            listing = ListingModel(
+                seller=seller, title=f'Item {i}', condition='NEW',
+                starting_price=price,
+                category=rng.choice(ListingModel.Category.values),
+                start_datetime=now - timedelta(hours=1),
+                end_datetime=now + timedelta(hours=rng.randint(1, 240)),
+                closed=rng.random() < 0.1)
+            # Half of listings were bid on (denormalized bid columns)
+            if rng.random() < 0.5:
+                listing.bid_count = rng.randint(1, 20)
+                listing.high_bid_amount = (
+                    price + Decimal(rng.randint(1, 5000)) / 100)
+            # bulk_create doesn't call save()
+            listing.current_price = listing.current_bid
+            listings.append(listing)
+        ListingModel.objects.bulk_create(listings)
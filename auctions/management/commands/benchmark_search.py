@@ -0,0 +1,94 @@
+import random
+import time
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from auctions.benchmark import percentile
+from auctions.models import ListingModel, SearchTermModel
+from auctions.search import index_listings, search_listings
+
+VOCABULARY_SIZE = 20000
+
+
+class Command(BaseCommand):
+    help = ("Grow listing table in a throwaway test database and measure "
+            "search query time at every size.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', type=int, nargs='+', default=[1000, 10000, 100000],
+            help="Listing table sizes to measure (e.g. up to 1000000).")
+        parser.add_argument(
+            '--repeat', type=int, default=20,
+            help="Runs of every query per size.")
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            self.run(options['sizes'], options['repeat'],
+                     options['batch_size'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def run(self, sizes, repeat, batch_size):
+        rng = random.Random(0)
+        seller = get_user_model().objects.create_user(
+            'search-bench', phone='+79999999999')
+        # Zipf-like word frequencies: few common words, long tail of rare
+        words = [f'word{i}' for i in range(VOCABULARY_SIZE)]
+        weights = [1 / (rank + 1) for rank in range(VOCABULARY_SIZE)]
+        queries = {
+            'rare term': 'word15000',
+            'medium term': 'word500',
+            'two terms': 'word50 word200',
+            'filtered': 'word200',
+        }
+
+        self.stdout.write(f'{"listings":>10}{"terms":>11}' + ''.join(
+            f'{name + " ms":>16}' for name in queries))
+        count = 0
+        for size in sorted(sizes):
+            while count < size:
+                batch = min(batch_size, size - count)
+                self.add_listings(seller, batch, words, weights, rng)
+                count += batch
+            timings = []
+            for name, query in queries.items():
+                filters = {'category': 1, 'active': True} \
+                    if name == 'filtered' else {}
+                runs = []
+                for i in range(repeat):
+                    started = time.perf_counter()
+                    list(search_listings(query, **filters))
+                    runs.append((time.perf_counter() - started) * 1000)
+                timings.append(percentile(runs, 50))
+            self.stdout.write(
+                f'{count:>10}{SearchTermModel.objects.count():>11}' +
+                ''.join(f'{t:>16.2f}' for t in timings))
+
+    def add_listings(self, seller, count, words, weights, rng):
+        now = timezone.now()
+        last = ListingModel.objects.order_by('-pk').values_list(
+            'pk', flat=True).first() or 0
+        listings = [
+            ListingModel(
+                seller=seller,
+                title=' '.join(rng.choices(words, weights, k=5)),
+                description=' '.join(rng.choices(words, weights, k=30)),
+                condition='NEW', starting_price=rng.randint(1, 1000),
+                category=rng.choice(ListingModel.Category.values),
+                start_datetime=now - timedelta(hours=1),
+                end_datetime=now + timedelta(hours=rng.randint(1, 240)))
+            for i in range(count)
+        ]
+        # bulk_create doesn't call save()
+        for listing in listings:
+            listing.current_price = listing.starting_price
+        ListingModel.objects.bulk_create(listings)
+        index_listings(ListingModel.objects.filter(pk__gt=last))
@@ -0,0 +1,100 @@
+import importlib.util
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from auctions.benchmark import percentile
+
+# Server command lines ({port} is replaced), module that must be installed
+SERVERS = {
+    'runserver': ([sys.executable, 'manage.py', 'runserver', '--noreload',
+                   '127.0.0.1:{port}'], None, {}),
+    'wsgi': ([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py',
+              '--bind', '127.0.0.1:{port}'], 'gunicorn',
+             {'SERVER_MODE': 'wsgi'}),
+    'asgi': ([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py',
+              '--bind', '127.0.0.1:{port}'], 'uvicorn',
+             {'SERVER_MODE': 'asgi'}),
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class Command(BaseCommand):
+    help = ("Start every server (runserver, gunicorn WSGI/ASGI workers) "
+            "repeatedly and measure time to first successful response.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--servers', nargs='+', choices=list(SERVERS),
+            default=list(SERVERS), help="Servers to measure.")
+        parser.add_argument(
+            '--repeat', type=int, default=5,
+            help="Starts of every server.")
+        parser.add_argument(
+            '--path', default='/', help="Requested URL path.")
+        parser.add_argument(
+            '--server-settings', default='commerce.settings_production',
+            help="DJANGO_SETTINGS_MODULE of started servers.")
+        parser.add_argument(
+            '--timeout', type=float, default=60,
+            help="Seconds to wait for the first response.")
+
+    def handle(self, *args, **options):
+        environ = dict(os.environ,
+                       DJANGO_SETTINGS_MODULE=options['server_settings'])
+        # Throwaway key, production settings require one
+        environ.setdefault('SECRET_KEY', settings.SECRET_KEY or 'benchmark')
+
+        self.stdout.write(f'{"server":>10}{"p50 s":>9}{"max s":>9}')
+        for name in options['servers']:
+            command, module, extra = SERVERS[name]
+            if module and importlib.util.find_spec(module) is None:
+                self.stdout.write(f'{name:>10}  skipped ({module} is not '
+                                  f'installed)')
+                continue
+            runs = [self.measure(command, dict(environ, **extra),
+                                 options['path'], options['timeout'])
+                    for i in range(options['repeat'])]
+            self.stdout.write(f'{name:>10}{percentile(runs, 50):>9.2f}'
+                              f'{max(runs):>9.2f}')
+
+    def measure(self, command, environ, path, timeout):
+        """Seconds from server start to first response below 500."""
+        port = free_port()
+        started = time.perf_counter()
+        process = subprocess.Popen(
+            [part.format(port=port) for part in command],
+            cwd=settings.BASE_DIR, env=environ,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            while time.perf_counter() - started < timeout:
+                if process.poll() is not None:
+                    raise CommandError(f"{command[2]} exited with code "
+                                       f"{process.returncode}")
+                try:
+                    with urllib.request.urlopen(
+                            f'http://127.0.0.1:{port}{path}', timeout=5):
+                        return time.perf_counter() - started
+                except urllib.error.HTTPError as error:
+                    if error.code < 500:
+                        return time.perf_counter() - started
+                    raise CommandError(f"{path} answered {error.code}")
+                except OSError:
+                    # Not listening yet
+                    time.sleep(0.05)
+            raise CommandError(f"No response in {timeout} s")
+        finally:
+            process.terminate()
+            process.wait()
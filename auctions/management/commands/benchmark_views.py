@@ -0,0 +1,63 @@
+import random
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from auctions import benchmark
+
+
+class Command(BaseCommand):
+    help = ("Seed synthetic dataset into a throwaway test database and "
+            "benchmark every auctions view (queries, latency, bytes).")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scales', type=int, nargs='+', default=[1, 3],
+            help="Dataset sizes to measure (multiples of DATASET_SIZE).")
+        parser.add_argument(
+            '--repeat', type=int, default=5,
+            help="Requests per view and dataset size.")
+        parser.add_argument(
+            '--update-baseline', action='store_true',
+            help="Write query counts of the largest dataset as baseline.")
+
+    def handle(self, *args, **options):
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            results = self.measure(options['scales'], options['repeat'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        largest = results[-1]
+        if options['update_baseline']:
+            benchmark.save_baseline(largest)
+            self.stdout.write(f"Saved baseline to {benchmark.BASELINE_PATH}")
+            return
+
+        errors = []
+        for small, large in zip(results, results[1:]):
+            for name in benchmark.query_growth(small, large):
+                errors.append(f"{name}: query count grows with dataset size")
+        baseline = benchmark.load_baseline()
+        for name in benchmark.baseline_regressions(largest, baseline):
+            errors.append(f"{name}: {largest[name]['queries']} queries "
+                          f"(baseline {baseline.get(name, 0)})")
+        if errors:
+            raise CommandError('\n'.join(errors))
+        self.stdout.write(self.style.SUCCESS("No query count regressions"))
+
+    def measure(self, scales, repeat):
+        """Grow dataset to every scale and run the benchmark."""
+        rng = random.Random(0)
+        results, seeded = [], 0
+        for scale in sorted(scales):
+            benchmark.seed_scale(scale - seeded, rng)
+            seeded = scale
+            cases = benchmark.cases(benchmark.bench_user())
+            result = benchmark.run(cases, repeat)
+            self.stdout.write(f"\nDataset scale {scale}")
+            self.stdout.write(benchmark.format_results(result))
+            self.stdout.write(benchmark.format_comparison(result))
+            results.append(result)
+        return results
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from auctions import scheduler
+
+
+class Command(BaseCommand):
+    help = ("Close listings which end time passed, recording the winning "
+            "bid and final price.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop', action='store_true',
+            help="Keep running, wake up when the next listing ends.")
+        parser.add_argument(
+            '--max-interval', type=float, default=scheduler.MAX_INTERVAL,
+            help="Longest sleep between checks in loop mode (seconds).")
+        parser.add_argument(
+            '--batch-size', type=int, default=scheduler.BATCH_SIZE,
+            help="Listings closed per UPDATE.")
+
+    def handle(self, *args, **options):
+        if options['loop']:
+            scheduler.run(options['max_interval'], options['batch_size'],
+                          log=self.stdout.write)
+        else:
+            closed = scheduler.close_ended_listings(
+                batch_size=options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(
+                f"Closed {closed} listing(s)"))
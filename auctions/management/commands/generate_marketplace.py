@@ -0,0 +1,37 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from auctions.marketplace import GENERATED_PASSWORD, Generator
+
+
+class Command(BaseCommand):
+    help = ("Bulk generate synthetic users, listings, bids, comments and "
+            "watchlists with realistic distributions (auctions.marketplace) "
+            "into the configured database.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10000)
+        parser.add_argument('--listings', type=int, default=100000)
+        parser.add_argument('--bids', type=int, default=1000000)
+        parser.add_argument('--comments', type=int, default=200000)
+        parser.add_argument('--watches', type=int, default=200000)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=0,
+                            help="Random seed (same seed, same dataset).")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+
+        def log(message):
+            self.stdout.write(
+                f"[{time.perf_counter() - started:8.1f} s] {message}")
+
+        Generator(batch_size=options['batch_size'],
+                  rng=random.Random(options['seed']), log=log).generate(
+            users=options['users'], listings=options['listings'],
+            bids=options['bids'], comments=options['comments'],
+            watches=options['watches'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Done, users log in with password {GENERATED_PASSWORD!r}"))
@@ -0,0 +1,66 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from auctions.loadtest import MIX, LoadTest, usernames
+
+
+def parse_mix(value):
+    """'index=25,bid=10' to {'index': 25, 'bid': 10}."""
+    try:
+        mix = {action: int(weight) for action, weight in
+               (item.split('=') for item in value.split(','))}
+    except ValueError:
+        raise CommandError(f"Invalid mix {value!r} (action=weight,...)")
+    unknown = set(mix) - set(MIX)
+    if unknown:
+        raise CommandError(f"Unknown actions: {', '.join(sorted(unknown))}")
+    return mix
+
+
+class Command(BaseCommand):
+    help = ("Replay browse/bid/comment/watch mix of generated users "
+            "(generate_marketplace) against a running server and report "
+            "throughput and tail latency per action.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('url', help="Server base URL.")
+        parser.add_argument(
+            '--concurrency', type=int, default=10,
+            help="Concurrent virtual users (threads).")
+        parser.add_argument('--duration', type=float, default=60,
+                            help="Seconds to run.")
+        parser.add_argument(
+            '--users', type=int, default=1000,
+            help="Generated users to log in as (user0, user1, ...).")
+        parser.add_argument(
+            '--mix', type=parse_mix,
+            default=','.join(f'{a}={w}' for a, w in MIX.items()),
+            help="Action weights, e.g. index=25,listing=35,bid=8.")
+        parser.add_argument(
+            '--think-time', type=float, default=0,
+            help="Mean pause between requests of a user (seconds).")
+        parser.add_argument(
+            '--language', help="Page language prefix (LANGUAGE_CODE).")
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        test = LoadTest(options['url'], usernames(options['users']),
+                        concurrency=options['concurrency'],
+                        duration=options['duration'], mix=options['mix'],
+                        think_time=options['think_time'],
+                        seed=options['seed'], language=options['language'])
+        try:
+            rows = test.run()
+        except (OSError, ValueError) as error:
+            raise CommandError(error)
+
+        self.stdout.write(f'{"action":>10}{"requests":>10}{"errors":>8}'
+                          f'{"req/s":>9}{"p50 ms":>9}{"p95 ms":>9}'
+                          f'{"p99 ms":>9}{"max ms":>9}')
+        for row in rows:
+            self.stdout.write(
+                f'{row["action"]:>10}{row["requests"]:>10}'
+                f'{row["errors"]:>8}{row["rps"]:>9.1f}{row["p50"]:>9.1f}'
+                f'{row["p95"]:>9.1f}{row["p99"]:>9.1f}{row["max"]:>9.1f}')
+        total = sum(row['requests'] for row in rows)
+        self.stdout.write(f"{total} requests in {test.elapsed:.1f} s, "
+                          f"{total / test.elapsed:.1f} req/s")
@@ -0,0 +1,40 @@
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from auctions import images
+
+
+class Command(BaseCommand):
+    help = ("Copy queued listing photos into storage and resize them to "
+            "thumbnail variants in a process pool.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop', action='store_true',
+            help="Keep running, process new photos every interval.")
+        parser.add_argument(
+            '--interval', type=float, default=images.INTERVAL,
+            help="Sleep when queue is empty in loop mode (seconds).")
+        parser.add_argument(
+            '--batch-size', type=int, default=images.BATCH_SIZE,
+            help="Photos taken from the queue per round.")
+        parser.add_argument(
+            '--workers', type=int, default=None,
+            help="Resizing processes (default: number of CPUs).")
+
+    def handle(self, *args, **options):
+        if options['loop']:
+            images.run(options['interval'], options['batch_size'],
+                       options['workers'], log=self.stdout.write)
+            return
+
+        total = 0
+        with ProcessPoolExecutor(options['workers']) as executor:
+            while True:
+                processed = images.process_pending(
+                    executor, options['batch_size'], log=self.stdout.write)
+                total += processed
+                if processed < options['batch_size']:
+                    break
+        self.stdout.write(self.style.SUCCESS(f"Processed {total} photo(s)"))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from auctions.models import ListingModel
+from auctions.search import index_listings
+
+
+class Command(BaseCommand):
+    help = "Rebuild listing search index (e.g. after bulk imports)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        batch, total = [], 0
+        listings = ListingModel.objects.only('title', 'description')
+        for listing in listings.iterator(chunk_size=batch_size):
+            batch.append(listing)
+            if len(batch) == batch_size:
+                index_listings(batch)
+                total += len(batch)
+                batch = []
+        index_listings(batch)
+        total += len(batch)
+        self.stdout.write(self.style.SUCCESS(f"Indexed {total} listing(s)"))
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from auctions.models import ListingModel
+
+
+class Command(BaseCommand):
+    help = ("Backfill denormalized bid columns of listings "
+            "(bid_count, high bid/bidder) from placed bids.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify', action='store_true',
+            help="Only report listings with wrong bid columns, "
+                 "exit with error if there are any.")
+        parser.add_argument(
+            'listing_ids', nargs='*', type=int,
+            help="Listings to process (default: all listings).")
+
+    def handle(self, *args, **options):
+        listings = ListingModel.objects.all()
+        if options['listing_ids']:
+            listings = listings.filter(pk__in=options['listing_ids'])
+
+        if options['verify']:
+            mismatches = listings.bid_counter_mismatches()
+            count = 0
+            for l in mismatches.iterator():
+                count += 1
+                self.stdout.write(
+                    f"Listing {l.pk}: bid_count={l.bid_count} "
+                    f"(actual {l.actual_bid_count}), high_bid={l.high_bid_id} "
+                    f"(actual {l.actual_high_bid})")
+            if count:
+                raise CommandError(
+                    f"{count} listing(s) with wrong bid columns")
+            self.stdout.write(self.style.SUCCESS("Bid columns are consistent"))
+        else:
+            updated = listings.recount_bids()
+            self.stdout.write(self.style.SUCCESS(
+                f"Recounted bids of {updated} listing(s)"))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from auctions import notifications
+
+
+class Command(BaseCommand):
+    help = ("Queue notifications about listings ending soon and deliver "
+            "pending notifications by email in batches.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop', action='store_true',
+            help="Keep running, deliver new notifications every interval.")
+        parser.add_argument(
+            '--interval', type=float, default=notifications.INTERVAL,
+            help="Sleep between runs in loop mode (seconds).")
+        parser.add_argument(
+            '--batch-size', type=int, default=notifications.BATCH_SIZE,
+            help="Notifications sent over one email connection.")
+
+    def handle(self, *args, **options):
+        if options['loop']:
+            notifications.run(options['interval'], options['batch_size'],
+                              log=self.stdout.write)
+            return
+
+        queued = notifications.enqueue_ending_notifications()
+        sent = notifications.send_pending(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Queued {queued} ending notice(s), sent {sent} notification(s)"))
@@ -0,0 +1,114 @@
+import asyncio
+import json
+import time
+import tracemalloc
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from auctions.benchmark import percentile
+from auctions.broker import get_broker
+from auctions.models import ListingModel
+from auctions.realtime import events_application, listing_channel
+
+
+class Command(BaseCommand):
+    help = ("Hold many concurrent listing event streams in this process "
+            "and measure memory per subscriber and bid fan-out latency.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--subscribers', type=int, nargs='+', default=[100, 1000, 5000],
+            help="Numbers of concurrent subscribers to test.")
+        parser.add_argument(
+            '--events', type=int, default=20,
+            help="Bid events published per run.")
+
+    def handle(self, *args, **options):
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            seller = get_user_model().objects.create_user(
+                'loadtest', phone='+79999999999')
+            now = timezone.now()
+            listing = ListingModel.objects.create(
+                seller=seller, title='Load test', condition='NEW',
+                starting_price=1, start_datetime=now,
+                end_datetime=now + timedelta(hours=1))
+            self.stdout.write(f'{"subscribers":>12}{"connect s":>11}'
+                              f'{"KB/sub":>9}{"p50 ms":>9}{"p95 ms":>9}'
+                              f'{"msgs/s":>10}')
+            for count in options['subscribers']:
+                r = asyncio.run(
+                    self.measure(listing, count, options['events']))
+                self.stdout.write(
+                    f'{count:>12}{r["connect"]:>11.2f}{r["kb"]:>9.1f}'
+                    f'{r["p50"]:>9.2f}{r["p95"]:>9.2f}{r["rate"]:>10.0f}')
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    async def measure(self, listing, count, events):
+        """Connect count streams, publish events, return stats."""
+        app = events_application(None)
+        broker = get_broker()
+        channel = listing_channel(listing.pk)
+        scope = {'type': 'http', 'method': 'GET',
+                 'path': f'/events/listings/{listing.pk}/'}
+        arrivals = [[] for i in range(events)]
+        closed = asyncio.Event()
+
+        def receiver():
+            """ASGI receive of one stream: request body, then disconnect."""
+            messages = [{'type': 'http.request', 'body': b'',
+                         'more_body': False}]
+
+            async def receive():
+                if messages:
+                    return messages.pop()
+                await closed.wait()
+                return {'type': 'http.disconnect'}
+            return receive
+
+        async def send(message):
+            body = message.get('body', b'')
+            if body.startswith(b'event: bid'):
+                data = json.loads(body.split(b'data: ', 1)[1])
+                if 'seq' in data:
+                    arrivals[data['seq']].append(time.perf_counter())
+
+        tracemalloc.start()
+        memory = tracemalloc.get_traced_memory()[0]
+        started = time.perf_counter()
+        tasks = [asyncio.ensure_future(app(scope, receiver(), send))
+                 for i in range(count)]
+        while broker.subscriber_count(channel) < count:
+            await asyncio.sleep(0.01)
+        connect = time.perf_counter() - started
+        memory = tracemalloc.get_traced_memory()[0] - memory
+        tracemalloc.stop()
+
+        loop = asyncio.get_running_loop()
+        latencies = []
+        started = time.perf_counter()
+        for seq in range(events):
+            published = time.perf_counter()
+            # Publish from other thread like sync views do
+            await loop.run_in_executor(None, broker.publish, channel, (
+                'bid', {'listing_id': listing.pk, 'seq': seq}))
+            while len(arrivals[seq]) < count:
+                await asyncio.sleep(0.001)
+            latencies.append((max(arrivals[seq]) - published) * 1000)
+        elapsed = time.perf_counter() - started
+
+        closed.set()
+        await asyncio.gather(*tasks)
+        return {
+            'connect': connect,
+            'kb': memory / count / 1024,
+            'p50': percentile(latencies, 50),
+            'p95': percentile(latencies, 95),
+            'rate': count * events / elapsed,
+        }
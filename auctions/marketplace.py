@@ -0,0 +1,219 @@
+"""
+Synthetic marketplace generator (manage.py generate_marketplace).
+
+Bulk creates users, listings, bids, comments and watchlists in batches
+of batch_size rows, with distributions of a real auction site:
+- listing popularity is Zipf distributed: bids, comments and watches
+  concentrate on few hot listings (rank r gets weight 1 / r**ZIPF_S);
+- end times cluster on evening hours (PEAK_END_HOURS, UTC) at round
+  minutes, listings run one of LISTING_DAYS days;
+- categories (ListingModel.Category) are Zipf skewed too, starting
+  prices log-normal;
+- bids of a listing increase over its running time.
+Generated users log in with GENERATED_PASSWORD (manage.py loadtest).
+"""
+import itertools
+import random
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.utils import timezone
+
+from .cache import (invalidate_category_stats, invalidate_listings,
+                    invalidate_watched)
+from .models import BidModel, CommentModel, ListingModel
+from .search import index_listings
+
+UserModel = get_user_model()
+
+GENERATED_PASSWORD = 'marketplace-password'
+USERNAME_PREFIX = 'user'
+
+ZIPF_S = 1.1
+# End hours (UTC) most listings end in, share of such listings
+PEAK_END_HOURS = (18, 19, 20, 21)
+PEAK_SHARE = 0.7
+# Listing duration (days): weight
+LISTING_DAYS = {1: 1, 3: 2, 5: 2, 7: 6, 10: 2}
+# End day range relative to today (most listings ended already)
+END_DAYS = (-21, 10)
+WORDS = ('vintage', 'new', 'rare', 'classic', 'mint', 'lot', 'set',
+         'original', 'signed', 'large', 'small', 'boxed', 'limited',
+         'edition', 'retro', 'handmade', 'genuine', 'sealed')
+CENT = Decimal('0.01')
+
+
+def zipf_weights(count, s=ZIPF_S):
+    """Cumulative weights of Zipf distributed ranks 1..count."""
+    return list(itertools.accumulate(1 / rank ** s
+                                     for rank in range(1, count + 1)))
+
+
+def end_datetime(rng, now):
+    """Listing end time clustered on peak evening hours."""
+    day = now.replace(hour=0, minute=0, second=0, microsecond=0) + \
+        timedelta(days=rng.randint(*END_DAYS))
+    if rng.random() < PEAK_SHARE:
+        return day + timedelta(hours=rng.choice(PEAK_END_HOURS),
+                               minutes=rng.choice((0, 30)))
+    return day + timedelta(minutes=rng.randrange(24 * 60))
+
+
+def _batches(count, batch_size):
+    for start in range(0, count, batch_size):
+        yield range(start, min(start + batch_size, count))
+
+
+class Generator:
+    """Grow the dataset of the default database (see module docstring)."""
+
+    def __init__(self, batch_size=5000, rng=None, now=None, log=None):
+        self.batch_size = batch_size
+        self.rng = rng or random.Random(0)
+        self.now = now or timezone.now()
+        self.log = log or (lambda message: None)
+
+    def generate(self, users, listings, bids, comments, watches):
+        first_listing = self.last_pk(ListingModel)
+        user_ids = self.create_users(users)
+        hot = self.create_listings(listings, user_ids)
+        self.create_bids(bids, user_ids, hot)
+        self.create_comments(comments, user_ids, hot)
+        self.create_watches(watches, user_ids, hot)
+        self.finish(first_listing)
+
+    def last_pk(self, model):
+        return model.objects.order_by('-pk').values_list(
+            'pk', flat=True).first() or 0
+
+    def create_users(self, count):
+        """Create users, return primary keys of all users."""
+        # Generated users are numbered from 0 (loadtest.usernames())
+        first = UserModel.objects.filter(
+            username__startswith=USERNAME_PREFIX).count()
+        password = make_password(GENERATED_PASSWORD)  # hashed once
+        for numbers in _batches(count, self.batch_size):
+            UserModel.objects.bulk_create([
+                UserModel(username=f'{USERNAME_PREFIX}{first + i}',
+                          phone=f'+7800{first + i:07d}',
+                          email=f'{USERNAME_PREFIX}{first + i}@example.com',
+                          password=password)
+                for i in numbers])
+        self.log(f"{count} users")
+        return list(UserModel.objects.values_list('pk', flat=True))
+
+    def create_listings(self, count, user_ids):
+        """
+        Create listings, return started listings (pk, seller, start,
+        end, price) in popularity order (hottest first).
+        """
+        rng = self.rng
+        categories = list(ListingModel.Category.values)
+        rng.shuffle(categories)
+        category_weights = zipf_weights(len(categories), 0.8)
+        days, day_weights = zip(*LISTING_DAYS.items())
+        last_pk = self.last_pk(ListingModel)
+        for numbers in _batches(count, self.batch_size):
+            batch = []
+            for i in numbers:
+                end = end_datetime(rng, self.now)
+                category = rng.choices(categories,
+                                       cum_weights=category_weights)[0]
+                price = max(Decimal(rng.lognormvariate(3, 1.2)),
+                            Decimal(1)).quantize(CENT)
+                batch.append(ListingModel(
+                    seller_id=rng.choice(user_ids),
+                    title=' '.join(rng.sample(WORDS, 3)).capitalize() +
+                    f' {i}',
+                    description=' '.join(rng.choices(
+                        WORDS, k=rng.randint(5, 60))),
+                    condition=rng.choice(ListingModel.Condition.values),
+                    category=category,
+                    starting_price=price,
+                    # bulk_create doesn't call save()
+                    current_price=price,
+                    start_datetime=end - timedelta(
+                        days=rng.choices(days, day_weights)[0]),
+                    end_datetime=end))
+            ListingModel.objects.bulk_create(batch)
+        self.log(f"{count} listings")
+
+        hot = list(ListingModel.objects.filter(
+            pk__gt=last_pk, start_datetime__lt=self.now).values_list(
+                'pk', 'seller_id', 'start_datetime', 'end_datetime',
+                'starting_price'))
+        rng.shuffle(hot)
+        self.hot_weights = zipf_weights(len(hot))
+        return hot
+
+    def pick(self, hot, count):
+        """count listings of Zipf distributed popularity."""
+        return self.rng.choices(hot, cum_weights=self.hot_weights, k=count)
+
+    def create_bids(self, count, user_ids, hot):
+        """Increasing bids, each later than the previous bid of listing."""
+        rng = self.rng
+        # pk: (price, time of last bid)
+        state = {}
+        created = 0
+        for numbers in _batches(count if hot else 0, self.batch_size):
+            batch = []
+            for pk, seller, start, end, starting_price in self.pick(
+                    hot, len(numbers)):
+                bidder = rng.choice(user_ids)
+                if bidder == seller:
+                    continue
+                price, last = state.get(pk, (starting_price, start))
+                # Raise by a few percent of the starting price
+                price += (starting_price * Decimal(rng.uniform(0.01, 0.05)) +
+                          1).quantize(CENT)
+                # Bids come faster towards the end (sniping)
+                last += (min(end, self.now) - last) * rng.random() * 0.2
+                state[pk] = (price, last)
+                batch.append(BidModel(listing_id=pk, bidder_id=bidder,
+                                      bid=price, created_datetime=last))
+            BidModel.objects.bulk_create(batch)
+            created += len(batch)
+        self.log(f"{created} bids on {len(state)} listings")
+
+    def create_comments(self, count, user_ids, hot):
+        rng = self.rng
+        for numbers in _batches(count if hot else 0, self.batch_size):
+            CommentModel.objects.bulk_create([
+                CommentModel(listing_id=listing[0],
+                             user_id=rng.choice(user_ids),
+                             comment=' '.join(rng.choices(
+                                 WORDS, k=rng.randint(3, 30))))
+                for listing in self.pick(hot, len(numbers))])
+        self.log(f"{count} comments")
+
+    def create_watches(self, count, user_ids, hot):
+        rng = self.rng
+        Watch = UserModel.watchlist.through
+        for numbers in _batches(count if hot else 0, self.batch_size):
+            batch = [Watch(user_id=rng.choice(user_ids),
+                           listingmodel_id=listing[0])
+                     for listing in self.pick(hot, len(numbers))]
+            Watch.objects.bulk_create(batch, ignore_conflicts=True)
+            # bulk_create doesn't send signals
+            invalidate_watched({watch.user_id for watch in batch})
+        self.log(f"{count} watches (duplicates skipped)")
+
+    def finish(self, first_listing):
+        """Denormalized columns, closing, search index and caches."""
+        last_listing = self.last_pk(ListingModel)
+        step = self.batch_size
+        for start in range(first_listing, last_listing, step):
+            listings = ListingModel.objects.filter(
+                pk__gt=start, pk__lte=start + step)
+            listings.recount_bids()
+            listings.recount_comments()
+            listings.close_ended(self.now)
+            index_listings(listings.only('title', 'description'))
+        self.log("Recounted, closed ended and indexed listings")
+
+        invalidate_listings()
+        for category in ListingModel.Category.values:
+            invalidate_category_stats(category)
@@ -0,0 +1,99 @@
+# Generated by Django 3.2.5 on 2026-10-18 15:46
+
+import auctions.util_datetime
+from django.conf import settings
+import django.contrib.auth.models
+import django.contrib.auth.validators
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import phonenumber_field.modelfields
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='User',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('password', models.CharField(max_length=128, verbose_name='password')),
+                ('last_login', models.DateTimeField(blank=True, null=True, verbose_name='last login')),
+                ('is_superuser', models.BooleanField(default=False, help_text='Designates that this user has all permissions without explicitly assigning them.', verbose_name='superuser status')),
+                ('username', models.CharField(error_messages={'unique': 'A user with that username already exists.'}, help_text='Required. 150 characters or fewer. Letters, digits and @/./+/-/_ only.', max_length=150, unique=True, validators=[django.contrib.auth.validators.UnicodeUsernameValidator()], verbose_name='username')),
+                ('first_name', models.CharField(blank=True, max_length=150, verbose_name='first name')),
+                ('last_name', models.CharField(blank=True, max_length=150, verbose_name='last name')),
+                ('email', models.EmailField(blank=True, max_length=254, verbose_name='email address')),
+                ('is_staff', models.BooleanField(default=False, help_text='Designates whether the user can log into this admin site.', verbose_name='staff status')),
+                ('is_active', models.BooleanField(default=True, help_text='Designates whether this user should be treated as active. Unselect this instead of deleting accounts.', verbose_name='active')),
+                ('date_joined', models.DateTimeField(default=django.utils.timezone.now, verbose_name='date joined')),
+                ('phone', phonenumber_field.modelfields.PhoneNumberField(max_length=128, null=True, region=None, unique=True)),
+                ('groups', models.ManyToManyField(blank=True, help_text='The groups this user belongs to. A user will get all permissions granted to each of their groups.', related_name='user_set', related_query_name='user', to='auth.Group', verbose_name='groups')),
+                ('user_permissions', models.ManyToManyField(blank=True, help_text='Specific permissions for this user.', related_name='user_set', related_query_name='user', to='auth.Permission', verbose_name='user permissions')),
+            ],
+            options={
+                'verbose_name': 'user',
+                'verbose_name_plural': 'users',
+                'abstract': False,
+            },
+            managers=[
+                ('objects', django.contrib.auth.models.UserManager()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='BidModel',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bid', models.FloatField(help_text='Make sure that bid is greater than current bid.', verbose_name='Placed bid/price tag (in $)')),
+                ('bidder', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bids', to=settings.AUTH_USER_MODEL, verbose_name='Listing bidder')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ListingModel',
+            fields=[
+                ('listing_id', models.AutoField(primary_key=True, serialize=False)),
+                ('title', models.CharField(max_length=50)),
+                ('description', models.TextField(blank=True, help_text='Description of the selling item', verbose_name='Listing description')),
+                ('condition', models.CharField(choices=[('NEW', 'New'), ('USED', 'Used'), ('RENTAL', 'Rental'), ('USED_GOOD', 'Used - Good'), ('USED_VERYGOOD', 'Used - Very Good')], max_length=50, verbose_name='Item condition')),
+                ('starting_price', models.FloatField(verbose_name='Listing startign price (in $)')),
+                ('start_datetime', models.DateTimeField(help_text='Time when listing starts at the auction (>now)', validators=[django.core.validators.MinValueValidator(auctions.util_datetime.current_datetime)], verbose_name='Listing start time')),
+                ('end_datetime', models.DateTimeField(help_text='Time when listing ends at the auction (>now)', validators=[django.core.validators.MinValueValidator(auctions.util_datetime.current_datetime)], verbose_name='Listing star time')),
+                ('closed', models.BooleanField(default=False, verbose_name='Listing before endtime closed')),
+                ('photo_url', models.URLField(default='https://www.freeiconspng.com/uploads/no-image-icon-32.png', verbose_name='Internet photo URL for listing')),
+                ('category', models.IntegerField(choices=[(1, 'Antiques'), (2, 'Art'), (3, 'Baby'), (4, 'Books'), (5, 'Business & Industrial'), (6, 'Cameras & Photo'), (7, 'Cell Phones & Accessories'), (8, 'Clothing, Shoes & Accessories'), (9, 'Coins & Paper Money'), (10, 'Collectibles'), (11, 'Computers/Tablets & Networking'), (12, 'Consumer Electronics'), (13, 'Crafts'), (14, 'Dolls & Bears'), (15, 'Dvds & Movies'), (16, 'Entertainment Memorabilia'), (17, 'Everything Else'), (18, 'Gift Cards & Coupons'), (19, 'Health & Beauty'), (20, 'Home & Garden'), (21, 'Jewelry & Watches'), (22, 'Music'), (23, 'Musical Instruments & Gear'), (24, 'Pet Supplies'), (25, 'Pottery & Glass'), (26, 'Real Estate'), (27, 'Specialty Services'), (28, 'Sporting Goods'), (29, 'Sports Mem, Cards & Fan Shop'), (30, 'Stamps'), (31, 'Tickets & Experiences'), (32, 'Toys & Hobbies'), (33, 'Travel'), (34, 'Video Games & Consoles')], null=True, verbose_name='Listing category')),
+                ('bid_count', models.PositiveIntegerField(default=0, editable=False, verbose_name='Number of placed bids')),
+                ('high_bid_amount', models.FloatField(blank=True, editable=False, null=True, verbose_name='Highest bid (in $)')),
+                ('high_bid', models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='auctions.bidmodel', verbose_name='Highest bid')),
+                ('high_bidder', models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Highest bidder')),
+                ('seller', models.ForeignKey(help_text='Enter creator of the listing', on_delete=django.db.models.deletion.CASCADE, related_name='listings', to=settings.AUTH_USER_MODEL, verbose_name='Item seller')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='CommentModel',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('comment', models.TextField(verbose_name='Comment text')),
+                ('post_datetime', models.DateTimeField(auto_now_add=True, verbose_name='Comment post date')),
+                ('last_modified_datetime', models.DateTimeField(auto_now=True, verbose_name='Date and time of last modification to the comment')),
+                ('listing', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='comments', to='auctions.listingmodel', verbose_name='Listing commented')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='comments', to=settings.AUTH_USER_MODEL, verbose_name='User commented')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='bidmodel',
+            name='listing',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bids', to='auctions.listingmodel', verbose_name='Bidding listing'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='watchlist',
+            field=models.ManyToManyField(related_name='watchers', to='auctions.ListingModel', verbose_name='Watchlisted listings'),
+        ),
+    ]
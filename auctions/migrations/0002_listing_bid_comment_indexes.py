@@ -0,0 +1,33 @@
+# Generated by Django 3.2.5 on 2026-10-18 15:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='bidmodel',
+            index=models.Index(fields=['listing', '-bid'], name='bid_listing_amount_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='commentmodel',
+            index=models.Index(fields=['listing', '-post_datetime'], name='comment_listing_posted_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listingmodel',
+            index=models.Index(fields=['closed', 'end_datetime', 'listing_id'], name='listing_closed_end_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listingmodel',
+            index=models.Index(condition=models.Q(('closed', False)), fields=['end_datetime', 'listing_id'], name='listing_open_end_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listingmodel',
+            index=models.Index(fields=['category', 'closed', 'end_datetime'], name='listing_category_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 3.2.5 on 2026-10-18 15:53
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0002_listing_bid_comment_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listingmodel',
+            name='closed_datetime',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Listing close time'),
+        ),
+        migrations.AddField(
+            model_name='listingmodel',
+            name='final_price',
+            field=models.FloatField(blank=True, editable=False, null=True, verbose_name='Final price (in $)'),
+        ),
+        migrations.AddField(
+            model_name='listingmodel',
+            name='winning_bid',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='auctions.bidmodel', verbose_name='Winning bid'),
+        ),
+    ]
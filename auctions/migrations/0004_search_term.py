@@ -0,0 +1,27 @@
+# Generated by Django 3.2.5 on 2026-10-18 15:54
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0003_listing_auction_result'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchTermModel',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=50, verbose_name='Search term')),
+                ('weight', models.PositiveIntegerField(default=1, verbose_name='Term weight')),
+                ('listing', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to='auctions.listingmodel', verbose_name='Listing with term')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='searchtermmodel',
+            constraint=models.UniqueConstraint(fields=('term', 'listing'), name='search_term_listing_uniq'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 3.2.5 on 2026-10-18 16:03
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0004_search_term'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationModel',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('OUTBID', 'Outbid'), ('BID', 'New bid on watched listing'), ('ENDING', 'Watched listing ends soon')], max_length=10, verbose_name='Notification kind')),
+                ('dedup_key', models.CharField(editable=False, max_length=100, null=True, unique=True, verbose_name='Deduplication key')),
+                ('count', models.PositiveIntegerField(default=1, verbose_name='Number of events')),
+                ('amount', models.FloatField(blank=True, null=True, verbose_name='Latest bid (in $)')),
+                ('created_datetime', models.DateTimeField(auto_now_add=True, verbose_name='Notification create time')),
+                ('updated_datetime', models.DateTimeField(auto_now=True, verbose_name='Last event time')),
+                ('sent_datetime', models.DateTimeField(blank=True, null=True, verbose_name='Notification delivery time')),
+                ('listing', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to='auctions.listingmodel', verbose_name='Listing notified about')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to=settings.AUTH_USER_MODEL, verbose_name='Notified user')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='notificationmodel',
+            index=models.Index(fields=['sent_datetime', 'created_datetime'], name='notification_outbox_idx'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 3.2.5 on 2026-10-18 16:08
+
+import auctions.util_datetime
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0005_notification'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listingmodel',
+            name='modified_datetime',
+            field=models.DateTimeField(default=auctions.util_datetime.current_datetime, editable=False, verbose_name='Listing content change time'),
+        ),
+        migrations.AddField(
+            model_name='listingmodel',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False, verbose_name='Listing content version'),
+        ),
+    ]
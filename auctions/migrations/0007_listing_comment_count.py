@@ -0,0 +1,32 @@
+# Generated by Django 3.2.5 on 2026-10-18 16:11
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_comments(apps, schema_editor):
+    """Backfill comment_count of existing listings (one UPDATE)."""
+    ListingModel = apps.get_model('auctions', 'ListingModel')
+    CommentModel = apps.get_model('auctions', 'CommentModel')
+    comment_count = (CommentModel.objects.filter(listing=OuterRef('pk'))
+                     .order_by().values('listing')
+                     .annotate(count=Count('pk')).values('count'))
+    ListingModel.objects.update(
+        comment_count=Coalesce(Subquery(comment_count), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0006_listing_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listingmodel',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Number of comments'),
+        ),
+        migrations.RunPython(count_comments, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,102 @@
+# Generated by Django 3.2.5 on 2026-10-18 16:14
+
+from decimal import Decimal
+import django.core.validators
+from django.db import migrations, models
+from django.db.models import F, Func
+from django.db.models.functions import Coalesce
+
+
+def round_cents(field):
+    # Round() of Django 3.2 has no precision argument
+    return Func(F(field), 2, function='ROUND')
+
+
+def round_prices(apps, schema_editor):
+    """Round float prices to cents before columns become decimal."""
+    ListingModel = apps.get_model('auctions', 'ListingModel')
+    BidModel = apps.get_model('auctions', 'BidModel')
+    NotificationModel = apps.get_model('auctions', 'NotificationModel')
+    ListingModel.objects.update(
+        starting_price=round_cents('starting_price'),
+        high_bid_amount=round_cents('high_bid_amount'),
+        final_price=round_cents('final_price'))
+    BidModel.objects.update(bid=round_cents('bid'))
+    NotificationModel.objects.update(amount=round_cents('amount'))
+
+
+def fill_current_price(apps, schema_editor):
+    """Backfill current_price of existing listings (one UPDATE)."""
+    ListingModel = apps.get_model('auctions', 'ListingModel')
+    ListingModel.objects.update(
+        current_price=Coalesce('high_bid_amount', 'starting_price'))
+
+
+def create_increment_band(apps, schema_editor):
+    """Single band keeping the former fixed $1 increment."""
+    BidIncrementModel = apps.get_model('auctions', 'BidIncrementModel')
+    BidIncrementModel.objects.create(min_price=Decimal('0'),
+                                     increment=Decimal('1.00'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0007_listing_comment_count'),
+    ]
+
+    operations = [
+        migrations.RunPython(round_prices, migrations.RunPython.noop),
+        migrations.CreateModel(
+            name='BidIncrementModel',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('min_price', models.DecimalField(decimal_places=2, max_digits=12, unique=True, validators=[django.core.validators.MinValueValidator(Decimal('0'))], verbose_name='Band lowest price (in $)')),
+                ('increment', models.DecimalField(decimal_places=2, max_digits=12, validators=[django.core.validators.MinValueValidator(Decimal('0.01'))], verbose_name='Minimum bid increment (in $)')),
+            ],
+            options={
+                'ordering': ['min_price'],
+            },
+        ),
+        migrations.AddField(
+            model_name='listingmodel',
+            name='current_price',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=12, verbose_name='Current price (in $)'),
+        ),
+        migrations.AlterField(
+            model_name='bidmodel',
+            name='bid',
+            field=models.DecimalField(decimal_places=2, help_text='Make sure that bid is greater than current bid.', max_digits=12, verbose_name='Placed bid/price tag (in $)'),
+        ),
+        migrations.AlterField(
+            model_name='listingmodel',
+            name='final_price',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=12, null=True, verbose_name='Final price (in $)'),
+        ),
+        migrations.AlterField(
+            model_name='listingmodel',
+            name='high_bid_amount',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=12, null=True, verbose_name='Highest bid (in $)'),
+        ),
+        migrations.AlterField(
+            model_name='listingmodel',
+            name='starting_price',
+            field=models.DecimalField(decimal_places=2, max_digits=12, validators=[django.core.validators.MinValueValidator(Decimal('0'))], verbose_name='Listing startign price (in $)'),
+        ),
+        migrations.AlterField(
+            model_name='notificationmodel',
+            name='amount',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True, verbose_name='Latest bid (in $)'),
+        ),
+        migrations.RunPython(fill_current_price, migrations.RunPython.noop),
+        migrations.RunPython(create_increment_band,
+                             migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='listingmodel',
+            index=models.Index(fields=['closed', 'current_price'], name='listing_closed_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listingmodel',
+            index=models.Index(condition=models.Q(('closed', False)), fields=['current_price'], name='listing_open_price_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 3.2.5 on 2026-10-18 16:19
+
+import auctions.util_datetime
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0008_money'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bidmodel',
+            name='created_datetime',
+            field=models.DateTimeField(default=auctions.util_datetime.current_datetime, editable=False, verbose_name='Bid place time'),
+        ),
+        migrations.AddIndex(
+            model_name='bidmodel',
+            index=models.Index(fields=['listing', '-created_datetime'], name='bid_listing_created_idx'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 3.2.5 on 2026-10-18 16:36
+
+from django.db import migrations, models
+
+# Former photo_url default (hotlinked placeholder)
+PLACEHOLDER_URL = 'https://www.freeiconspng.com/uploads/no-image-icon-32.png'
+
+
+def queue_photo_urls(apps, schema_editor):
+    """Drop placeholder URL, queue other photo URLs for the image worker."""
+    ListingModel = apps.get_model('auctions', 'ListingModel')
+    ListingModel.objects.filter(photo_url=PLACEHOLDER_URL).update(photo_url='')
+    ListingModel.objects.exclude(photo_url='').update(photo_status='PENDING')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0009_bid_created'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listingmodel',
+            name='photo',
+            field=models.ImageField(blank=True, upload_to='listings/%Y/%m/', verbose_name='Listing photo'),
+        ),
+        migrations.AddField(
+            model_name='listingmodel',
+            name='photo_status',
+            field=models.CharField(choices=[('NONE', 'No photo'), ('PENDING', 'Processing'), ('READY', 'Ready'), ('FAILED', 'Failed')], default='NONE', editable=False, max_length=10, verbose_name='Photo processing status'),
+        ),
+        migrations.AlterField(
+            model_name='listingmodel',
+            name='photo_url',
+            field=models.URLField(blank=True, help_text='Photo is copied from this address (or upload one)', verbose_name='Internet photo URL for listing'),
+        ),
+        migrations.AddIndex(
+            model_name='listingmodel',
+            index=models.Index(fields=['photo_status'], name='listing_photo_status_idx'),
+        ),
+        migrations.RunPython(queue_photo_urls, migrations.RunPython.noop),
+    ]
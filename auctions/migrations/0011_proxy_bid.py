@@ -0,0 +1,30 @@
+# Generated by Django 3.2.5 on 2026-10-18 16:42
+
+import auctions.util_datetime
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0010_listing_photo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProxyBidModel',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('max_bid', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='Maximum bid (in $)')),
+                ('placed_datetime', models.DateTimeField(default=auctions.util_datetime.current_datetime, editable=False, verbose_name='Maximum set time')),
+                ('bidder', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='proxy_bids', to=settings.AUTH_USER_MODEL, verbose_name='Proxy bidder')),
+                ('listing', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='proxy_bids', to='auctions.listingmodel', verbose_name='Listing bid on')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='proxybidmodel',
+            constraint=models.UniqueConstraint(fields=('listing', 'bidder'), name='proxy_bid_listing_bidder_uniq'),
+        ),
+    ]
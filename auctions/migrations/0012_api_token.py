@@ -0,0 +1,25 @@
+# Generated by Django 3.2.5 on 2026-10-18 16:57
+
+import auctions.util_datetime
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0011_proxy_bid'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ApiTokenModel',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('digest', models.CharField(editable=False, max_length=64, unique=True, verbose_name='SHA-256 of token key')),
+                ('created_datetime', models.DateTimeField(default=auctions.util_datetime.current_datetime, editable=False, verbose_name='Token issue time')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='api_tokens', to=settings.AUTH_USER_MODEL, verbose_name='Token owner')),
+            ],
+        ),
+    ]
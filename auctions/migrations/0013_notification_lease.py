@@ -0,0 +1,18 @@
+# Generated by Django 3.2.5 on 2026-10-18 17:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0012_api_token'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notificationmodel',
+            name='leased_until',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Delivery lease expiry'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.5 on 2026-10-18 17:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0013_notification_lease'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='listingmodel',
+            name='photo',
+            field=models.ImageField(blank=True, upload_to='uploads/%Y/%m/', verbose_name='Listing photo'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 3.2.5 on 2026-10-18 17:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0014_photo_uploads'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='listingmodel',
+            name='end_datetime',
+            field=models.DateTimeField(help_text='Time when listing ends at the auction (>now)', verbose_name='Listing star time'),
+        ),
+        migrations.AlterField(
+            model_name='listingmodel',
+            name='start_datetime',
+            field=models.DateTimeField(help_text='Time when listing starts at the auction (>now)', verbose_name='Listing start time'),
+        ),
+    ]
@@ -1,8 +1,18 @@
+import hashlib
+from decimal import Decimal
+
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+
+from django.db.models import (Case, CharField, Count, DecimalField,
+                              ExpressionWrapper, F, OuterRef, Q, Subquery,
+                              Value, When)
+from django.db.models.functions import Coalesce
 from django.core.validators import MinValueValidator
 from django.core.exceptions import ValidationError
 from django.conf import settings
+from django.core.files.storage import default_storage
+from django.templatetags.static import static
 from django.utils.translation import ugettext as _  # ugettext_lazy not working
 from phonenumber_field.modelfields import PhoneNumberField
 
@@ -13,6 +23,14 @@ from .util_datetime import current_datetime
 # verbose_name | help_text | editable
 # cascade | protect | set null
 
+# Money columns: exact decimal dollars (cents), up to 9 999 999 999.99
+MONEY = {'max_digits': 12, 'decimal_places': 2}
+# Bid increment of prices below the lowest BidIncrementModel band
+DEFAULT_BID_INCREMENT = Decimal('1.00')
+# Widths of resized listing photo variants (auctions.images): name: px
+PHOTO_WIDTHS = {'small': 160, 'medium': 480, 'large': 1024}
+NO_PHOTO = 'auctions/no-photo.svg'
+
 
 class User(AbstractUser):
     """
@@ -27,6 +45,132 @@ class User(AbstractUser):
         "Watchlisted listings"), related_name="watchers")
 
 
+def money(expression):
+    """Expression (sum, subquery, ...) evaluated to a money value."""
+    return ExpressionWrapper(expression, output_field=DecimalField(**MONEY))
+
+
+def bid_increment(price):
+    """Subquery of bid increment of price band (BidIncrementModel)."""
+    band = (BidIncrementModel.objects.filter(min_price__lte=price)
+            .order_by('-min_price').values('increment')[:1])
+    return Coalesce(Subquery(band), Value(DEFAULT_BID_INCREMENT),
+                    output_field=DecimalField(**MONEY))
+
+
+def photo_variant_name(name, width):
+    """Storage name of photo variant (JPEG) of width."""
+    stem = name.rsplit('.', 1)[0]
+    return f'thumbnails/{stem}-{width}w.jpg'
+
+
+def touched(cur_datetime=None):
+    """UPDATE values bumping listing version (see ListingModel.version)."""
+    return {'version': F('version') + 1,
+            'modified_datetime': cur_datetime or current_datetime()}
+
+
+class ListingQuerySet(models.QuerySet):
+    """Reusable listing filters (ListingModel.objects.<filter>())."""
+
+    def active(self, cur_datetime=None):
+        """Listings started, not ended and not closed at cur_datetime."""
+        if cur_datetime is None:
+            cur_datetime = current_datetime()
+        return self.filter(closed=False,
+                           start_datetime__lt=cur_datetime,
+                           end_datetime__gt=cur_datetime)
+
+    def with_status(self, cur_datetime=None):
+        """Annotate status (ListingModel.Status) at cur_datetime."""
+        if cur_datetime is None:
+            cur_datetime = current_datetime()
+        Status = ListingModel.Status
+        return self.annotate(status=Case(
+            When(closed=True, then=Value(Status.CLOSED)),
+            # Active strictly after start and before end (like active())
+            When(start_datetime__gte=cur_datetime,
+                 then=Value(Status.UPCOMING)),
+            When(end_datetime__lte=cur_datetime, then=Value(Status.ENDED)),
+            default=Value(Status.ACTIVE),
+            output_field=CharField(),
+        ))
+
+    def with_min_bid(self):
+        """Annotate min_bid: current price + increment of its price band."""
+        return self.annotate(min_bid=money(
+            F('current_price') + bid_increment(OuterRef('current_price'))))
+
+    def recount_bids(self):
+        """
+        Recompute denormalized bid columns from BidModel rows.
+        Single set-based UPDATE, return number of updated listings.
+        """
+        bids = BidModel.objects.filter(listing=OuterRef('pk'))
+        # Highest bid wins, earliest bid wins a tie
+        top_bid = bids.order_by('-bid', 'pk')
+        bid_count = bids.order_by().values('listing').annotate(
+            count=Count('pk')).values('count')
+        return self.update(
+            **touched(),
+            bid_count=Coalesce(Subquery(bid_count), 0),
+            high_bid=Subquery(top_bid.values('pk')[:1]),
+            high_bid_amount=Subquery(top_bid.values('bid')[:1]),
+            high_bidder=Subquery(top_bid.values('bidder')[:1]),
+            current_price=Coalesce(Subquery(top_bid.values('bid')[:1]),
+                                   F('starting_price')),
+        )
+
+    def recount_comments(self):
+        """Recompute comment_count from CommentModel rows (one UPDATE)."""
+        comment_count = (CommentModel.objects.filter(listing=OuterRef('pk'))
+                         .order_by().values('listing')
+                         .annotate(count=Count('pk')).values('count'))
+        return self.update(comment_count=Coalesce(Subquery(comment_count), 0))
+
+    def close_ended(self, cur_datetime):
+        """
+        Close open listings ended before cur_datetime with one UPDATE,
+        recording highest bid as the winning one.
+        """
+        ended = self.filter(closed=False, end_datetime__lte=cur_datetime)
+        return ended.update(
+            **touched(cur_datetime),
+            closed=True, closed_datetime=F('end_datetime'),
+            winning_bid=F('high_bid'), final_price=F('high_bid_amount'))
+
+    def close(self, cur_datetime=None):
+        """
+        Close open listings now with one UPDATE (like ListingModel.close()),
+        return number closed.
+        """
+        if cur_datetime is None:
+            cur_datetime = current_datetime()
+        return self.filter(closed=False).update(
+            **touched(cur_datetime),
+            closed=True, closed_datetime=cur_datetime,
+            winning_bid=F('high_bid'), final_price=F('high_bid_amount'))
+
+    def touch(self):
+        """Mark listings changed (bump version), return number updated."""
+        return self.update(**touched())
+
+    def bid_counter_mismatches(self):
+        """Listings which denormalized bid columns disagree with BidModel."""
+        bids = BidModel.objects.filter(listing=OuterRef('pk'))
+        top_bid = bids.order_by('-bid', 'pk')
+        return self.annotate(
+            actual_bid_count=Coalesce(Subquery(
+                bids.order_by().values('listing').annotate(
+                    count=Count('pk')).values('count')), 0),
+            actual_high_bid=Subquery(top_bid.values('pk')[:1]),
+        ).exclude(
+            Q(bid_count=F('actual_bid_count')) &
+            (Q(high_bid=F('actual_high_bid')) |
+             Q(high_bid__isnull=True, actual_high_bid__isnull=True))
+        )
+
+
 class ListingModel(models.Model):
     """
     Listing about 1 item at the auction.
@@ -61,17 +205,18 @@ class ListingModel(models.Model):
         verbose_name=_("Item condition"), max_length=50,
         choices=Condition.choices
     )
-    starting_price = models.FloatField(_("Listing startign price (in $)"))
+    starting_price = models.DecimalField(
+        _("Listing startign price (in $)"), **MONEY,
+        validators=[MinValueValidator(Decimal('0'))])
+    # Not in the past when set (ListingForm.clean): running listing stays
+    # editable
     start_datetime = models.DateTimeField(
         verbose_name=_("Listing start time"),
         help_text=_("Time when listing starts at the auction (>now)"),
-        # TODO: dynamic validator (current_datetime is constant): move to clean()
-        validators=[MinValueValidator(current_datetime())]
     )
     end_datetime = models.DateTimeField(
         verbose_name=_("Listing star time"),
         help_text=_("Time when listing ends at the auction (>now)"),
-        validators=[MinValueValidator(current_datetime())]
     )
 
     # User-defined listing active status
@@ -79,7 +224,25 @@ class ListingModel(models.Model):
         _("Listing before endtime closed"), default=False)
 
     photo_url = models.URLField(
-        _("Internet photo URL for listing"), max_length=200, default="https://www.freeiconspng.com/uploads/no-image-icon-32.png")
+        _("Internet photo URL for listing"), max_length=200, blank=True,
+        help_text=_("Photo is copied from this address (or upload one)"))
+    # Upload (under uploads/, never served) until processed, then JPEG
+    # re-encoded from the upload or photo_url by image worker
+    # (auctions.images) with resized variants (PHOTO_WIDTHS); empty if
+    # processing failed
+    photo = models.ImageField(_("Listing photo"), upload_to='uploads/%Y/%m/',
+                              blank=True)
+
+    class PhotoStatus(models.TextChoices):
+        NONE = 'NONE', _('No photo')
+        PENDING = 'PENDING', _('Processing')
+        READY = 'READY', _('Ready')
+        FAILED = 'FAILED', _('Failed')
+
+    photo_status = models.CharField(
+        _("Photo processing status"), max_length=10,
+        choices=PhotoStatus.choices, default=PhotoStatus.NONE,
+        editable=False)
 
     # Integer enum functional API
     Category = models.IntegerChoices("Category", [_("Antiques"), _("Art"), _("Baby"), _("Books"), _("Business & Industrial"), _("Cameras & Photo"), _("Cell Phones & Accessories"), _("Clothing, Shoes & Accessories"), _("Coins & Paper Money"), _("Collectibles"), _("Computers/Tablets & Networking"), _("Consumer Electronics"), _("Crafts"), _("Dolls & Bears"), _("DVDs & Movies"), _("Entertainment Memorabilia"), _(
@@ -88,58 +251,189 @@ class ListingModel(models.Model):
     category = models.IntegerField(
         _("Listing category"), choices=Category.choices, null=True)
 
+    # Denormalized bid state, kept in sync by bidding.place_bid()
+    # (backfill/verify: manage.py recount_bids)
+    bid_count = models.PositiveIntegerField(
+        _("Number of placed bids"), default=0, editable=False)
+    high_bid_amount = models.DecimalField(
+        _("Highest bid (in $)"), **MONEY, null=True, blank=True,
+        editable=False)
+    high_bid = models.ForeignKey(
+        'BidModel', on_delete=models.SET_NULL, null=True, blank=True,
+        editable=False, related_name='+', verbose_name=_("Highest bid"))
+    high_bidder = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True,
+        blank=True, editable=False, related_name='+',
+        verbose_name=_("Highest bidder"))
+
+    # Highest bid or starting price (current_bid), stored for indexed
+    # price range filters
+    current_price = models.DecimalField(
+        _("Current price (in $)"), **MONEY, default=0, editable=False)
+
+    # Denormalized comment thread size, kept in sync by signals
+    comment_count = models.PositiveIntegerField(
+        _("Number of comments"), default=0, editable=False)
+
+    # Auction result, recorded when listing is closed by seller or
+    # by scheduler at end time (manage.py close_auctions)
+    closed_datetime = models.DateTimeField(
+        _("Listing close time"), null=True, blank=True, editable=False)
+    winning_bid = models.ForeignKey(
+        'BidModel', on_delete=models.SET_NULL, null=True, blank=True,
+        editable=False, related_name='+', verbose_name=_("Winning bid"))
+    final_price = models.DecimalField(
+        _("Final price (in $)"), **MONEY, null=True, blank=True,
+        editable=False)
+
+    # Bumped on every change of listing page content (edit, close, bid,
+    # comment), ETag/Last-Modified of listing views (auctions.conditional)
+    version = models.PositiveIntegerField(
+        _("Listing content version"), default=1, editable=False)
+    modified_datetime = models.DateTimeField(
+        _("Listing content change time"), default=current_datetime,
+        editable=False)
+
+    objects = ListingQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Active listings feed: closed=False, start < now < end
+            # ordered by (end_datetime, listing_id)
+            models.Index(fields=['closed', 'end_datetime', 'listing_id'],
+                         name='listing_closed_end_idx'),
+            # Same for open listings only (backends with partial indexes)
+            models.Index(fields=['end_datetime', 'listing_id'],
+                         condition=Q(closed=False),
+                         name='listing_open_end_idx'),
+            # Category pages
+            models.Index(fields=['category', 'closed', 'end_datetime'],
+                         name='listing_category_idx'),
+            # Price range filters of open listings
+            models.Index(fields=['closed', 'current_price'],
+                         name='listing_closed_price_idx'),
+            # Same for open listings only (backends with partial indexes)
+            models.Index(fields=['current_price'], condition=Q(closed=False),
+                         name='listing_open_price_idx'),
+            # Image worker queue
+            models.Index(fields=['photo_status'],
+                         name='listing_photo_status_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Remember loaded field values (compared on save by signals)."""
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def save(self, *args, **kwargs):
+        """Save and bump version (atomically, other writers bump it too)."""
+        bump = not self._state.adding
+        if bump:
+            self.version = F('version') + 1
+            self.modified_datetime = current_datetime()
+            # Starting price counts until the first bid (stored high bid,
+            # concurrent bids may be newer than this instance)
+            self.current_price = Coalesce(
+                F('high_bid_amount'), Value(self.starting_price),
+                output_field=DecimalField(**MONEY))
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'version',
+                                           'modified_datetime',
+                                           'current_price'}
+        else:
+            self.current_price = self.current_bid
+        super().save(*args, **kwargs)
+        if bump:
+            # Saved expressions, reloaded on access (deferred fields)
+            del self.version
+            del self.current_price
+
     def clean(self):
         """Custom model validation. clean() = pass in BaseModel."""
-        if self.start_datetime > self.end_datetime:
+        # Times left unset by a form field error are reported there
+        if (self.start_datetime and self.end_datetime and
+                self.start_datetime > self.end_datetime):
             raise ValidationError({
                 'start_datetime': _("Listing start time is greater than listing end time!")
             })
 
     def __str__(self):
-        return f'{self.title}, {int(self.starting_price)}$'
+        return f'{self.title}, {self.starting_price}$'
 
     def is_started(self):
         """Determine weather listing is started or not."""
         cur_datetime = current_datetime()
         return cur_datetime > self.start_datetime
 
-    # Listing statuses:
-    # - starts (cur time before start)
+    # Listing statuses (annotated by ListingQuerySet.with_status()):
+    # - upcoming (cur time before start)
     # - active (cur time between start/end)
-    # - over (cur time after end)
-    # - closed (_active = False)
+    # - ended (cur time after end, not closed by scheduler yet)
+    # - closed (by seller or by scheduler)
+    class Status(models.TextChoices):
+        UPCOMING = 'UPCOMING', _('Upcoming')
+        ACTIVE = 'ACTIVE', _('Active')
+        ENDED = 'ENDED', _('Ended')
+        CLOSED = 'CLOSED', _('Closed')
 
     @property
     def active(self):
         """Return wether listing is still active."""
+        # Ended listings are closed by scheduler, no clock needed
+        if self.closed:
+            return False
         cur_datetime = current_datetime()
-        now = self.start_datetime < cur_datetime < self.end_datetime
-        not_closed = not self.closed
-        return now and not_closed
+        return self.start_datetime < cur_datetime < self.end_datetime
+
+    def close(self):
+        """Close listing now, record highest bid as the winning one."""
+        self.closed = True
+        self.closed_datetime = current_datetime()
+        self.winning_bid_id = self.high_bid_id
+        self.final_price = self.high_bid_amount
+        self.save(update_fields=['closed', 'closed_datetime',
+                                 'winning_bid', 'final_price'])
+
+    def photo_variant_url(self, size):
+        """URL of resized photo variant, placeholder until processed."""
+        if self.photo_status != self.PhotoStatus.READY:
+            return static(NO_PHOTO)
+        return default_storage.url(
+            photo_variant_name(self.photo.name, PHOTO_WIDTHS[size]))
+
+    @property
+    def thumbnail_url(self):
+        """Small photo variant of list pages."""
+        return self.photo_variant_url('small')
+
+    @property
+    def photo_display_url(self):
+        """Large photo variant, placeholder until processed."""
+        # Neither unprocessed uploads nor photo_url hosts are linked
+        return self.photo_variant_url('large')
+
+    @property
+    def photo_srcset(self):
+        """srcset of all photo variants (empty until processed)."""
+        if self.photo_status != self.PhotoStatus.READY:
+            return ''
+        return ', '.join(f'{self.photo_variant_url(size)} {width}w'
+                         for size, width in PHOTO_WIDTHS.items())
 
     @property
     def current_bid(self):
         """Return PRICE value of max listing bid - current bid."""
-        bids = self.bids.all()
-        if bids.exists():
-            max_bid = max(bids, key=lambda b: b.bid)
-            return max_bid.bid
-        else:
-            return self.starting_price
+        if self.high_bid_amount is not None:
+            return self.high_bid_amount
+        return self.starting_price
 
     @property
     def bid(self):
         """Same as self.current_bid but retuns actual BidModel instance."""
-        bids = self.bids.all()
-        if bids.exists():
-            return max(bids, key=lambda b: b.bid)
-        else:
-            return None
-
-    @property
-    def bid_count(self):
-        """Return number of bids accosiated with this listing."""
-        return self.bids.count()
+        return self.high_bid
 
 
 class BidModel(models.Model):
@@ -151,8 +445,20 @@ class BidModel(models.Model):
                                 related_name='bids', verbose_name=_('Bidding listing'))
     bidder = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE,
                                related_name='bids', verbose_name=_('Listing bidder'))
-    bid = models.FloatField(_('Placed bid/price tag (in $)'),
-                            help_text=_('Make sure that bid is greater than current bid.'))
+    bid = models.DecimalField(_('Placed bid/price tag (in $)'), **MONEY,
+                              help_text=_('Make sure that bid is greater than current bid.'))
+    created_datetime = models.DateTimeField(
+        _("Bid place time"), default=current_datetime, editable=False)
+
+    class Meta:
+        indexes = [
+            # Listing bids by amount (highest bid first)
+            models.Index(fields=['listing', '-bid'],
+                         name='bid_listing_amount_idx'),
+            # Listing bid history (newest first)
+            models.Index(fields=['listing', '-created_datetime'],
+                         name='bid_listing_created_idx'),
+        ]
 
     def __str__(self):
         return f'${self.bid}'
@@ -166,6 +472,52 @@ class BidModel(models.Model):
                     _("Listing owner can not be it's bidder."))
 
 
+class ProxyBidModel(models.Model):
+    """
+    Automatic (proxy) bid: private maximum of bidder, auctions.bidding
+    bids on their behalf (by the increment) up to it.
+    """
+    listing = models.ForeignKey(ListingModel, on_delete=models.CASCADE,
+                                related_name='proxy_bids',
+                                verbose_name=_("Listing bid on"))
+    bidder = models.ForeignKey(settings.AUTH_USER_MODEL,
+                               on_delete=models.CASCADE,
+                               related_name='proxy_bids',
+                               verbose_name=_("Proxy bidder"))
+    max_bid = models.DecimalField(_("Maximum bid (in $)"), **MONEY)
+    placed_datetime = models.DateTimeField(
+        _("Maximum set time"), default=current_datetime, editable=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['listing', 'bidder'],
+                                    name='proxy_bid_listing_bidder_uniq'),
+        ]
+
+    def __str__(self):
+        return f'<= ${self.max_bid}'
+
+
+class BidIncrementModel(models.Model):
+    """
+    Bid increment band: bids on listings priced at min_price or more must
+    raise the current price by at least increment (up to the next band).
+    """
+    # Unique index also serves band lookups (highest min_price <= price)
+    min_price = models.DecimalField(_("Band lowest price (in $)"), **MONEY,
+                                    unique=True,
+                                    validators=[MinValueValidator(Decimal('0'))])
+    increment = models.DecimalField(
+        _("Minimum bid increment (in $)"), **MONEY,
+        validators=[MinValueValidator(Decimal('0.01'))])
+
+    class Meta:
+        ordering = ['min_price']
+
+    def __str__(self):
+        return f'${self.min_price}+: ${self.increment}'
+
+
 class CommentModel(models.Model):
     listing = models.ForeignKey(ListingModel, on_delete=models.CASCADE,
                                 related_name='comments',
@@ -181,6 +533,107 @@ class CommentModel(models.Model):
     last_modified_datetime = models.DateTimeField(
         _("Date and time of last modification to the comment"), auto_now=True, auto_now_add=False)
 
+    class Meta:
+        indexes = [
+            # Listing comment thread (newest first)
+            models.Index(fields=['listing', '-post_datetime'],
+                         name='comment_listing_posted_idx'),
+        ]
+
     def __str__(self):
         """Render comment in template."""
         return self.comment
+
+
+class SearchTermModel(models.Model):
+    """
+    Inverted index entry: term occurs in listing title/description.
+    Maintained by auctions.search on listing save.
+    """
+    term = models.CharField(_("Search term"), max_length=50)
+    listing = models.ForeignKey(ListingModel, on_delete=models.CASCADE,
+                                related_name='search_terms',
+                                verbose_name=_("Listing with term"))
+    # Term relevance in listing (title occurrences count more)
+    weight = models.PositiveIntegerField(_("Term weight"), default=1)
+
+    class Meta:
+        constraints = [
+            # Also serves term lookups (term is index prefix)
+            models.UniqueConstraint(fields=['term', 'listing'],
+                                    name='search_term_listing_uniq'),
+        ]
+
+    def __str__(self):
+        return self.term
+
+
+class ApiTokenModel(models.Model):
+    """
+    API access token of user (Authorization: Token <key> header), only
+    the SHA-256 digest of the key is stored (keys issued by auctions.api).
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL,
+                             on_delete=models.CASCADE,
+                             related_name='api_tokens',
+                             verbose_name=_("Token owner"))
+    digest = models.CharField(_("SHA-256 of token key"), max_length=64,
+                              unique=True, editable=False)
+    created_datetime = models.DateTimeField(
+        _("Token issue time"), default=current_datetime, editable=False)
+
+    def __str__(self):
+        return f'{self.user} {self.digest[:8]}'
+
+    @staticmethod
+    def digest_of(key):
+        return hashlib.sha256(key.encode()).hexdigest()
+
+
+class NotificationModel(models.Model):
+    """
+    Outbox of user notifications, delivered in batches by
+    auctions.notifications (manage.py send_notifications).
+    """
+    class Kind(models.TextChoices):
+        OUTBID = 'OUTBID', _('Outbid')
+        BID = 'BID', _('New bid on watched listing')
+        ENDING = 'ENDING', _('Watched listing ends soon')
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL,
+                             on_delete=models.CASCADE,
+                             related_name='notifications',
+                             verbose_name=_("Notified user"))
+    listing = models.ForeignKey(ListingModel, on_delete=models.CASCADE,
+                                related_name='notifications',
+                                verbose_name=_("Listing notified about"))
+    kind = models.CharField(_("Notification kind"), max_length=10,
+                            choices=Kind.choices)
+    # Set while notification may absorb repeated events (kind, user,
+    # listing), NULL once it can't (NULLs aren't unique)
+    dedup_key = models.CharField(_("Deduplication key"), max_length=100,
+                                 unique=True, null=True, editable=False)
+    # Coalesced events: their number and the latest bid
+    count = models.PositiveIntegerField(_("Number of events"), default=1)
+    amount = models.DecimalField(_("Latest bid (in $)"), **MONEY, null=True,
+                                 blank=True)
+
+    created_datetime = models.DateTimeField(
+        _("Notification create time"), auto_now_add=True)
+    updated_datetime = models.DateTimeField(
+        _("Last event time"), auto_now=True)
+    sent_datetime = models.DateTimeField(
+        _("Notification delivery time"), null=True, blank=True)
+    # Claimed by a worker delivering it (retried by others after it)
+    leased_until = models.DateTimeField(
+        _("Delivery lease expiry"), null=True, blank=True, editable=False)
+
+    class Meta:
+        indexes = [
+            # Pending notifications, oldest first
+            models.Index(fields=['sent_datetime', 'created_datetime'],
+                         name='notification_outbox_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.get_kind_display()}: {self.listing_id}'
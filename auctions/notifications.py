@@ -0,0 +1,224 @@
+"""
+Outbid and auction-ending notifications.
+
+Events are queued in the NotificationModel outbox with a few set-based
+queries regardless of the number of recipients:
+- accepted bid (bidding.place_bid) notifies prior bidders (outbid) and
+  watchers (new bid);
+- listing ending within ENDING_WINDOW notifies its watchers and bidders
+  once (enqueue_ending_notifications, run by the worker).
+
+Pending notifications of the same (kind, user, listing) are coalesced
+into one (event count and latest bid) through the unique dedup_key.
+The worker (manage.py send_notifications) delivers them in batches over
+one email backend connection: a batch is claimed (leased for
+LEASE_TIME) in a short transaction and sent after it commits, so bids
+queueing notifications never wait on the mail server. A notification
+being sent still absorbs events; they stay pending for the next email.
+"""
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import Case, F, Q, Value, When
+from django.urls import reverse
+from django.utils.translation import gettext as _
+
+from .models import User, ListingModel, BidModel, NotificationModel
+from .util_datetime import current_datetime
+
+Kind = NotificationModel.Kind
+
+# Notify about listings ending within this time
+ENDING_WINDOW = timedelta(hours=1)
+BATCH_SIZE = 100
+# Worker loop sleep between runs (seconds)
+INTERVAL = 10
+# Kinds absorbing repeated events until sent (ENDING is sent once)
+COALESCED_KINDS = (Kind.OUTBID, Kind.BID)
+# Claimed batch is retried by other workers after this time (crashed
+# worker)
+LEASE_TIME = timedelta(minutes=5)
+
+
+def dedup_key(kind, user_id, listing_id):
+    return f'{kind}:{user_id}:{listing_id}'
+
+
+def _enqueue(kind, recipients, amount=None):
+    """
+    Queue notifications of kind for (user_id, listing_id) recipients,
+    coalescing with pending ones. Return number of recipients.
+    """
+    keys = {dedup_key(kind, user_id, listing_id): (user_id, listing_id)
+            for user_id, listing_id in recipients}
+    if not keys:
+        return 0
+    with transaction.atomic():
+        if kind in COALESCED_KINDS:
+            # Pending ones absorb the event
+            NotificationModel.objects.filter(dedup_key__in=keys).update(
+                count=F('count') + 1, amount=amount,
+                updated_datetime=current_datetime())
+        # Others are created (existing keys are ignored)
+        NotificationModel.objects.bulk_create([
+            NotificationModel(user_id=user_id, listing_id=listing_id,
+                              kind=kind, dedup_key=key, amount=amount)
+            for key, (user_id, listing_id) in keys.items()
+        ], ignore_conflicts=True)
+    return len(keys)
+
+
+def notify_bid(bid):
+    """Queue notifications about accepted bid (BidModel)."""
+    # Everyone who bid before (except the bidder) is outbid
+    bidders = set(BidModel.objects
+                  .filter(listing=bid.listing_id)
+                  .exclude(bidder=bid.bidder_id)
+                  .values_list('bidder', flat=True).distinct())
+    watchers = set(User.watchlist.through.objects
+                   .filter(listingmodel=bid.listing_id)
+                   .exclude(user=bid.bidder_id)
+                   .values_list('user', flat=True)) - bidders
+    _enqueue(Kind.OUTBID, [(u, bid.listing_id) for u in bidders], bid.bid)
+    _enqueue(Kind.BID, [(u, bid.listing_id) for u in watchers], bid.bid)
+
+
+def enqueue_ending_notifications(cur_datetime=None, window=ENDING_WINDOW):
+    """
+    Queue (once) notifications to watchers and bidders of open listings
+    ending within window. Return number of recipients.
+    """
+    if cur_datetime is None:
+        cur_datetime = current_datetime()
+    ending = ListingModel.objects.filter(
+        closed=False, end_datetime__gt=cur_datetime,
+        end_datetime__lte=cur_datetime + window).values('pk')
+    recipients = set(User.watchlist.through.objects
+                     .filter(listingmodel__in=ending)
+                     .values_list('user', 'listingmodel'))
+    recipients |= set(BidModel.objects
+                      .filter(listing__in=ending)
+                      .values_list('bidder', 'listing').distinct())
+    return _enqueue(Kind.ENDING, recipients)
+
+
+def _message(notification):
+    """EmailMessage of notification."""
+    listing = notification.listing
+    url = getattr(settings, 'AUCTIONS_SITE_URL', '') + reverse(
+        'listing', args=[listing.pk])
+    if notification.kind == Kind.OUTBID:
+        subject = _('You were outbid on "%(title)s"')
+        body = _('Current bid is $%(amount)s (%(count)s new bid(s)).')
+    elif notification.kind == Kind.BID:
+        subject = _('New bid on "%(title)s"')
+        body = _('Current bid is $%(amount)s (%(count)s new bid(s)).')
+    else:
+        subject = _('"%(title)s" ends soon')
+        body = _('Listing ends at %(end)s.')
+    params = {'title': listing.title, 'amount': notification.amount,
+              'count': notification.count, 'end': listing.end_datetime}
+    return EmailMessage(subject % params, f'{body % params}\n\n{url}',
+                        to=[notification.user.email])
+
+
+def _claim(batch_size):
+    """Lease a batch of pending notifications, return it."""
+    now = current_datetime()
+    with transaction.atomic():
+        # Concurrent workers take different batches
+        batch = list(NotificationModel.objects
+                     .filter(Q(leased_until__isnull=True) |
+                             Q(leased_until__lte=now),
+                             sent_datetime__isnull=True)
+                     .select_related('user', 'listing')
+                     .only('kind', 'count', 'amount', 'user', 'listing',
+                           'user__email', 'listing__title',
+                           'listing__end_datetime')
+                     .order_by('created_datetime', 'pk')
+                     .select_for_update(skip_locked=True, of=('self',))
+                     [:batch_size])
+        NotificationModel.objects.filter(
+            pk__in=[n.pk for n in batch]).update(
+                leased_until=now + LEASE_TIME)
+    return batch
+
+
+def _mark_sent(notifications):
+    """
+    Mark delivered notifications sent. Ones which absorbed events while
+    being sent stay pending with those events only (released).
+    """
+    if not notifications:
+        return
+    unchanged = Q()
+    for n in notifications:
+        unchanged |= Q(pk=n.pk, count=n.count)
+    sent = NotificationModel.objects.filter(unchanged).update(
+        sent_datetime=current_datetime(), leased_until=None,
+        # Next events start new notifications (ENDING is sent once)
+        dedup_key=Case(When(kind__in=COALESCED_KINDS, then=Value(None)),
+                       default=F('dedup_key')))
+    if sent < len(notifications):
+        for n in notifications:
+            NotificationModel.objects.filter(
+                pk=n.pk, sent_datetime__isnull=True).update(
+                    count=F('count') - n.count, leased_until=None)
+
+
+def send_notifications(batch_size=BATCH_SIZE, connection=None):
+    """
+    Deliver one batch of pending notifications over one email
+    connection. Return number of delivered notifications.
+
+    Every notification is marked sent once its message is sent; if the
+    mail server fails, the rest of the batch is released for the next
+    run (a message is resent only if the failure hides its delivery).
+    """
+    batch = _claim(batch_size)
+    if not batch:
+        return 0
+    delivered = []
+    connection = connection or get_connection()
+    opened = connection.open()
+    try:
+        for notification in batch:
+            # Users without email are skipped (marked sent)
+            if notification.user.email:
+                connection.send_messages([_message(notification)])
+            delivered.append(notification)
+    finally:
+        _mark_sent(delivered)
+        if len(delivered) < len(batch):
+            # Released: retried by the next run
+            NotificationModel.objects.filter(
+                pk__in=[n.pk for n in batch[len(delivered):]]).update(
+                    leased_until=None)
+        if opened:
+            connection.close()
+    return len(batch)
+
+
+def send_pending(batch_size=BATCH_SIZE):
+    """Deliver all pending notifications, return their number."""
+    sent = 0
+    # One connection for all batches
+    with get_connection() as connection:
+        while True:
+            count = send_notifications(batch_size, connection)
+            if not count:
+                return sent
+            sent += count
+
+
+def run(interval=INTERVAL, batch_size=BATCH_SIZE, log=None):
+    """Worker loop: queue ending notices, deliver all pending."""
+    while True:
+        enqueue_ending_notifications()
+        sent = send_pending(batch_size)
+        if sent and log:
+            log(f"Sent {sent} notification(s)")
+        time.sleep(interval)
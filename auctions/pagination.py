@@ -0,0 +1,166 @@
+"""
+Keyset (cursor) pagination.
+
+Page N costs the same as page 1: instead of OFFSET the next page
+starts right after the last (key, pk) pair of the previous one,
+which is served by a composite index on the ordering columns.
+
+EstimatedCountPaginator (admin changelists of big tables) replaces
+COUNT(*) of a whole table with the row estimate of database statistics.
+"""
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as Base64Error
+
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+# Page size when client doesn't ask for one / upper bound for any page
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+class InvalidCursor(ValueError):
+    """Cursor can not be decoded (tampered or outdated)."""
+
+
+def encode_cursor(*values):
+    """Encode ordering values of the last row into opaque cursor string."""
+    raw = '|'.join(v.isoformat() if hasattr(v, 'isoformat') else str(v)
+                   for v in values)
+    return urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Decode cursor string back into list of raw string values."""
+    try:
+        padding = '=' * (-len(cursor) % 4)
+        return urlsafe_b64decode(cursor + padding).decode().split('|')
+    except (Base64Error, UnicodeDecodeError, ValueError):
+        raise InvalidCursor(cursor)
+
+
+def page_size(request, default=DEFAULT_PAGE_SIZE):
+    """Read ?size= from request, capped by MAX_PAGE_SIZE."""
+    try:
+        size = int(request.GET.get('size', default))
+    except ValueError:
+        size = default
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+
+class KeysetPage:
+    """
+    One page of keyset-paginated queryset.
+
+    Iterable like a list, knows cursor for the next page (or None).
+    Lazy: the query runs on first access (not at all if page is
+    rendered from a cached template fragment).
+    """
+
+    def __init__(self, queryset, key, size):
+        self.queryset = queryset
+        self.key = key
+        self.size = size
+        self._rows = None
+        self._next_cursor = None
+
+    def _fetch(self):
+        if self._rows is None:
+            # Fetch one extra row to find out if there is next page
+            rows = list(self.queryset[:self.size + 1])
+            if len(rows) > self.size:
+                rows = rows[:self.size]
+                last = rows[-1]
+                self._next_cursor = encode_cursor(
+                    getattr(last, self.key), last.pk)
+            self._rows = rows
+        return self._rows
+
+    @property
+    def object_list(self):
+        return self._fetch()
+
+    @property
+    def next_cursor(self):
+        self._fetch()
+        return self._next_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+
+def keyset_paginate(queryset, key, cursor=None, size=DEFAULT_PAGE_SIZE,
+                    descending=False, parse=parse_datetime):
+    """
+    Return KeysetPage of queryset ordered by (key, pk).
+
+    key - name of (indexed) ordering field, pk is a tie-breaker.
+    parse - function converting cursor string back to key value.
+    Raise InvalidCursor for malformed cursor.
+    """
+    pk_name = queryset.model._meta.pk.name
+    if descending:
+        queryset = queryset.order_by(f'-{key}', f'-{pk_name}')
+    else:
+        queryset = queryset.order_by(key, pk_name)
+
+    if cursor:
+        try:
+            raw_key, raw_pk = decode_cursor(cursor)
+            last_key, last_pk = parse(raw_key), int(raw_pk)
+        except (TypeError, ValueError):
+            raise InvalidCursor(cursor)
+        if last_key is None:
+            raise InvalidCursor(cursor)
+        # (key, pk) > (last_key, last_pk) as portable row-value comparison
+        op = 'lt' if descending else 'gt'
+        queryset = queryset.filter(
+            Q(**{f'{key}__{op}': last_key}) |
+            Q(**{key: last_key, f'{pk_name}__{op}': last_pk}))
+
+    return KeysetPage(queryset, key, size)
+
+
+def estimated_count(model, using='default'):
+    """Table row estimate of database statistics (None if unavailable)."""
+    connection = connections[using]
+    table = model._meta.db_table
+    if connection.vendor == 'mysql':
+        sql = ('SELECT TABLE_ROWS FROM information_schema.TABLES '
+               'WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s')
+    elif connection.vendor == 'postgresql':
+        sql = 'SELECT reltuples::bigint FROM pg_class WHERE relname = %s'
+    else:
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [table])
+        row = cursor.fetchone()
+    return row[0] if row and row[0] is not None and row[0] >= 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator counting unfiltered queryset by table row estimate.
+    Small tables (estimate below EXACT_COUNT_LIMIT) and filtered
+    querysets are counted exactly.
+    """
+    EXACT_COUNT_LIMIT = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if hasattr(queryset, 'query') and not queryset.query.where:
+            estimate = estimated_count(queryset.model, queryset.db)
+            if estimate is not None and estimate >= self.EXACT_COUNT_LIMIT:
+                return estimate
+        return super().count
@@ -0,0 +1,125 @@
+"""
+Real-time listing events over Server-Sent Events (ASGI only).
+
+GET /events/listings/<listing_id>/ streams events of one listing:
+
+    event: bid   - new high bid was accepted (current bid, bid count)
+    event: time  - time left, sent every HEARTBEAT_INTERVAL seconds
+
+Streams are plain ASGI coroutines in front of the Django application
+(commerce/asgi.py), so each subscriber costs one queue and no thread.
+"""
+import asyncio
+import json
+import re
+
+from asgiref.sync import sync_to_async
+from django.utils import timezone
+
+from .broker import get_broker
+from .models import ListingModel
+
+EVENTS_PATH = re.compile(r'^/events/listings/(?P<listing_id>\d+)/$')
+HEARTBEAT_INTERVAL = 15  # seconds
+
+
+def listing_channel(listing_id):
+    return f'listing:{listing_id}'
+
+
+def time_left(end_datetime):
+    """Seconds until end_datetime (0 if ended)."""
+    return max(0, int((end_datetime - timezone.now()).total_seconds()))
+
+
+def bid_event(listing):
+    return {
+        'listing_id': listing.pk,
+        # Decimal as string (exact, JSON has no decimal type)
+        'current_bid': str(listing.current_bid),
+        'bid_count': listing.bid_count,
+        'time_left': time_left(listing.end_datetime),
+    }
+
+
+def publish_bid(listing):
+    """Push accepted bid of listing to its subscribers."""
+    return get_broker().publish(listing_channel(listing.pk),
+                                ('bid', bid_event(listing)))
+
+
+def format_event(name, data):
+    return f'event: {name}\ndata: {json.dumps(data)}\n\n'.encode()
+
+
+def _get_listing(listing_id):
+    return ListingModel.objects.only(
+        'end_datetime', 'starting_price', 'bid_count', 'high_bid_amount'
+    ).filter(pk=listing_id).first()
+
+
+async def _disconnected(receive):
+    """Wait for client disconnect (skipping http.request messages)."""
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def listing_events(scope, receive, send, listing_id):
+    """SSE response streaming events of listing until client disconnects."""
+    listing = await sync_to_async(_get_listing)(listing_id)
+    if listing is None:
+        await send({'type': 'http.response.start', 'status': 404,
+                    'headers': [(b'content-type', b'text/plain')]})
+        await send({'type': 'http.response.body', 'body': b'Not found'})
+        return
+
+    broker = get_broker()
+    subscription = broker.subscribe(listing_channel(listing_id))
+    disconnect = asyncio.ensure_future(_disconnected(receive))
+    event = None
+    try:
+        await send({'type': 'http.response.start', 'status': 200, 'headers': [
+            (b'content-type', b'text/event-stream'),
+            (b'cache-control', b'no-cache'),
+            (b'x-accel-buffering', b'no'),  # no proxy buffering
+        ]})
+        await send({'type': 'http.response.body', 'more_body': True,
+                    'body': format_event('bid', bid_event(listing))})
+        end_datetime = listing.end_datetime
+        while True:
+            if event is None:
+                event = asyncio.ensure_future(subscription.get())
+            done, _ = await asyncio.wait(
+                {event, disconnect}, timeout=HEARTBEAT_INTERVAL,
+                return_when=asyncio.FIRST_COMPLETED)
+            if disconnect in done:
+                break
+            if event in done:
+                name, data = event.result()
+                body = format_event(name, data)
+                event = None
+            else:
+                body = format_event('time', {
+                    'listing_id': listing_id,
+                    'time_left': time_left(end_datetime)})
+            await send({'type': 'http.response.body', 'body': body,
+                        'more_body': True})
+        # Complete the response (servers ignore it once disconnected)
+        await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        if event is not None:
+            event.cancel()
+        disconnect.cancel()
+        broker.unsubscribe(subscription)
+
+
+def events_application(application):
+    """Wrap ASGI application, serve event streams in front of it."""
+    async def app(scope, receive, send):
+        if scope['type'] == 'http' and scope['method'] == 'GET':
+            match = EVENTS_PATH.match(scope['path'])
+            if match:
+                return await listing_events(
+                    scope, receive, send, int(match['listing_id']))
+        return await application(scope, receive, send)
+    return app
@@ -0,0 +1,59 @@
+"""
+Auction closing scheduler.
+
+Closes listings as their end time passes (in batches, by the indexed
+(closed, end_datetime) query), recording the winning bid and final
+price, so pages can rely on the stored `closed` column.
+Run by `manage.py close_auctions [--loop]`.
+"""
+import time
+
+from .cache import invalidate_updated_listings
+from .models import ListingModel
+from .util_datetime import current_datetime
+
+BATCH_SIZE = 500
+# Longest sleep of worker loop between checks (seconds)
+MAX_INTERVAL = 60
+MIN_INTERVAL = 1
+
+
+def close_ended_listings(cur_datetime=None, batch_size=BATCH_SIZE):
+    """Close all listings ended by cur_datetime, return number closed."""
+    if cur_datetime is None:
+        cur_datetime = current_datetime()
+    ended = ListingModel.objects.filter(
+        closed=False, end_datetime__lte=cur_datetime
+    ).order_by('end_datetime', 'listing_id')
+
+    total = 0
+    while True:
+        batch = dict(ended.values_list('pk', 'category')[:batch_size])
+        if not batch:
+            break
+        total += ListingModel.objects.filter(pk__in=batch).close_ended(
+            cur_datetime)
+        # UPDATE doesn't send model signals
+        invalidate_updated_listings(batch, closed=True)
+    return total
+
+
+def seconds_until_next_end(cur_datetime=None, max_interval=MAX_INTERVAL):
+    """Time to sleep until the earliest open listing ends."""
+    if cur_datetime is None:
+        cur_datetime = current_datetime()
+    next_end = ListingModel.objects.filter(closed=False).order_by(
+        'end_datetime').values_list('end_datetime', flat=True).first()
+    if next_end is None:
+        return max_interval
+    delay = (next_end - cur_datetime).total_seconds()
+    return max(MIN_INTERVAL, min(max_interval, delay))
+
+
+def run(max_interval=MAX_INTERVAL, batch_size=BATCH_SIZE, log=None):
+    """Worker loop: close ended listings, sleep until next end time."""
+    while True:
+        closed = close_ended_listings(batch_size=batch_size)
+        if closed and log:
+            log(f"Closed {closed} listing(s)")
+        time.sleep(seconds_until_next_end(max_interval=max_interval))
@@ -0,0 +1,144 @@
+"""
+Listing full-text search over an inverted index (SearchTermModel).
+
+Every listing save re-indexes its title and description terms. A query
+looks up its terms in the (term, listing) index, groups matches by
+listing, ranks them by summed term weight and pages through them with
+a (score, listing_id) cursor, so query cost depends on the number of
+matching listings, not on the size of the listing table.
+
+Portable across SQLite and MySQL (no FTS5/FULLTEXT dependency).
+"""
+import re
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+
+from .models import ListingModel, SearchTermModel
+from .pagination import (DEFAULT_PAGE_SIZE, KeysetPage, InvalidCursor,
+                         decode_cursor, encode_cursor, keyset_paginate)
+from .util_datetime import current_datetime
+
+TOKEN_RE = re.compile(r'\w+')
+MIN_TERM_LENGTH = 2
+MAX_TERM_LENGTH = 50  # SearchTermModel.term max_length
+# Title terms are more relevant than description terms
+TITLE_WEIGHT = 3
+# Index size limit per listing (most frequent terms are kept)
+MAX_TERMS_PER_LISTING = 500
+
+
+def tokenize(text):
+    """Return normalized search terms of text (with repeats)."""
+    return [token[:MAX_TERM_LENGTH] for token in TOKEN_RE.findall(text.lower())
+            if len(token) >= MIN_TERM_LENGTH]
+
+
+def listing_terms(listing):
+    """Return {term: weight} of listing title and description."""
+    weights = Counter()
+    for term in tokenize(listing.title):
+        weights[term] += TITLE_WEIGHT
+    for term in tokenize(listing.description):
+        weights[term] += 1
+    return dict(weights.most_common(MAX_TERMS_PER_LISTING))
+
+
+def index_listings(listings):
+    """(Re)build index entries of listings."""
+    listings = list(listings)
+    with transaction.atomic():
+        SearchTermModel.objects.filter(
+            listing__in=[l.pk for l in listings]).delete()
+        SearchTermModel.objects.bulk_create([
+            SearchTermModel(term=term, listing_id=listing.pk, weight=weight)
+            for listing in listings
+            for term, weight in listing_terms(listing).items()
+        ], batch_size=1000)
+
+
+def index_listing(listing):
+    index_listings([listing])
+
+
+class SearchPage(KeysetPage):
+    """Page of ranked search results (listings with search_score)."""
+
+    def __init__(self, matches, size):
+        super().__init__(matches, 'score', size)
+
+    def _fetch(self):
+        if self._rows is None:
+            rows = list(self.queryset[:self.size + 1])
+            if len(rows) > self.size:
+                rows = rows[:self.size]
+                self._next_cursor = encode_cursor(
+                    rows[-1]['score'], rows[-1]['listing'])
+            listings = ListingModel.objects.with_status().in_bulk(
+                [row['listing'] for row in rows])
+            self._rows = []
+            for row in rows:
+                # Deleted since its terms were read
+                listing = listings.get(row['listing'])
+                if listing is None:
+                    continue
+                listing.search_score = row['score']
+                self._rows.append(listing)
+        return self._rows
+
+
+def listing_filters(category=None, condition=None, min_price=None,
+                    max_price=None, active=False, cur_datetime=None,
+                    prefix=''):
+    """Q of listing filters (prefix - lookup path to listing)."""
+    q = Q()
+    if category:
+        q &= Q(**{f'{prefix}category': category})
+    if condition:
+        q &= Q(**{f'{prefix}condition': condition})
+    # Price is the highest bid or starting price (indexed current_price)
+    if min_price is not None:
+        q &= Q(**{f'{prefix}current_price__gte': min_price})
+    if max_price is not None:
+        q &= Q(**{f'{prefix}current_price__lte': max_price})
+    if active:
+        if cur_datetime is None:
+            cur_datetime = current_datetime()
+        q &= Q(**{f'{prefix}closed': False,
+                  f'{prefix}start_datetime__lt': cur_datetime,
+                  f'{prefix}end_datetime__gt': cur_datetime})
+    return q
+
+
+def search_listings(query, cursor=None, size=DEFAULT_PAGE_SIZE, **filters):
+    """
+    Return page of listings matching all query terms and filters
+    (see listing_filters), best matches first.
+    Without terms return filtered listings ending soonest first.
+    Raise InvalidCursor for malformed cursor.
+    """
+    terms = set(tokenize(query or ''))
+    if not terms:
+        listings = ListingModel.objects.with_status().filter(
+            listing_filters(**filters))
+        return keyset_paginate(listings, 'end_datetime', cursor, size)
+
+    matches = (
+        SearchTermModel.objects
+        .filter(listing_filters(prefix='listing__', **filters),
+                term__in=terms)
+        .values('listing')
+        .annotate(matched=Count('term'), score=Sum('weight'))
+        .filter(matched=len(terms))
+        .order_by('-score', '-listing')
+    )
+    if cursor:
+        try:
+            last_score, last_listing = map(int, decode_cursor(cursor))
+        except ValueError:
+            raise InvalidCursor(cursor)
+        matches = matches.filter(
+            Q(score__lt=last_score) |
+            Q(score=last_score, listing__lt=last_listing))
+    return SearchPage(matches, size)
@@ -0,0 +1,148 @@
+"""Model signal receivers (connected in AuctionsConfig.ready)."""
+import threading
+
+from django.db.models.signals import (post_save, post_delete, pre_delete,
+                                      m2m_changed)
+from django.db.models import F
+from django.dispatch import receiver
+
+from .cache import (invalidate_listing, invalidate_listings,
+                    adjust_category_count, invalidate_category_prices,
+                    invalidate_category_stats, invalidate_watched)
+from .models import User, ListingModel, BidModel, CommentModel, touched
+from .search import index_listing
+
+# Listings being deleted by this thread: their bids and comments deleted
+# by cascade need no per-row recount (nor cache invalidation)
+_deleting = threading.local()
+
+
+def _listing_deleted(listing_id):
+    return listing_id in getattr(_deleting, 'listing_ids', ())
+
+
+@receiver(pre_delete, sender=ListingModel)
+def mark_deleted_listing(sender, instance, **kwargs):
+    if not hasattr(_deleting, 'listing_ids'):
+        _deleting.listing_ids = set()
+    _deleting.listing_ids.add(instance.pk)
+
+
+@receiver(post_delete, sender=ListingModel)
+def unmark_deleted_listing(sender, instance, **kwargs):
+    _deleting.listing_ids.discard(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=BidModel)
+@receiver([post_save, post_delete], sender=CommentModel)
+def bid_or_comment_changed(sender, instance, **kwargs):
+    if not _listing_deleted(instance.listing_id):
+        invalidate_listing(instance.listing_id)
+
+
+@receiver(post_delete, sender=BidModel)
+def recount_listing_bids(sender, instance, **kwargs):
+    """
+    Recount bid columns of listing (bids are placed by bidding.place_bid),
+    deleted bid may have been the high one.
+    """
+    if _listing_deleted(instance.listing_id):
+        return
+    ListingModel.objects.filter(pk=instance.listing_id).recount_bids()
+    invalidate_listings()
+    invalidate_category_prices(instance.listing.category)
+
+
+@receiver(post_save, sender=CommentModel)
+def comment_saved(sender, instance, created, **kwargs):
+    """Bump listing version (and comment count of new comment)."""
+    listing = ListingModel.objects.filter(pk=instance.listing_id)
+    if created:
+        listing.update(**touched(), comment_count=F('comment_count') + 1)
+    else:
+        listing.touch()
+
+
+@receiver(post_delete, sender=CommentModel)
+def comment_deleted(sender, instance, **kwargs):
+    if _listing_deleted(instance.listing_id):
+        return
+    ListingModel.objects.filter(pk=instance.listing_id).update(
+        **touched(), comment_count=F('comment_count') - 1)
+
+
+@receiver([post_save, post_delete], sender=ListingModel)
+def listing_changed(sender, instance, **kwargs):
+    invalidate_listing(instance.pk)
+    invalidate_listings()
+
+
+@receiver(post_save, sender=ListingModel)
+def index_listing_terms(sender, instance, update_fields=None, **kwargs):
+    """Re-index search terms unless only other fields were saved."""
+    if update_fields is None or {'title', 'description'} & set(update_fields):
+        index_listing(instance)
+
+
+@receiver(post_save, sender=ListingModel)
+def update_category_stats(sender, instance, created, **kwargs):
+    """Adjust cached category statistics by listing changes."""
+    loaded = getattr(instance, '_loaded_values', {})
+    new = {'category': instance.category, 'closed': instance.closed,
+           'starting_price': instance.starting_price}
+
+    if created:
+        if not instance.closed:
+            adjust_category_count(instance.category, 1)
+            invalidate_category_prices(instance.category)
+    elif not all(field in loaded for field in new):
+        # Partially loaded instance, previous state is unknown
+        invalidate_category_stats(instance.category)
+    elif (loaded['category'], loaded['closed']) != (new['category'],
+                                                    new['closed']):
+        if not loaded['closed']:
+            adjust_category_count(loaded['category'], -1)
+        if not new['closed']:
+            adjust_category_count(new['category'], 1)
+        invalidate_category_prices(loaded['category'])
+        invalidate_category_prices(new['category'])
+    elif loaded['starting_price'] != new['starting_price']:
+        invalidate_category_prices(new['category'])
+
+    # Saved values are the loaded ones for the next save
+    instance._loaded_values = dict(loaded, **new)
+
+
+@receiver(post_delete, sender=ListingModel)
+def remove_from_category_stats(sender, instance, **kwargs):
+    if not instance.closed:
+        adjust_category_count(instance.category, -1)
+        invalidate_category_prices(instance.category)
+
+
+@receiver(post_save, sender=BidModel)
+def bid_changes_prices(sender, instance, created, **kwargs):
+    """List pages (fragments, ETag, price filters) show current price."""
+    if created:
+        invalidate_listings()
+        invalidate_category_prices(instance.listing.category)
+
+
+@receiver(m2m_changed, sender=User.watchlist.through)
+def watchlist_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """Drop cached watched ids of users whose watchlist changed."""
+    if not reverse:
+        # user.watchlist.add/remove/clear(...)
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            invalidate_watched([instance.pk])
+    elif action in ('post_add', 'post_remove'):
+        # listing.watchers.add/remove(...)
+        invalidate_watched(pk_set)
+    elif action == 'pre_clear':
+        invalidate_watched(instance.watchers.values_list('pk', flat=True))
+
+
+@receiver(pre_delete, sender=ListingModel)
+def unwatch_deleted_listing(sender, instance, **kwargs):
+    # Watchlist rows are deleted by cascade (no m2m_changed)
+    invalidate_watched(instance.watchers.values_list('pk', flat=True))
@@ -1,3 +1,1621 @@
-from django.test import TestCase
+import asyncio
+import json
+import os
+import random
+import re
+import runpy
+import tempfile
+import threading
+import time
+import urllib.request
+from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.apps import apps
+from django.core import mail
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.management import CommandError, call_command
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, connections
+from django.http import HttpResponse
+from django.conf import settings
+from django.test import (Client, LiveServerTestCase, RequestFactory,
+                         TestCase, TransactionTestCase)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import http_date
+from PIL import Image
+
+from commerce import db
+
+from . import benchmark, export, images, instrumentation, notifications
+from .loadtest import LoadTest, usernames
+from .marketplace import Generator
+from .bidding import BidResult, increment, place_bid
+from .cache import category_stats
+from .models import (PHOTO_WIDTHS, User, ApiTokenModel, ListingModel,
+                     BidModel, BidIncrementModel, CommentModel,
+                     NotificationModel, ProxyBidModel)
+from .pagination import EstimatedCountPaginator, encode_cursor
+from .realtime import events_application, publish_bid
+from .scheduler import close_ended_listings, seconds_until_next_end
+from .search import search_listings
+from .util_datetime import (CurrentTimeMiddleware, current_datetime,
+                            freeze_time)
+
+
+def create_user(username, **kwargs):
+    """Create user with unique phone number (phone is unique)."""
+    create_user.counter += 1
+    kwargs.setdefault('phone', f'+7999{create_user.counter:07d}')
+    return User.objects.create_user(username, **kwargs)
+
+
+create_user.counter = 0
+
+
+def create_listing(seller, starts_in=timedelta(hours=-1),
+                   ends_in=timedelta(hours=1), **kwargs):
+    """Create listing active (by default) at the current time."""
+    now = timezone.now()
+    kwargs.setdefault('title', 'Listing')
+    kwargs.setdefault('condition', ListingModel.Condition.NEW)
+    kwargs.setdefault('starting_price', 10)
+    return ListingModel.objects.create(
+        seller=seller, start_datetime=now + starts_in,
+        end_datetime=now + ends_in, **kwargs)
+
+
+def search(query, **filters):
+    """Ids of listings found by search_listings."""
+    return [l.pk for l in search_listings(query, **filters)]
+
+
+class BidTests(TestCase):
+
+    def setUp(self):
+        self.seller = create_user('seller')
+        self.bidder = create_user('bidder')
+        self.listing = create_listing(self.seller)
+
+    def test_accepted_bid_updates_listing(self):
+        result = place_bid(self.listing.pk, self.bidder, 15)
+        self.assertTrue(result.accepted)
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.bid_count, 1)
+        self.assertEqual(self.listing.current_bid, 15)
+        self.assertEqual(self.listing.high_bidder, self.bidder)
+
+    def test_low_bid_is_outbid(self):
+        place_bid(self.listing.pk, self.bidder, 15)
+        result = place_bid(self.listing.pk, create_user('other'), 15)
+        self.assertEqual(result.status, BidResult.OUTBID)
+        self.assertEqual(BidModel.objects.count(), 1)
+
+    def test_seller_can_not_bid(self):
+        result = place_bid(self.listing.pk, self.seller, 15)
+        self.assertEqual(result.status, BidResult.INVALID)
+
+    def test_ended_listing_is_inactive(self):
+        listing = create_listing(self.seller, ends_in=timedelta(hours=-1),
+                                 starts_in=timedelta(hours=-2))
+        result = place_bid(listing.pk, self.bidder, 15)
+        self.assertEqual(result.status, BidResult.INACTIVE)
+
+    def test_bid_view(self):
+        self.client.force_login(self.bidder)
+        url = reverse('bid', args=[self.listing.pk])
+        self.client.post(url, {'bid': 20})
+        self.client.post(url, {'bid': 12})
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.bid_count, 1)
+        self.assertEqual(self.listing.current_bid, 20)
+
+    def test_bid_updates_counters(self):
+        place_bid(self.listing.pk, self.bidder, 15)
+        top = place_bid(self.listing.pk, create_user('other'), 25).bid
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.bid_count, 2)
+        self.assertEqual(self.listing.high_bid, top)
+        self.assertEqual(self.listing.high_bid_amount, 25)
+        self.assertEqual(self.listing.high_bidder, top.bidder)
+
+    def test_recount_bids_repairs_drift(self):
+        place_bid(self.listing.pk, self.bidder, 15)
+        untouched = create_listing(self.seller)
+        ListingModel.objects.update(bid_count=7, high_bid=None,
+                                    high_bid_amount=None, high_bidder=None)
+        with self.assertRaisesMessage(CommandError, '2 listing(s)'):
+            call_command('recount_bids', verify=True, stdout=StringIO())
+
+        call_command('recount_bids', stdout=StringIO())
+        self.assertFalse(ListingModel.objects.bid_counter_mismatches())
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.bid_count, 1)
+        self.assertEqual(self.listing.high_bid_amount, 15)
+        self.assertEqual(self.listing.high_bidder, self.bidder)
+        untouched.refresh_from_db()
+        self.assertEqual(untouched.bid_count, 0)
+        self.assertIsNone(untouched.high_bid)
+        out = StringIO()
+        call_command('recount_bids', verify=True, stdout=out)
+        self.assertIn('consistent', out.getvalue())
+
+    def test_deleted_bid_recounted(self):
+        place_bid(self.listing.pk, self.bidder, 20)
+        place_bid(self.listing.pk, create_user('other'), 30).bid.delete()
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.bid_count, 1)
+        self.assertEqual(self.listing.high_bid_amount, 20)
+        self.assertEqual(self.listing.current_price, 20)
+        self.assertEqual(self.listing.high_bidder, self.bidder)
+        self.assertFalse(ListingModel.objects.bid_counter_mismatches())
+
+
+class ProxyBidTests(TestCase):
+
+    def setUp(self):
+        self.seller = create_user('seller')
+        self.first = create_user('first')
+        self.second = create_user('second')
+        self.listing = create_listing(self.seller)
+
+    def bids(self):
+        return list(BidModel.objects.filter(listing=self.listing)
+                    .order_by('pk').values_list('bidder__username', 'bid'))
+
+    def test_proxy_defends_high_bid(self):
+        result = place_bid(self.listing.pk, self.first, 100, proxy=True)
+        self.assertTrue(result.accepted)
+        # Proxy pays the minimum bid only
+        self.assertEqual(result.bid.bid, 11)
+        result = place_bid(self.listing.pk, self.second, 50)
+        self.assertEqual(result.status, BidResult.PROXY_OUTBID)
+        self.assertEqual(self.bids(), [('first', 11), ('second', 50),
+                                       ('first', 51)])
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.high_bidder, self.first)
+        self.assertEqual(self.listing.current_bid, 51)
+        self.assertEqual(self.listing.bid_count, 3)
+
+    def test_higher_proxy_wins_by_increment(self):
+        BidIncrementModel.objects.create(min_price=100, increment=5)
+        place_bid(self.listing.pk, self.first, 100, proxy=True)
+        result = place_bid(self.listing.pk, self.second, 150, proxy=True)
+        self.assertTrue(result.accepted)
+        self.assertEqual(self.bids(), [('first', 11), ('first', 100),
+                                       ('second', 105)])
+        self.assertFalse(ListingModel.objects.bid_counter_mismatches())
+
+    def test_earlier_maximum_wins_tie(self):
+        place_bid(self.listing.pk, self.first, 100, proxy=True)
+        result = place_bid(self.listing.pk, self.second, 100, proxy=True)
+        self.assertEqual(result.status, BidResult.PROXY_OUTBID)
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.high_bidder, self.first)
+        self.assertEqual(self.listing.current_bid, 100)
+        # Recount agrees: earliest of equal bids wins
+        self.assertFalse(ListingModel.objects.bid_counter_mismatches())
+
+    def test_raise_own_maximum_places_no_bid(self):
+        place_bid(self.listing.pk, self.first, 50, proxy=True)
+        self.assertEqual(place_bid(self.listing.pk, self.first, 40,
+                                   proxy=True).status, BidResult.OUTBID)
+        self.assertTrue(place_bid(self.listing.pk, self.first, 80,
+                                  proxy=True).accepted)
+        self.assertEqual(BidModel.objects.count(), 1)
+        self.assertEqual(ProxyBidModel.objects.get().max_bid, 80)
+
+    def test_simulated_auction(self):
+        """Bidders of private values: re-bidding vs one proxy bid each."""
+        values = [Decimal(value) for value in (60, 240, 95, 180, 130)]
+        BidIncrementModel.objects.create(min_price=100, increment=5)
+        bidders = [create_user(f'bidder{i}') for i in range(len(values))]
+
+        def listing_of(pk):
+            return ListingModel.objects.with_min_bid().get(pk=pk)
+
+        # Outbid bidders re-bid the minimum while they value it more
+        manual, manual_requests = create_listing(self.seller), 0
+        while True:
+            manual = listing_of(manual.pk)
+            willing = [bidder for bidder, value in zip(bidders, values)
+                       if bidder.pk != manual.high_bidder_id and
+                       value >= manual.min_bid]
+            if not willing:
+                break
+            place_bid(manual.pk, willing[0], manual.min_bid)
+            manual_requests += 1
+
+        # Bidders bid their value once (if still above the minimum)
+        automatic, proxy_requests = create_listing(self.seller), 0
+        for bidder, value in zip(bidders, values):
+            if value >= listing_of(automatic.pk).min_bid:
+                place_bid(automatic.pk, bidder, value, proxy=True)
+                proxy_requests += 1
+        automatic = listing_of(automatic.pk)
+
+        self.assertEqual(manual.high_bidder, bidders[1])
+        self.assertEqual(automatic.high_bidder, bidders[1])
+        # Second highest value plus one increment
+        self.assertEqual(automatic.current_bid, 180 + increment(180))
+        self.assertLessEqual(abs(automatic.current_bid - manual.current_bid),
+                             increment(180))
+        self.assertLessEqual(proxy_requests, len(values))
+        self.assertGreater(manual_requests, 10 * proxy_requests)
+        self.assertGreater(manual.bid_count, 10 * automatic.bid_count)
+
+
+class PriceTests(TestCase):
+
+    def setUp(self):
+        self.seller = create_user('seller')
+        self.bidder = create_user('bidder')
+        self.listing = create_listing(self.seller, starting_price='10.50')
+
+    def test_cents_are_exact(self):
+        place_bid(self.listing.pk, self.bidder, Decimal('11.50'))
+        result = place_bid(self.listing.pk, create_user('other'),
+                           Decimal('12.49'))
+        self.assertEqual(result.status, BidResult.OUTBID)
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.current_price, Decimal('11.50'))
+        self.assertEqual(self.listing.current_bid, Decimal('11.50'))
+
+    def test_increment_of_price_band(self):
+        BidIncrementModel.objects.create(min_price=100, increment=5)
+        place_bid(self.listing.pk, self.bidder, 100)
+        other = create_user('other')
+        self.assertEqual(place_bid(self.listing.pk, other, 104).status,
+                         BidResult.OUTBID)
+        self.assertTrue(place_bid(self.listing.pk, other, 105).accepted)
+        listing = ListingModel.objects.with_min_bid().get(pk=self.listing.pk)
+        self.assertEqual(listing.min_bid, 110)
+
+    def test_edit_keeps_current_price(self):
+        self.listing.starting_price = Decimal('8')
+        self.listing.save()
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.current_price, 8)
+
+        place_bid(self.listing.pk, self.bidder, 20)
+        # Stale instance (loaded before the bid) doesn't undo the bid
+        self.listing.starting_price = Decimal('9')
+        self.listing.save(update_fields=['starting_price'])
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.current_price, 20)
+
+        ListingModel.objects.update(current_price=0)
+        ListingModel.objects.recount_bids()
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.current_price, 20)
+
+    def test_price_range_filters(self):
+        cheap = create_listing(self.seller, starting_price=5)
+        place_bid(self.listing.pk, self.bidder, 50)
+        response = self.client.get(reverse('index'),
+                                   {'min_price': '20', 'max_price': '60'})
+        self.assertEqual([l.pk for l in response.context['listings']],
+                         [self.listing.pk])
+        self.assertEqual(search('', max_price=10), [cheap.pk])
+
+        # Invalid bounds are ignored
+        response = self.client.get(reverse('index'), {'min_price': 'x'})
+        self.assertEqual(len(response.context['listings']), 2)
+
+
+class ConcurrentBidStressTests(TransactionTestCase):
+    """
+    Fire many parallel bids on one hot listing from threads.
+
+    Size: AUCTIONS_STRESS_BIDS (default 2000), AUCTIONS_STRESS_THREADS (8).
+    """
+    bids = int(os.environ.get('AUCTIONS_STRESS_BIDS', 2000))
+    threads = int(os.environ.get('AUCTIONS_STRESS_THREADS', 8))
+
+    def test_parallel_bids_have_single_monotonic_winner(self):
+        seller = create_user('seller')
+        bidders = [create_user(f'bidder{i}') for i in range(self.threads)]
+        listing = create_listing(seller, starting_price=0)
+
+        amounts = list(range(1, self.bids + 1))
+        random.Random(0).shuffle(amounts)
+        results = []
+
+        def worker(bidder, chunk):
+            try:
+                for amount in chunk:
+                    results.append(
+                        (amount, place_bid(listing.pk, bidder, amount,
+                                           attempts=20)))
+            finally:
+                connection.close()
+
+        workers = [
+            threading.Thread(target=worker,
+                             args=(bidder, amounts[i::self.threads]))
+            for i, bidder in enumerate(bidders)
+        ]
+        started = time.perf_counter()
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+        elapsed = time.perf_counter() - started
+        print(f'\n{len(results)} bids, {self.threads} threads: '
+              f'{len(results) / elapsed:.0f} bids/s')
+
+        self.assertEqual(len(results), self.bids)
+        accepted = [amount for amount, r in results if r.accepted]
+        # Every stored bid is higher than the previous one
+        stored = list(BidModel.objects.filter(listing=listing)
+                      .order_by('pk').values_list('bid', flat=True))
+        self.assertEqual(sorted(stored), stored)
+        self.assertEqual(len(set(stored)), len(stored))
+        self.assertEqual(sorted(accepted), stored)
+        # Listing columns agree with the single winning bid
+        listing.refresh_from_db()
+        self.assertEqual(listing.bid_count, len(stored))
+        self.assertEqual(listing.high_bid_amount, stored[-1])
+        winners = [r.bid.bidder_id for amount, r in results
+                   if r.accepted and amount == stored[-1]]
+        self.assertEqual(winners, [listing.high_bidder_id])
+
+
+class PaginationTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        seller = create_user('seller')
+        self.listings = [create_listing(seller, ends_in=timedelta(hours=i))
+                         for i in range(1, 6)]
+        # Equal end time: pk breaks the tie across page boundary
+        ListingModel.objects.filter(pk=self.listings[2].pk).update(
+            end_datetime=self.listings[1].end_datetime)
+
+    def get_page(self, **params):
+        response = self.client.get(reverse('index'), {'size': 2, **params})
+        self.assertEqual(response.status_code, 200)
+        page = response.context['page']
+        return [l.pk for l in page], page.next_cursor
+
+    def test_cursor_round_trip(self):
+        pks, cursor = self.get_page()
+        seen = list(pks)
+        while cursor is not None:
+            pks, cursor = self.get_page(cursor=cursor)
+            seen += pks
+        self.assertEqual(seen, [l.pk for l in self.listings])
+
+    def test_last_page(self):
+        pks, cursor = self.get_page(size=5)
+        self.assertEqual(len(pks), 5)
+        self.assertIsNone(cursor)
+        response = self.client.get(reverse('index'), {'size': 5})
+        self.assertNotContains(response, 'cursor=')
+
+    def test_bad_cursor_is_not_found(self):
+        for cursor in ['garbage!', encode_cursor('not a date', 1),
+                       encode_cursor(timezone.now(), 'x')]:
+            response = self.client.get(reverse('index'), {'cursor': cursor})
+            self.assertEqual(response.status_code, 404)
+
+
+class QueryPlanTests(TestCase):
+    """Hot view queries must be served by indexes, not full table scans."""
+    hot_tables = [ListingModel._meta.db_table, BidModel._meta.db_table,
+                  CommentModel._meta.db_table]
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('user')
+        sellers = [create_user(f'seller{i}') for i in range(5)]
+        for i in range(200):
+            listing = create_listing(
+                sellers[i % 5], category=i % 34 + 1, closed=i % 7 == 0,
+                ends_in=timedelta(hours=i - 50))
+            for amount in range(i % 4):
+                place_bid(listing.pk, cls.user, 20 + amount)
+            CommentModel.objects.create(listing=listing, user=cls.user,
+                                        comment='Comment')
+        cls.listing = ListingModel.objects.active().first()
+        cls.user.watchlist.add(cls.listing)
+
+    def full_table_scans(self, sql):
+        """Return hot tables read with full scan in query plan of sql."""
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+                details = [row[-1] for row in cursor.fetchall()]
+                return [table for table in self.hot_tables for d in details
+                        if re.match(rf'SCAN (TABLE )?{table}$', d)]
+            if connection.vendor == 'mysql':
+                cursor.execute('EXPLAIN ' + sql)
+                columns = [c[0] for c in cursor.description]
+                plan = [dict(zip(columns, row)) for row in cursor.fetchall()]
+                return [row['table'] for row in plan if row['type'] == 'ALL'
+                        and row['table'] in self.hot_tables]
+        self.skipTest(f'No query plan check for {connection.vendor}')
+
+    def test_view_queries_use_indexes(self):
+        self.client.force_login(self.user)
+        urls = [
+            reverse('index'),
+            reverse('index') + '?min_price=20&max_price=22',
+            reverse('listing', args=[self.listing.pk]),
+            reverse('my_listings'),
+            reverse('watchlist'),
+            reverse('listing_categories'),
+            reverse('listing_category', args=[self.listing.category]),
+        ]
+        for url in urls:
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get(url)
+            for query in queries:
+                if not any(t in query['sql'] for t in self.hot_tables):
+                    continue
+                with self.subTest(url=url, sql=query['sql']):
+                    self.assertEqual(self.full_table_scans(query['sql']), [])
+
+
+class ViewBenchmarkTests(TestCase):
+    """
+    Query counts of every view must not grow with dataset size
+    nor exceed benchmark_baseline.json.
+
+    Size: AUCTIONS_BENCH_SCALE (default 1) and 3 times bigger dataset.
+    """
+    scale = int(os.environ.get('AUCTIONS_BENCH_SCALE', 1))
+
+    def test_query_counts(self):
+        rng = random.Random(0)
+        benchmark.seed_scale(self.scale, rng)
+        small = benchmark.run(benchmark.cases(benchmark.bench_user()), 2)
+        benchmark.seed_scale(self.scale * 2, rng)
+        large = benchmark.run(benchmark.cases(benchmark.bench_user()), 2)
+
+        self.assertEqual(benchmark.query_growth(small, large), [])
+        self.assertEqual(benchmark.baseline_regressions(
+            large, benchmark.load_baseline()), [])
+
+
+class FragmentCacheTests(TestCase):
+
+    def setUp(self):
+        self.user = create_user('user')
+        self.listing = create_listing(create_user('seller'), title='Cached')
+        self.url = reverse('listing', args=[self.listing.pk])
+        self.client.force_login(self.user)
+
+    def test_cached_listing_skips_queries(self):
+        self.client.get(self.url)
+        with CaptureQueriesContext(connection) as warm:
+            self.client.get(self.url)
+        CommentModel.objects.create(listing=self.listing, user=self.user,
+                                    comment='Cold again')
+        with CaptureQueriesContext(connection) as miss:
+            response = self.client.get(self.url)
+        self.assertLess(len(warm), len(miss))
+        self.assertContains(response, 'Cold again')
+
+    def test_listing_edit_invalidates_lists(self):
+        self.assertContains(self.client.get(reverse('index')), 'Cached')
+        self.listing.title = 'Renamed'
+        self.listing.save()
+        self.assertContains(self.client.get(reverse('index')), 'Renamed')
+        self.assertContains(self.client.get(reverse(
+            'listing', args=[self.listing.pk])), 'Renamed')
+
+
+class CategoryStatsTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.seller = create_user('seller')
+
+    category = ListingModel.Category.values[0]
+
+    def stats(self):
+        return category_stats([self.category])[self.category]
+
+    def test_counts_follow_listing_changes(self):
+        books = create_listing(self.seller, category=self.category)
+        create_listing(self.seller, category=self.category, starting_price=50)
+        self.assertEqual(self.stats(), {'count': 2, 'min_price': 10,
+                                        'max_price': 50})
+        with self.assertNumQueries(0):
+            self.stats()
+
+        place_bid(books.pk, create_user('bidder'), 70)
+        books.refresh_from_db()
+        books.close()
+        self.assertEqual(self.stats(), {'count': 1, 'min_price': 50,
+                                        'max_price': 50})
+
+    def test_category_page_is_paginated(self):
+        for _ in range(3):
+            create_listing(self.seller, category=self.category)
+        url = reverse('listing_category', args=[self.category])
+        response = self.client.get(url, {'size': 2})
+        self.assertEqual(len(response.context['listings']), 2)
+        response = self.client.get(url, {
+            'size': 2, 'cursor': response.context['page'].next_cursor})
+        self.assertEqual(len(response.context['listings']), 1)
+        self.assertEqual(self.client.get(url, {'cursor': '!'}).status_code,
+                         404)
+
+
+class WatchlistTests(TestCase):
+
+    def setUp(self):
+        self.user = create_user('watcher')
+        seller = create_user('seller')
+        self.listings = [create_listing(seller, title=f'Watched {i}')
+                         for i in range(3)]
+        self.client.force_login(self.user)
+
+    def test_watchlist_single_query(self):
+        self.user.watchlist.add(*self.listings)
+        place_bid(self.listings[0].pk, create_user('bidder'), 25)
+        self.listings[1].close()
+        # Watched ids (nav badge count) are cached by first request
+        self.client.get(reverse('watchlist'))
+        with CaptureQueriesContext(connection) as listed:
+            response = self.client.get(reverse('watchlist'))
+        # Listing rows (besides ETag aggregate)
+        self.assertEqual(sum('"auctions_listingmodel"."title"' in q['sql']
+                             for q in listed), 1)
+        statuses = {l.pk: (l.status, l.current_bid, l.bid_count)
+                    for l in response.context['watchlist_listings']}
+        self.assertEqual(statuses, {
+            self.listings[0].pk: (ListingModel.Status.ACTIVE, 25, 1),
+            self.listings[1].pk: (ListingModel.Status.CLOSED, 10, 0),
+            self.listings[2].pk: (ListingModel.Status.ACTIVE, 10, 0),
+        })
+
+    def test_watched_ids_cached_until_watch(self):
+        url = reverse('listing', args=[self.listings[0].pk])
+        self.assertFalse(self.client.get(url).context['is_watcher'])
+        self.client.get(reverse('watch', args=[self.listings[0].pk]))
+        self.assertTrue(self.client.get(url).context['is_watcher'])
+        self.client.get(reverse('watch', args=[self.listings[0].pk]))
+        self.assertFalse(self.client.get(url).context['is_watcher'])
+
+    def test_bulk_add_remove(self):
+        ids = [l.pk for l in self.listings]
+        self.client.post(reverse('watchlist_bulk'),
+                         {'action': 'add', 'listings': ids})
+        self.assertEqual(set(self.user.watchlist.values_list('pk', flat=True)),
+                         set(ids))
+        self.client.post(reverse('watchlist_bulk'),
+                         {'action': 'remove', 'listings': ids[:2]})
+        watched = self.user.watchlist.values_list('pk', flat=True)
+        self.assertEqual(list(watched), ids[2:])
+        # Unknown listing rejects whole request
+        self.client.post(reverse('watchlist_bulk'),
+                         {'action': 'add', 'listings': [ids[0], 0]})
+        self.assertEqual(self.user.watchlist.count(), 1)
+
+
+class NotificationTests(TestCase):
+
+    def setUp(self):
+        self.listing = create_listing(create_user('seller'), title='Lamp')
+        self.first = create_user('first', email='first@example.com')
+        self.second = create_user('second', email='second@example.com')
+        self.watcher = create_user('watcher', email='watcher@example.com')
+        self.watcher.watchlist.add(self.listing)
+
+    def pending(self, user):
+        return list(user.notifications.filter(sent_datetime__isnull=True)
+                    .values_list('kind', 'count', 'amount'))
+
+    def test_outbid_notifications_coalesce(self):
+        place_bid(self.listing.pk, self.first, 20)
+        place_bid(self.listing.pk, self.second, 30)
+        place_bid(self.listing.pk, self.second, 40)
+        self.assertEqual(self.pending(self.first),
+                         [(NotificationModel.Kind.OUTBID, 2, 40)])
+        self.assertEqual(self.pending(self.second), [])
+        self.assertEqual(self.pending(self.watcher),
+                         [(NotificationModel.Kind.BID, 3, 40)])
+
+        self.assertEqual(notifications.send_pending(batch_size=1), 2)
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox),
+                         ['first@example.com', 'watcher@example.com'])
+        self.assertIn('Lamp', mail.outbox[0].subject)
+        # Sent notification doesn't absorb new events
+        place_bid(self.listing.pk, self.second, 50)
+        self.assertEqual(self.pending(self.first),
+                         [(NotificationModel.Kind.OUTBID, 1, 50)])
+
+    def test_sent_outside_transaction(self):
+        place_bid(self.listing.pk, self.first, 20)
+        depth = len(connection.savepoint_ids)
+        sending = []
+
+        class Backend(BaseEmailBackend):
+            def send_messages(backend, messages):
+                sending.append(len(connection.savepoint_ids))
+                # Bids go on (no locks held), new event isn't absorbed
+                place_bid(self.listing.pk, self.second, 30)
+                return len(messages)
+
+        self.assertEqual(notifications.send_notifications(
+            connection=Backend()), 1)
+        self.assertEqual(sending, [depth])
+        self.assertEqual(self.pending(self.watcher),
+                         [(NotificationModel.Kind.BID, 1, 30)])
+
+    def test_failed_batch_is_retried(self):
+        place_bid(self.listing.pk, self.first, 20)
+        backend = mock.Mock()
+        backend.send_messages.side_effect = OSError('SMTP down')
+        with self.assertRaises(OSError):
+            notifications.send_notifications(connection=backend)
+        self.assertEqual(notifications.send_pending(), 1)
+        self.assertEqual([m.to[0] for m in mail.outbox],
+                         ['watcher@example.com'])
+
+    def test_partly_sent_batch(self):
+        place_bid(self.listing.pk, self.first, 20)
+        place_bid(self.listing.pk, self.second, 30)
+        sent = []
+
+        class Backend(BaseEmailBackend):
+            def send_messages(backend, messages):
+                if sent:
+                    raise OSError('SMTP down')
+                sent.extend(m.to[0] for m in messages)
+                # Event while being sent is kept for the next email
+                place_bid(self.listing.pk, self.second, 40)
+                return len(messages)
+
+        with self.assertRaises(OSError):
+            notifications.send_notifications(connection=Backend())
+        self.assertEqual(sent, ['watcher@example.com'])
+        # Watcher is notified of the new event only, first once
+        self.assertEqual(notifications.send_pending(), 2)
+        self.assertEqual([(m.to[0], m.body.split('\n')[0])
+                          for m in mail.outbox],
+                         [('watcher@example.com',
+                           'Current bid is $40.00 (1 new bid(s)).'),
+                          ('first@example.com',
+                           'Current bid is $40.00 (2 new bid(s)).')])
+        self.assertFalse(NotificationModel.objects.filter(
+            sent_datetime__isnull=True).exists())
+
+    def test_ending_notifications_queued_once(self):
+        place_bid(self.listing.pk, self.first, 20)
+        notifications.send_pending()
+        later = create_listing(self.listing.seller, ends_in=timedelta(days=1))
+        self.watcher.watchlist.add(later)
+
+        now = timezone.now()
+        self.assertEqual(notifications.enqueue_ending_notifications(now), 2)
+        notifications.send_pending()
+        notifications.enqueue_ending_notifications(now)
+        self.assertEqual(NotificationModel.objects.filter(
+            kind=NotificationModel.Kind.ENDING).count(), 2)
+        self.assertFalse(NotificationModel.objects.filter(
+            listing=later).exists())
+
+
+class ApiTests(TestCase):
+
+    def setUp(self):
+        self.seller = create_user('seller')
+        self.user = create_user('user')
+        self.listing = create_listing(self.seller, title='Api listing',
+                                      ends_in=timedelta(minutes=30))
+        create_listing(self.seller, title='Later')
+        self.client.force_login(self.user)
+
+    def test_listings_paginated_with_etag(self):
+        url = reverse('api:listings')
+        response = self.client.get(url, {'size': 1})
+        data = response.json()
+        self.assertEqual([l['title'] for l in data['results']],
+                         ['Api listing'])
+        response = self.client.get(url, {'size': 1, 'cursor': data['next']})
+        self.assertEqual(response.json()['results'][0]['title'], 'Later')
+        self.assertIsNone(response.json()['next'])
+
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(
+            url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.client.get(url, {'cursor': '!'}).status_code,
+                         400)
+
+    def test_bid_comment_and_watch(self):
+        bids_url = reverse('api:bid', args=[self.listing.pk])
+        response = self.client.post(bids_url, {'bid': 20},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['bid_count'], 1)
+        self.assertEqual(self.client.post(bids_url, {'bid': 15}).status_code,
+                         400)
+
+        comments_url = reverse('api:comments', args=[self.listing.pk])
+        self.client.post(comments_url, {'comment': 'First'})
+        self.client.post(comments_url, {'comment': 'Second'})
+        comments = self.client.get(comments_url).json()['results']
+        self.assertEqual([c['comment'] for c in comments],
+                         ['Second', 'First'])
+
+        watch_url = reverse('api:watch', args=[self.listing.pk])
+        self.assertEqual(self.client.put(watch_url).status_code, 204)
+        detail = self.client.get(reverse('api:watchlist')).json()
+        self.assertEqual(detail['results'][0]['current_bid'], '20.00')
+        self.client.delete(watch_url)
+        self.assertEqual(self.client.get(
+            reverse('api:watchlist')).json()['results'], [])
+
+    def test_anonymous_write_rejected(self):
+        self.client.logout()
+        response = self.client.post(
+            reverse('api:bid', args=[self.listing.pk]), {'bid': 20})
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(self.client.get(reverse(
+            'api:listing', args=[0])).status_code, 404)
+
+    def test_token_authentication(self):
+        self.user.set_password('secret')
+        self.user.save()
+        # API clients: no language prefix redirect, no cookies or CSRF
+        client = Client(enforce_csrf_checks=True)
+        tokens_url = '/api/v1/tokens/'
+        self.assertEqual(client.post(tokens_url, {
+            'username': 'user', 'password': 'wrong'}).status_code, 400)
+        response = client.post(
+            tokens_url, {'username': 'user', 'password': 'secret'},
+            content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        key = response.json()['token']
+        self.assertFalse(ApiTokenModel.objects.filter(digest=key).exists())
+
+        bids_url = f'/api/v1/listings/{self.listing.pk}/bids/'
+        response = client.post(bids_url, {'bid': 20},
+                               HTTP_AUTHORIZATION=f'Token {key}')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(BidModel.objects.get().bidder, self.user)
+        self.assertEqual(client.post(
+            bids_url, {'bid': 30}, HTTP_AUTHORIZATION='Token wrong'
+        ).status_code, 401)
+
+        self.assertEqual(client.delete(
+            tokens_url, HTTP_AUTHORIZATION=f'Token {key}').status_code, 204)
+        self.assertEqual(client.post(
+            bids_url, {'bid': 30}, HTTP_AUTHORIZATION=f'Token {key}'
+        ).status_code, 401)
+
+    def test_session_write_needs_csrf(self):
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.user)
+        response = client.post(
+            reverse('api:bid', args=[self.listing.pk]), {'bid': 20})
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(BidModel.objects.exists())
+
+
+class BidHistoryTests(TestCase):
+
+    def setUp(self):
+        self.seller = create_user('seller')
+        self.bidder = create_user('bidder')
+        self.listing = create_listing(self.seller, title='Clock')
+        for amount in (11, 12, 13):
+            place_bid(self.listing.pk, self.bidder, amount)
+        self.client.force_login(self.seller)
+
+    def test_history_is_paginated_newest_first(self):
+        url = reverse('listing_bids', args=[self.listing.pk])
+        response = self.client.get(url, {'size': 2})
+        self.assertEqual([b.bid for b in response.context['bids']], [13, 12])
+        response = self.client.get(url, {
+            'size': 2, 'cursor': response.context['page'].next_cursor})
+        self.assertEqual([b.bid for b in response.context['bids']], [11])
+
+        api_url = reverse('api:bid', args=[self.listing.pk])
+        results = self.client.get(api_url).json()['results']
+        self.assertEqual([(b['bidder'], b['bid']) for b in results],
+                         [('bidder', '13.00'), ('bidder', '12.00'),
+                          ('bidder', '11.00')])
+
+    def test_history_is_for_seller_only(self):
+        self.client.force_login(self.bidder)
+        self.assertEqual(self.client.get(reverse(
+            'listing_bids', args=[self.listing.pk])).status_code, 403)
+        self.assertEqual(self.client.get(reverse(
+            'api:bid', args=[self.listing.pk])).status_code, 403)
+
+    def test_streaming_export(self):
+        other = create_listing(create_user('other'))
+        place_bid(other.pk, self.bidder, 50)
+        response = self.client.get(reverse('export_bids', args=['csv']))
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertEqual(lines[0], 'id,listing,title,bidder,bid,placed')
+        # Seller's listing only
+        self.assertEqual([line.split(',')[4] for line in lines[1:]],
+                         ['11.00', '12.00', '13.00'])
+        batches = export.batches(BidModel.objects.all(), ['pk'], chunk_size=3)
+        self.assertEqual([len(rows) for rows in batches], [3, 1])
+
+        response = self.client.get(reverse('export_listings',
+                                           args=['ndjson']))
+        rows = [json.loads(line) for line in response.streaming_content]
+        self.assertEqual([(r['title'], r['current_price']) for r in rows],
+                         [('Clock', '13.00')])
+        self.assertEqual(self.client.get(reverse(
+            'export_bids', args=['xml'])).status_code, 404)
+
+
+class AdminTests(TestCase):
+
+    def setUp(self):
+        self.admin = create_user('admin', is_staff=True, is_superuser=True)
+        self.seller = create_user('seller')
+        self.bidder = create_user('bidder')
+        self.client.force_login(self.admin)
+
+    def add_rows(self, count):
+        for i in range(count):
+            listing = create_listing(self.seller)
+            place_bid(listing.pk, self.bidder, 20)
+            CommentModel.objects.create(listing=listing, user=self.bidder,
+                                        comment='Comment')
+
+    def changelist_queries(self, model):
+        url = reverse(f'admin:auctions_{model}_changelist')
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        return len(queries)
+
+    def test_changelist_queries_do_not_grow(self):
+        models = ['listingmodel', 'bidmodel', 'commentmodel']
+        self.add_rows(2)
+        small = [self.changelist_queries(model) for model in models]
+        self.add_rows(5)
+        large = [self.changelist_queries(model) for model in models]
+        self.assertEqual(small, large)
+
+    def test_bulk_actions(self):
+        self.add_rows(3)
+        listings = list(ListingModel.objects.values_list('pk', flat=True))
+        ListingModel.objects.update(bid_count=0, high_bid=None)
+        url = reverse('admin:auctions_listingmodel_changelist')
+        self.client.post(url, {'action': 'recount_bids',
+                               '_selected_action': listings})
+        self.assertFalse(ListingModel.objects.bid_counter_mismatches()
+                         .exists())
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(url, {'action': 'close_listings',
+                                   '_selected_action': listings[:2]})
+        updates = [q for q in queries if q['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 1)
+        closed = ListingModel.objects.filter(closed=True)
+        self.assertEqual(sorted(closed.values_list('pk', flat=True)),
+                         sorted(listings[:2]))
+        self.assertEqual(set(closed.values_list('final_price', flat=True)),
+                         {20})
+
+    def test_estimated_count_paginator(self):
+        self.add_rows(3)
+        bids = BidModel.objects.order_by('pk')
+        self.assertEqual(EstimatedCountPaginator(bids, 2).count, 3)
+        with mock.patch('auctions.pagination.estimated_count',
+                        return_value=50000):
+            self.assertEqual(EstimatedCountPaginator(bids, 2).count, 50000)
+            # Filtered queryset is counted exactly
+            self.assertEqual(EstimatedCountPaginator(
+                bids.filter(bid__gte=20), 2).count, 3)
+
+
+class TimeTests(TestCase):
+    """Auction edges at frozen time."""
+
+    def setUp(self):
+        cache.clear()
+        self.seller = create_user('seller')
+        self.bidder = create_user('bidder')
+        self.listing = create_listing(self.seller)
+        self.start = self.listing.start_datetime
+        self.end = self.listing.end_datetime
+
+    def status_at(self, moment):
+        with freeze_time(moment):
+            return ListingModel.objects.with_status().get(
+                pk=self.listing.pk).status
+
+    def test_status_edges(self):
+        Status = ListingModel.Status
+        tick = timedelta(microseconds=1)
+        for moment, status in [(self.start, Status.UPCOMING),
+                               (self.start + tick, Status.ACTIVE),
+                               (self.end - tick, Status.ACTIVE),
+                               (self.end, Status.ENDED)]:
+            self.assertEqual(self.status_at(moment), status)
+            with freeze_time(moment):
+                # Model, queryset and annotation agree
+                self.assertEqual(self.listing.active, status == Status.ACTIVE)
+                self.assertEqual(
+                    ListingModel.objects.active().exists(),
+                    status == Status.ACTIVE)
+
+    def test_bid_at_end(self):
+        with freeze_time(self.end - timedelta(microseconds=1)):
+            self.assertTrue(place_bid(self.listing.pk, self.bidder, 20)
+                            .accepted)
+        with freeze_time(self.end):
+            self.assertEqual(place_bid(self.listing.pk, self.bidder, 30)
+                             .status, BidResult.INACTIVE)
+
+    def listing_data(self, start, end, title='Later'):
+        """Listing form data (times in the current time zone)."""
+        start, end = timezone.localtime(start), timezone.localtime(end)
+        return {'title': title, 'category': 1, 'condition': 'NEW',
+                'starting_price': 10, 'description': '',
+                'start_date': start.strftime('%Y-%m-%d'),
+                'start_time': start.strftime('%H:%M'),
+                'end_date': end.strftime('%Y-%m-%d'),
+                'end_time': end.strftime('%H:%M')}
+
+    def test_new_listing_times_checked_at_clean_time(self):
+        self.client.force_login(self.seller)
+        data = self.listing_data(self.end, self.end + timedelta(hours=1))
+        with freeze_time(self.end + timedelta(minutes=1)):
+            response = self.client.post(reverse('add_listing'), data)
+        self.assertContains(response, 'greater than or equal')
+        with freeze_time(self.start):
+            self.client.post(reverse('add_listing'), data)
+        self.assertTrue(ListingModel.objects.filter(title='Later').exists())
+
+    def test_edit_running_listing(self):
+        self.client.force_login(self.seller)
+        url = reverse('update_listing', args=[self.listing.pk])
+        # Form shows times of the listing (the time zone they are parsed in)
+        initial = self.client.get(url).context['form'].initial
+        data = self.listing_data(self.start, self.end, title='Renamed')
+        self.assertEqual(initial['start_time'], data['start_time'])
+        response = self.client.post(url, data)
+        self.assertRedirects(response, reverse('index'))
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.title, 'Renamed')
+        self.assertEqual(self.listing.start_datetime,
+                         self.start.replace(second=0, microsecond=0))
+        self.assertEqual(self.status_at(timezone.now()),
+                         ListingModel.Status.ACTIVE)
+        # Changed start still can't be in the past
+        data = self.listing_data(self.start - timedelta(days=1), self.end)
+        response = self.client.post(url, data)
+        self.assertContains(response, 'greater than or equal')
+
+    def test_request_time(self):
+        seen = []
+
+        def view(request):
+            seen.extend([request.now, current_datetime(), current_datetime()])
+            return HttpResponse()
+
+        CurrentTimeMiddleware(view)(RequestFactory().get('/'))
+        self.assertEqual(len(set(seen)), 1)
+        # Outside of request time goes on
+        self.assertGreaterEqual(current_datetime(), seen[0])
+
+    def test_list_status_of_request_time(self):
+        self.client.force_login(self.seller)
+        with freeze_time(self.start - timedelta(minutes=1)):
+            response = self.client.get(reverse('my_listings'))
+        self.assertContains(response, 'Not active')
+        with freeze_time(self.start + timedelta(minutes=1)):
+            response = self.client.get(reverse('my_listings'))
+        self.assertNotContains(response, 'Not active')
+
+
+class InstrumentationTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        instrumentation.registry = instrumentation.Registry()
+        self.listing = create_listing(create_user('seller'))
+
+    def middleware(self, get_response, **options):
+        with self.settings(**options):
+            return instrumentation.InstrumentationMiddleware(get_response)
+
+    def request(self, view_name):
+        request = RequestFactory().get('/')
+        request.resolver_match = mock.Mock(view_name=view_name)
+        return request
+
+    def test_metrics_of_views(self):
+        middleware = settings.MIDDLEWARE + [
+            'auctions.instrumentation.InstrumentationMiddleware']
+        with self.settings(INSTRUMENTATION=True, MIDDLEWARE=middleware):
+            self.client.get(reverse('listing', args=[self.listing.pk]))
+            # Not redirected to a language prefixed URL
+            response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        metrics = response.content.decode()
+        self.assertIn('auctions_request_duration_seconds_count'
+                      '{view="listing"} 1', metrics)
+        self.assertIn('auctions_cache_misses_total{view="listing"}', metrics)
+        stats = instrumentation.registry.values
+        self.assertGreater(
+            stats['auctions_request_queries']['listing'].sum, 0)
+        self.assertGreater(stats['auctions_request_template_duration_seconds']
+                           ['listing'].sum, 0)
+        # Disabled instrumentation hides the endpoint
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 404)
+
+    def test_duplicate_queries_reported(self):
+        def n_plus_one(request):
+            for pk in range(instrumentation.DUPLICATE_THRESHOLD):
+                ListingModel.objects.filter(pk=pk).first()
+            return HttpResponse()
+
+        middleware = self.middleware(n_plus_one)
+        with self.assertLogs('auctions.instrumentation', 'WARNING') as logs:
+            middleware(self.request('index'))
+        self.assertIn('auctions/tests.py', logs.output[0])
+        self.assertIn('in n_plus_one', logs.output[0])
+        self.assertEqual(instrumentation.registry.values[
+            'auctions_duplicate_queries_total']['index'], 1)
+
+    def test_sampled_profiles(self):
+        with tempfile.TemporaryDirectory() as profile_dir:
+            middleware = self.middleware(
+                lambda request: HttpResponse(),
+                INSTRUMENTATION_PROFILE_EVERY=2,
+                INSTRUMENTATION_PROFILE_DIR=profile_dir)
+            for i in range(4):
+                middleware(self.request('auctions:index'))
+            profiles = os.listdir(profile_dir)
+        self.assertEqual(len(profiles), 2)
+        self.assertTrue(profiles[0].startswith('auctions-index-'))
+
+
+def jpeg(size=(1600, 1200)):
+    output = BytesIO()
+    Image.new('RGB', size, 'teal').save(output, 'JPEG')
+    return output.getvalue()
+
+
+class ImageTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.media_root = media_root.name
+        self.settings_override = self.settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+        self.seller = create_user('seller')
+
+    def process(self):
+        with ThreadPoolExecutor(1) as executor:
+            return images.process_pending(executor)
+
+    def stored(self):
+        return sorted(os.path.relpath(os.path.join(root, name),
+                                      self.media_root)
+                      for root, dirs, names in os.walk(self.media_root)
+                      for name in names)
+
+    def test_uploaded_photo_resized(self):
+        self.client.force_login(self.seller)
+        start = timezone.localtime() + timedelta(hours=1)
+        end = start + timedelta(days=1)
+        self.client.post(reverse('add_listing'), {
+            'title': 'Camera', 'category': 1, 'condition': 'NEW',
+            'starting_price': 10, 'description': '',
+            'start_date': start.strftime('%Y-%m-%d'),
+            'start_time': start.strftime('%H:%M'),
+            'end_date': end.strftime('%Y-%m-%d'),
+            'end_time': end.strftime('%H:%M'),
+            'photo': SimpleUploadedFile('camera.png', jpeg())})
+        listing = ListingModel.objects.get(title='Camera')
+        self.assertEqual(listing.photo_status,
+                         ListingModel.PhotoStatus.PENDING)
+        self.assertIn('no-photo', listing.thumbnail_url)
+        # Unprocessed upload isn't linked (nor served)
+        self.assertIn('no-photo', listing.photo_display_url)
+        self.assertEqual(self.client.get(listing.photo.url).status_code, 404)
+
+        self.assertEqual(self.process(), 1)
+        listing.refresh_from_db()
+        self.assertEqual(listing.photo_status, ListingModel.PhotoStatus.READY)
+        # Upload replaced by re-encoded JPEG of server chosen name
+        self.assertRegex(listing.photo.name,
+                         rf'^listings/.*/{listing.pk}-[0-9a-f]{{16}}\.jpg$')
+        self.assertEqual(len(self.stored()), 1 + len(PHOTO_WIDTHS))
+        response = self.client.get(listing.thumbnail_url)
+        content = b''.join(response.streaming_content)
+        with Image.open(BytesIO(content)) as image:
+            self.assertEqual(image.size, (160, 120))
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertEqual(response['X-Content-Type-Options'], 'nosniff')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn('480w', listing.photo_srcset)
+
+    def test_not_an_image_failed(self):
+        listing = create_listing(self.seller,
+                                 photo_status=ListingModel.PhotoStatus.PENDING)
+        listing.photo.save('photo.jpg', ContentFile(b'not an image'))
+        self.process()
+        listing.refresh_from_db()
+        self.assertEqual(listing.photo_status,
+                         ListingModel.PhotoStatus.FAILED)
+        self.assertFalse(listing.photo)
+        self.assertEqual(self.stored(), [])
+
+    def test_pending_upload_not_served(self):
+        listing = create_listing(self.seller,
+                                 photo_status=ListingModel.PhotoStatus.PENDING)
+        # Client chosen name looking like one the worker stores
+        listing.photo.save(f'{listing.pk}-{"0" * 16}.jpg',
+                           ContentFile(b'<script>alert(1)</script>'))
+        self.assertTrue(listing.photo.name.startswith('uploads/'))
+        self.assertEqual(self.client.get(listing.photo.url).status_code, 404)
+        # Nor is anything stored under names the worker doesn't create
+        default_storage.save('listings/2021/07/evil.jpg', ContentFile(b'x'))
+        self.assertEqual(self.client.get(
+            default_storage.url('listings/2021/07/evil.jpg')).status_code, 404)
+
+    def test_downloaded_html_never_stored(self):
+        listing = create_listing(self.seller,
+                                 photo_url='https://example.com/page.html',
+                                 photo_status=ListingModel.PhotoStatus.PENDING)
+        with mock.patch('auctions.images.download',
+                        return_value=b'<script>alert(1)</script>'):
+            self.process()
+        listing.refresh_from_db()
+        self.assertEqual(listing.photo_status,
+                         ListingModel.PhotoStatus.FAILED)
+        self.assertFalse(listing.photo)
+        self.assertEqual(self.stored(), [])
+
+    def test_private_photo_url_refused(self):
+        listing = create_listing(self.seller,
+                                 photo_url='http://127.0.0.1/photo.jpg',
+                                 photo_status=ListingModel.PhotoStatus.PENDING)
+        with mock.patch.object(images._opener, 'open') as urlopen:
+            self.process()
+        urlopen.assert_not_called()
+        listing.refresh_from_db()
+        self.assertEqual(listing.photo_status,
+                         ListingModel.PhotoStatus.FAILED)
+        # Refused host isn't hotlinked either
+        self.assertIn('no-photo', listing.photo_display_url)
+        response = self.client.get(reverse('listing', args=[listing.pk]))
+        self.assertNotContains(response, '127.0.0.1')
+
+    def test_redirect_to_private_host_refused(self):
+        handler = images._PublicRedirectHandler()
+        request = urllib.request.Request('https://example.com/photo.jpg')
+        with self.assertRaises(ValueError):
+            handler.redirect_request(request, None, 302, 'Found', {},
+                                     'http://127.0.0.1/admin/')
+        with self.assertRaises(ValueError):
+            handler.redirect_request(request, None, 302, 'Found', {},
+                                     'file:///etc/passwd')
+
+
+class MarketplaceTests(LiveServerTestCase):
+
+    def setUp(self):
+        cache.clear()
+        Generator(batch_size=50, rng=random.Random(1)).generate(
+            users=5, listings=100, bids=500, comments=50, watches=50)
+
+    def test_generated_distributions(self):
+        self.assertFalse(ListingModel.objects.bid_counter_mismatches())
+        counts = sorted(ListingModel.objects.filter(bid_count__gt=0)
+                        .values_list('bid_count', flat=True), reverse=True)
+        # Zipf: hottest listing gets many times the median bids
+        self.assertGreater(counts[0], 10 * counts[len(counts) // 2])
+        for listing in ListingModel.objects.filter(bid_count__gt=1)[:10]:
+            bids = list(listing.bids.order_by('created_datetime', 'pk')
+                        .values_list('bid', flat=True))
+            self.assertEqual(bids, sorted(bids))
+        # Ended listings are closed
+        self.assertFalse(ListingModel.objects.filter(
+            closed=False, end_datetime__lte=timezone.now()).exists())
+
+    def test_load_driver(self):
+        test = LoadTest(self.live_server_url, usernames(5), concurrency=1,
+                        duration=1, mix={'index': 1, 'listing': 1, 'bid': 1})
+        rows = {row['action']: row for row in test.run()}
+        self.assertEqual(set(rows), {'index', 'listing', 'bid'})
+        self.assertTrue(all(row['requests'] for row in rows.values()))
+        self.assertFalse(any(row['errors'] for row in rows.values()))
+        self.assertTrue(BidModel.objects.filter(
+            bidder__username='user0').exists())
+
+
+class ServerConfigTests(TestCase):
+
+    def setUp(self):
+        self.config = runpy.run_path(
+            os.path.join(settings.BASE_DIR, 'gunicorn.conf.py'))
+
+    def test_several_workers_need_shared_state(self):
+        server = mock.Mock()
+        server.cfg.workers = 3
+        # Per-process LocMemCache and InProcessBroker
+        with self.assertRaises(RuntimeError):
+            self.config['on_starting'](server)
+        server.cfg.workers = 1
+        self.config['on_starting'](server)
+
+        shared = {'default': {
+            'BACKEND': 'django_redis.cache.RedisCache',
+            'LOCATION': 'redis://localhost:6379/0'}}
+        with self.settings(CACHES=shared,
+                           AUCTIONS_BROKER='auctions.broker.RedisBroker'):
+            self.assertEqual(
+                self.config['process_local_state'](settings), [])
+
+
+class ReplicaRoutingTests(TransactionTestCase):
+    """Primary and lagging replica stand-in: two SQLite databases."""
+    # Default and replica (added by setUpClass)
+    databases = '__all__'
+
+    @classmethod
+    def setUpClass(cls):
+        fd, cls.replica_path = tempfile.mkstemp(suffix='.sqlite3')
+        os.close(fd)
+        connections.settings['replica'] = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': cls.replica_path, 'REPLICA': True}
+        with connections['replica'].schema_editor() as editor:
+            for model in apps.get_models():
+                editor.create_model(model)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections['replica'].close()
+        del connections['replica']
+        del connections.settings['replica']
+        os.remove(cls.replica_path)
+
+    def setUp(self):
+        cache.clear()
+        # Rows are written to the primary only (replica lags behind)
+        self.listing = create_listing(create_user('seller'), title='Fresh')
+
+    def test_replica_views_read_replica(self):
+        response = self.client.get(reverse('index'))
+        self.assertEqual(len(response.context['listings']), 0)
+        # Other views read the primary
+        self.assertEqual(self.client.get(reverse(
+            'api:listing', args=[self.listing.pk])).status_code, 200)
+
+    def test_reads_follow_own_writes(self):
+        self.client.force_login(create_user('bidder'))
+        response = self.client.post(reverse('bid', args=[self.listing.pk]),
+                                    {'bid': 20})
+        self.assertIn(db.REPLICA_PIN_COOKIE, response.cookies)
+        response = self.client.get(reverse('index'))
+        self.assertEqual([l.pk for l in response.context['listings']],
+                         [self.listing.pk])
+
+    def test_connection_pool(self):
+        Pooled = type('Pooled', (db.PooledConnectionMixin,
+                                 connections['replica'].__class__), {})
+        wrapper = Pooled(dict(connections['replica'].settings_dict,
+                              POOL_SIZE=1), alias='pooled')
+        wrapper.connect()
+        raw = wrapper.connection
+        wrapper.close()
+        wrapper.connect()
+        self.assertIs(wrapper.connection, raw)
+        wrapper.close()
+
+    def test_databases_from_environment(self):
+        databases = db.databases({'DB_REPLICA_HOSTS': 'r1,r2',
+                                  'DB_POOL': '1'})
+        self.assertEqual([(alias, d['HOST'], d.get('REPLICA'))
+                          for alias, d in databases.items()],
+                         [('default', 'mysql', None),
+                          ('replica1', 'r1', True), ('replica2', 'r2', True)])
+        self.assertEqual(databases['default']['ENGINE'],
+                         'commerce.mysql_pool')
+
+
+class ConditionalGetTests(TestCase):
+
+    def setUp(self):
+        self.seller = create_user('seller')
+        self.user = create_user('user')
+        self.listing = create_listing(self.seller)
+        self.url = reverse('listing', args=[self.listing.pk])
+
+    def revalidate(self, url):
+        etag = self.client.get(url)['ETag']
+        return self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    def test_listing_not_modified_until_changed(self):
+        self.client.force_login(self.user)
+        etag = self.client.get(self.url)['ETag']
+        with self.assertNumQueries(3):
+            # Session, user and listing version only
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        place_bid(self.listing.pk, create_user('bidder'), 20)
+        self.assertEqual(self.client.get(
+            self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        etag = self.client.get(self.url)['ETag']
+        CommentModel.objects.create(listing=self.listing, user=self.user,
+                                    comment='New')
+        self.assertEqual(self.client.get(
+            self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_edit_and_watch_change_etag(self):
+        self.client.force_login(self.user)
+        etag = self.client.get(self.url)['ETag']
+        self.listing.title = 'Renamed'
+        self.listing.save()
+        self.assertEqual(self.listing.version, 2)
+        self.assertNotEqual(self.client.get(self.url)['ETag'], etag)
+
+        etag = self.client.get(reverse('index'))['ETag']
+        self.user.watchlist.add(self.listing)
+        self.assertNotEqual(self.client.get(reverse('index'))['ETag'], etag)
+        self.assertEqual(self.revalidate(reverse('watchlist')).status_code,
+                         304)
+
+    def test_cache_control(self):
+        response = self.revalidate(reverse('index'))
+        self.assertEqual(response.status_code, 304)
+        self.assertIn('public', response['Cache-Control'])
+        response = self.client.get(self.url)
+        self.assertIn('public', response['Cache-Control'])
+        self.assertNotIn('csrftoken', response.cookies)
+
+        self.client.force_login(self.user)
+        response = self.client.get(self.url)
+        self.assertIn('private', response['Cache-Control'])
+
+    def test_bid_changes_list_pages(self):
+        url = reverse('index')
+        etag = self.client.get(url)['ETag']
+        place_bid(self.listing.pk, create_user('bidder'), 37)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, '37')
+        response = self.client.get(url, {'min_price': 30})
+        self.assertContains(response, self.listing.title)
+
+    def test_last_modified_of_future_stamps(self):
+        listing = create_listing(self.seller, starts_in=timedelta(hours=1),
+                                 ends_in=timedelta(hours=2))
+        # Request time before the listing was last modified
+        moment = listing.modified_datetime - timedelta(minutes=1)
+        with freeze_time(moment):
+            response = self.client.get(reverse('listing', args=[listing.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Last-Modified'], http_date(
+            moment.timestamp()))
+
+    def test_delete_queries_do_not_grow(self):
+        def delete_queries(bids):
+            listing = create_listing(self.seller)
+            for i in range(bids):
+                place_bid(listing.pk, create_user(f'bidder{bids}-{i}'), 11 + i)
+                CommentModel.objects.create(listing=listing, user=self.user,
+                                            comment=f'Comment {i}')
+            with CaptureQueriesContext(connection) as queries:
+                listing.delete()
+            return len(queries)
+
+        self.assertEqual(delete_queries(2), delete_queries(10))
+        # Bid deleted on its own still updates its listing
+        place_bid(self.listing.pk, create_user('bidder'), 20).bid.delete()
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.bid_count, 0)
+
+
+class CommentThreadTests(TestCase):
+
+    def setUp(self):
+        self.user = create_user('user')
+        self.listing = create_listing(create_user('seller'))
+        self.client.force_login(self.user)
+        for i in range(12):
+            CommentModel.objects.create(listing=self.listing, user=self.user,
+                                        comment=f'Comment {i}')
+
+    def test_comment_count_follows_comments(self):
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.comment_count, 12)
+        self.listing.comments.first().delete()
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.comment_count, 11)
+
+    def test_comments_paginated_newest_first(self):
+        response = self.client.get(reverse('listing', args=[self.listing.pk]))
+        page = response.context['comments']
+        self.assertEqual([c.comment for c in page][:2],
+                         ['Comment 11', 'Comment 10'])
+        self.assertEqual(len(page), 10)
+
+        url = reverse('listing_comments', args=[self.listing.pk])
+        with self.assertNumQueries(1):
+            response = self.client.get(url, {'cursor': page.next_cursor},
+                                       HTTP_ACCEPT='application/json')
+        data = response.json()
+        self.assertEqual([c['comment'] for c in data['results']],
+                         ['Comment 1', 'Comment 0'])
+        self.assertIsNone(data['next'])
+        response = self.client.get(url, {'cursor': page.next_cursor})
+        self.assertContains(response, 'Comment 0')
+
+
+class ListingEventsTests(TestCase):
+
+    def setUp(self):
+        self.listing = create_listing(create_user('seller'))
+
+    async def stream(self, path, on_start=None):
+        """Request event stream, return sent events until disconnect."""
+        app = events_application(None)
+        disconnect = asyncio.Event()
+        events = []
+        # Request body first (ASGI spec), then disconnect
+        messages = [{'type': 'http.request', 'body': b'',
+                     'more_body': False}]
+
+        async def receive():
+            if messages:
+                return messages.pop(0)
+            await disconnect.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                events.append(('status', message['status']))
+            elif not message.get('more_body', False):
+                events.append(('end', message['body']))
+            elif message['body'].startswith(b'event: '):
+                name, data = message['body'].decode().split('\n')[:2]
+                events.append((name[7:], json.loads(data[6:])))
+                if len(events) == 2 and on_start:
+                    on_start()
+                if len(events) == 3:
+                    disconnect.set()
+
+        scope = {'type': 'http', 'method': 'GET', 'path': path}
+        await asyncio.wait_for(app(scope, receive, send), timeout=5)
+        return events
+
+    async def test_accepted_bid_is_pushed(self):
+        self.listing.bid_count = 1
+        self.listing.high_bid_amount = Decimal('42.50')
+
+        def publish():
+            # Publish from other thread, like sync views do
+            asyncio.get_running_loop().run_in_executor(
+                None, publish_bid, self.listing)
+
+        events = await self.stream(
+            f'/events/listings/{self.listing.pk}/', publish)
+        self.assertEqual(events[0], ('status', 200))
+        self.assertEqual(events[1][1]['bid_count'], 0)
+        self.assertEqual(events[2][0], 'bid')
+        self.assertEqual(events[2][1]['current_bid'], '42.50')
+        # Response completed after disconnect
+        self.assertEqual(events[3:], [('end', b'')])
+
+    async def test_request_message_is_not_disconnect(self):
+        with mock.patch('auctions.realtime.HEARTBEAT_INTERVAL', 0.01):
+            events = await self.stream(f'/events/listings/{self.listing.pk}/')
+        # Stream stayed open after http.request: heartbeat sent
+        self.assertEqual([event[0] for event in events],
+                         ['status', 'bid', 'time', 'end'])
+
+    async def test_unknown_listing(self):
+        events = await self.stream('/events/listings/0/')
+        self.assertEqual(events, [('status', 404), ('end', b'Not found')])
+
+
+class SchedulerTests(TestCase):
+
+    def setUp(self):
+        self.seller = create_user('seller')
+        self.bidder = create_user('bidder')
+
+    def test_close_ended_listings_records_winner(self):
+        listing = create_listing(self.seller, ends_in=timedelta(minutes=1))
+        place_bid(listing.pk, self.bidder, 30)
+        open_listing = create_listing(self.seller, ends_in=timedelta(hours=2))
+
+        closed = close_ended_listings(timezone.now() + timedelta(minutes=2),
+                                      batch_size=1)
+        self.assertEqual(closed, 1)
+        listing.refresh_from_db()
+        self.assertTrue(listing.closed)
+        self.assertEqual(listing.closed_datetime, listing.end_datetime)
+        self.assertEqual(listing.winning_bid.bidder, self.bidder)
+        self.assertEqual(listing.final_price, 30)
+        open_listing.refresh_from_db()
+        self.assertFalse(open_listing.closed)
+
+    def test_sleep_until_next_end(self):
+        now = timezone.now()
+        create_listing(self.seller, ends_in=timedelta(seconds=30))
+        self.assertAlmostEqual(seconds_until_next_end(now, 60), 30, delta=1)
+        self.assertEqual(seconds_until_next_end(now, 10), 10)
+
+
+class SearchTests(TestCase):
+
+    def setUp(self):
+        seller = create_user('seller')
+        self.lamp = create_listing(seller, title='Brass lamp',
+                                   description='Old lamp, brass finish',
+                                   category=1)
+        self.table = create_listing(seller, title='Oak table',
+                                    description='Table with brass legs',
+                                    category=2, starting_price=100)
+        self.ended = create_listing(seller, title='Brass bell',
+                                    starts_in=timedelta(hours=-3),
+                                    ends_in=timedelta(hours=-1))
+
+    def test_ranked_by_term_weight(self):
+        self.assertEqual(search('brass'),
+                         [self.lamp.pk, self.ended.pk, self.table.pk])
+        self.assertEqual(search('BRASS table'), [self.table.pk])
+        self.assertEqual(search('chair'), [])
+
+    def test_filters(self):
+        self.assertEqual(search('brass', active=True),
+                         [self.lamp.pk, self.table.pk])
+        self.assertEqual(search('brass', category=2), [self.table.pk])
+        self.assertEqual(search('brass', min_price=50), [self.table.pk])
+
+    def test_listing_deleted_between_queries(self):
+        with_status = ListingModel.objects.with_status
+
+        def delete_then_load():
+            self.lamp.delete()
+            return with_status()
+
+        page = search_listings('brass')
+        with mock.patch.object(ListingModel.objects, 'with_status',
+                               delete_then_load):
+            self.assertEqual([l.pk for l in page],
+                             [self.ended.pk, self.table.pk])
+
+    def test_index_follows_edits(self):
+        self.table.title = 'Pine table'
+        self.table.save()
+        self.assertEqual(search('pine'), [self.table.pk])
+        self.assertEqual(search('oak'), [])
+        self.lamp.delete()
+        self.assertEqual(search('lamp'), [])
+
+    def test_pagination(self):
+        page = search_listings('brass', size=2)
+        self.assertTrue(page.has_next)
+        rest = search_listings('brass', cursor=page.next_cursor, size=2)
+        self.assertEqual([l.pk for l in page] + [l.pk for l in rest],
+                         search('brass'))
+
+    def test_search_view(self):
+        response = self.client.get(reverse('search'), {'q': 'lamp'})
+        self.assertContains(response, 'Brass lamp')
+        self.assertNotContains(response, 'Oak table')
@@ -1,6 +1,6 @@
 from django.urls import path
 
-from . import views
+from . import export, views
 
 urlpatterns = [
     path("", views.index, name="index"),
@@ -24,12 +24,23 @@ urlpatterns = [
          name="listing_categories"),
     path("listings/categories/<int:category>/",
          views.listing_category, name="listing_category"),
+    # Listing search
+    path("listings/search/", views.search, name="search"),
     # Bid listing
     path('bid/<int:listing_id>/', views.bid, name="bid"),
+    path('listings/<int:listing_id>/bids/', views.listing_bids,
+         name="listing_bids"),
     # Comment listing
     path('comment/<int:listing_id>/', views.comment, name="comment"),
+    path('listings/<int:listing_id>/comments/', views.listing_comments,
+         name="listing_comments"),
     # Watch listing
     path('watch/<int:listing_id>/', views.watch, name="watch"),
     # Watchlist of listings
-    path('watchlist/', views.watchlist, name='watchlist')
+    path('watchlist/', views.watchlist, name='watchlist'),
+    path('watchlist/bulk/', views.watchlist_bulk, name='watchlist_bulk'),
+    # Streaming CSV/NDJSON exports
+    path('export/bids.<str:fmt>', export.bids, name='export_bids'),
+    path('export/listings.<str:fmt>', export.listings,
+         name='export_listings'),
 ]
@@ -1,29 +1,80 @@
-from datetime import timedelta, timezone, datetime
+"""
+Time service: the single "now" of auctions code.
+
+current_datetime() returns aware datetime (settings.USE_TZ) which is
+- the frozen time inside freeze_time() (tests of auction edges);
+- the request time inside a request (CurrentTimeMiddleware), so every
+  status check, validator and query of one request agrees on "now";
+- otherwise the current time (scheduler, commands).
+String helpers format it in the current time zone (settings.TIME_ZONE).
+"""
+from contextlib import ContextDecorator
+
+from asgiref.local import Local
+from django.utils import timezone
+
+# Request time (thread or async task)
+_state = Local()
+# Frozen time (all threads: test client and live server requests)
+_frozen = None
 
 
 def current_datetime():
-    """Get current date and time with timezone offset."""
-    msk_tz = timezone(timedelta(hours=3), 'MSK')
-    cur_dt = datetime.now(tz=msk_tz)
-    return cur_dt
+    """Get current date and time (aware, see module docstring)."""
+    if _frozen is not None:
+        return _frozen
+    now = getattr(_state, 'now', None)
+    if now is not None:
+        return now
+    return timezone.now()
+
+
+class freeze_time(ContextDecorator):
+    """Context manager/decorator: current_datetime() returns moment."""
+
+    def __init__(self, moment):
+        self.moment = moment
+
+    def __enter__(self):
+        global _frozen
+        self.previous, _frozen = _frozen, self.moment
+        return self.moment
+
+    def __exit__(self, *exc_info):
+        global _frozen
+        _frozen = self.previous
+
+
+class CurrentTimeMiddleware:
+    """Capture current_datetime() once per request."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        _state.now = request.now = current_datetime()
+        try:
+            return self.get_response(request)
+        finally:
+            _state.now = None
 
 
 def current_datetime_string():
     """Get current datetime str formatted."""
-    cur_dt = current_datetime()
+    cur_dt = timezone.localtime(current_datetime())
     cur_dt_str = cur_dt.strftime('%Y-%m-%d %H:%M')
     return cur_dt_str
 
 
 def current_date_string():
     """Get current date str formatted."""
-    cur_dt = current_datetime()
+    cur_dt = timezone.localtime(current_datetime())
     cur_date_str = cur_dt.strftime('%Y-%m-%d')
     return cur_date_str
 
 
 def current_time_string():
     """Get current time str formatted."""
-    cur_dt = current_datetime()
+    cur_dt = timezone.localtime(current_datetime())
     cur_time_str = cur_dt.strftime('%H:%M')
     return cur_time_str
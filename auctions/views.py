@@ -1,33 +1,72 @@
 from django.contrib.auth import get_user_model, authenticate, login, logout
 from django.contrib.auth.decorators import login_required
 from django.db import IntegrityError
-from django.http import HttpResponse, HttpResponseRedirect, Http404
+from django.http import (HttpResponse, HttpResponseRedirect, Http404,
+                         JsonResponse)
 from django.shortcuts import render, redirect, get_object_or_404
 from django.urls import reverse
 from django.contrib import messages
-from django.core.exceptions import ValidationError
+from django.core.exceptions import PermissionDenied
 from django.utils.translation import gettext_lazy as _
-
-from .forms import UserCreationForm, ListingForm, BidForm, CommentForm
+from django.views.decorators.http import condition
+
+from .api import serialize_comment
+from .bidding import bid_history, can_view_bids, place_bid
+from .cache import (FRAGMENT_TIMEOUT, LIST_FRAGMENT_TIMEOUT,
+                    listing_version, listings_version, category_stats,
+                    watched_ids)
+from .conditional import (cache_headers, listing_etag, listing_last_modified,
+                          listings_etag, watchlist_etag)
+from .forms import (UserCreationForm, ListingForm, BidForm, CommentForm,
+                    PriceRangeForm, SearchForm, WatchlistBulkForm)
 from .util_datetime import current_datetime
 from .models import ListingModel, CommentModel
+from .pagination import keyset_paginate, page_size, InvalidCursor
+from .search import search_listings
 
 UserModel = get_user_model()
 
+# Comments per page of listing comment thread
+COMMENTS_PAGE_SIZE = 10
+
+
+def price_range(request):
+    """
+    Price range filter of list pages: form, current_price lookups and
+    GET query of valid bounds (kept in next page links and cache keys).
+    """
+    form = PriceRangeForm(request.GET)
+    filters = form.filters()
+    query = '&'.join(f'{name}={form.cleaned_data[name]}'
+                     for name in form.fields
+                     if filters and form.cleaned_data[name] is not None)
+    return form, filters, query
+
 
+@cache_headers
+@condition(etag_func=listings_etag)
 def index(request):
-    """List all active listings."""
-    # Query all users saved in database (class.Manager.QuerySet)
-    users = UserModel.objects.all()
-    listings = []
-    for user in users:
-        cur_datetime = current_datetime()
-        # Query all active listings (instance.RelatedManager.QuerySet)
-        # or: ListingModel.objects.all()
-        listings.extend(user.listings.filter(
-            end_datetime__gt=cur_datetime, start_datetime__lt=cur_datetime, closed=False))
-
-    context = {'listings': listings}
+    """List active listings (ending soonest first), one page at a time."""
+    cur_datetime = current_datetime()
+    price_form, price_filters, page_query = price_range(request)
+    # Single query over listings (no per-user queries), status of the
+    # request time computed by database
+    listings = ListingModel.objects.active(cur_datetime).with_status(
+        cur_datetime).filter(**price_filters)
+    try:
+        page = keyset_paginate(listings, 'end_datetime',
+                               cursor=request.GET.get('cursor'),
+                               size=page_size(request))
+    except InvalidCursor:
+        raise Http404()
+
+    # Page is lazy: no query if list fragment is cached
+    context = {'listings': page, 'page': page,
+               'price_form': price_form, 'page_query': page_query,
+               'listings_version': listings_version(),
+               'cache_timeout': LIST_FRAGMENT_TIMEOUT,
+               'watched_ids': list(watched_ids(request.user)),
+               'Status': ListingModel.Status}
     return render(request, "auctions/index.html", context)
 
 
@@ -98,19 +137,23 @@ def register(request):
         return render(request, "auctions/register.html")
 
 
+@cache_headers
+@condition(etag_func=listing_etag, last_modified_func=listing_last_modified)
 def listing(request, listing_id):
     """Render full listing webpage (render listing model)."""
     # Get specific listing by primary key (listing id)
-    l = ListingModel.objects.get(pk=listing_id)
-    context = {'listing': l}
+    l = ListingModel.objects.with_min_bid().get(pk=listing_id)
+    # Seller, comments etc. are fetched only if fragment isn't cached
+    context = {'listing': l, 'listing_version': listing_version(l.pk),
+               'cache_timeout': FRAGMENT_TIMEOUT}
 
     if l.active:
         # Form for entering bid price
         bid_form = BidForm()
-        bid_form.fields['bid'].widget.attrs['min'] = l.starting_price + 1
+        bid_form.fields['bid'].widget.attrs['min'] = l.min_bid
         context['bid_form'] = bid_form
-    elif l.bid is not None:
-        if l.bid.bidder == request.user:
+    elif l.high_bidder_id is not None:
+        if l.high_bidder_id == request.user.id:
             messages.success(
                 request, _(f"Congradulations. You won this listing by ${l.current_bid}!"))
     else:
@@ -120,21 +163,59 @@ def listing(request, listing_id):
     comment_form = CommentForm()
     comment_form.fields['comment'].widget.attrs['class'] = 'form-control'
     context['comment_form'] = comment_form
-    # Listing comments
-    comments = l.comments.all()
-    context['comments'] = comments
-    # Watchlist status
-    is_watcher = l.watchers.filter(pk=request.user.id).exists()
-    context['is_watcher'] = is_watcher
+    # First page of listing comments (lazy, fetched if not cached)
+    context['comments'] = comments_page(l.pk)
+    context['listing_id'] = l.pk
+    # Watchlist status (cached set of user watched ids)
+    context['is_watcher'] = l.pk in watched_ids(request.user)
     return render(request, 'auctions/listings/listing.html', context)
 
 
+def comments_page(listing_id, cursor=None, size=COMMENTS_PAGE_SIZE):
+    """KeysetPage of listing comments, newest first."""
+    comments = CommentModel.objects.filter(
+        listing=listing_id).select_related('user')
+    return keyset_paginate(comments, 'post_datetime', cursor, size,
+                           descending=True)
+
+
+def listing_comments(request, listing_id):
+    """Next page of listing comments: HTML fragment or JSON (Accept)."""
+    try:
+        page = comments_page(listing_id, request.GET.get('cursor'),
+                             page_size(request, COMMENTS_PAGE_SIZE))
+    except InvalidCursor:
+        raise Http404()
+    if 'application/json' in request.headers.get('Accept', ''):
+        return JsonResponse({
+            'results': [serialize_comment(c) for c in page],
+            'next': page.next_cursor})
+    return render(request, 'auctions/listings/comments.html',
+                  {'comments': page, 'listing_id': listing_id})
+
+
+@login_required(login_url='/login/')
+def listing_bids(request, listing_id):
+    """Bid history of listing (newest first) for its seller and staff."""
+    l = get_object_or_404(ListingModel.objects.only('title', 'seller'),
+                          pk=listing_id)
+    if not can_view_bids(request.user, l):
+        raise PermissionDenied()
+    try:
+        page = bid_history(l.pk, request.GET.get('cursor'), page_size(request))
+    except InvalidCursor:
+        raise Http404()
+    return render(request, 'auctions/listings/bids.html',
+                  {'listing': l, 'bids': page, 'page': page})
+
+
 @login_required(login_url='/login/')
 def add_listing(request):
     """Render form to create new listing."""
     if request.method == 'POST':
         # Fill form with data
-        form = ListingForm(data=request.POST or None)
+        form = ListingForm(data=request.POST or None,
+                           files=request.FILES or None)
         # Validate form data
         if form.is_valid():
             # Loged in AUTH_USER_MODEL user instance
@@ -191,7 +272,8 @@ def update_listing(request, listing_id):
 
     if request.method == 'POST':
         # Modify instance with new request data
-        form = ListingForm(data=request.POST, instance=l)
+        form = ListingForm(data=request.POST, files=request.FILES,
+                           instance=l)
 
         # Validate new data
         form.full_clean()
@@ -226,8 +308,7 @@ def close_listing(request, listing_id):
     if not l.active:
         messages.info(request, _("Listing is already closed"))
     else:
-        l.closed = True
-        l.save()
+        l.close()
         messages.info(request, _("Closed the listing"))
     return redirect(reverse(listing, args=[listing_id]))
 
@@ -236,9 +317,10 @@ def close_listing(request, listing_id):
 def my_listings(request):
     """Return listings of the requesting user."""
     # Get user listings
-    listings = ListingModel.objects.filter(seller=request.user)
+    listings = ListingModel.objects.filter(
+        seller=request.user).with_status()
 
-    context = {'listings': listings}
+    context = {'listings': listings, 'Status': ListingModel.Status}
     return render(request, 'auctions/listings/listings.html', context)
 
 
@@ -248,57 +330,40 @@ def bid(request, listing_id):
     User request to bid on listing (login is required).
 
     Validate:
-    1. Validate user (loged in, not owner)  - Http404
+    1. Validate bid form (number)           - error message
     2. Validate listing existence           - Http404
-    3. Validate listing activity            - error message
+    3. Validate listing activity, bidder
+       and bid amount (bidding.place_bid)   - error message
     """
     # Bidding functionality
     if request.method == 'POST':
-        l = ListingModel.objects.get(pk=listing_id)
-        # Check weather this listing really exists
-        if l is None:
-            raise Http404()
-
-        if not l.active:
-            messages.error(request, _("Listing is not active to bid."))
-            return redirect(reverse('listing', args=[listing_id]))
-
-        # None instead of empty QueryDict()
-        bid_form = BidForm(data=request.POST or None)
-        bid_form.full_clean()
-
-        # Custom form validation
-        if int(request.POST['bid']) < l.current_bid + 1:
-            bid_form.add_error('bid', ValidationError(
-                _('Bid must be >= %(current_bid)s - current bid'),
-                params={'current_bid': l.current_bid}
-            ))
-
-        if not bid_form.errors and bid_form.is_bound:
-            # Save bid instance
-            bid = bid_form.save(commit=False)
-            bid.listing = l
-            bid.bidder = request.user
-            # Validate new fields (excluded from form initialy)
-            try:
-                # Validate fields, form and field uniqueness
-                bid.full_clean()  # or: bid.clean()
-            except ValidationError as e:
-                messages.error(request, e.messages[0])
-            else:
-                bid.save()
-                messages.info(request, f"Bid {bid}")
-
-            # redirect to ./listings/<listing_id>
-            return redirect(reverse('listing', args=[listing_id]))
-        else:
+        bid_form = BidForm(data=request.POST)
+        if not bid_form.is_valid():
             # Send error messages throught Django messages framework
-            for error in bid_form.fields['bid'].errors:
+            for error in bid_form.errors.get('bid', []):
                 messages.error(request, f'bid: {error}')
             for error in bid_form.non_field_errors():
-                message.error(request, str(error))
+                messages.error(request, str(error))
+            return redirect(reverse('listing', args=[listing_id]))
+
+        try:
+            # Validate and save bid under listing row lock
+            result = place_bid(listing_id, request.user,
+                               bid_form.cleaned_data['bid'],
+                               proxy=bid_form.cleaned_data['automatic'])
+        except ListingModel.DoesNotExist:
+            raise Http404()
+
+        if result.accepted:
+            messages.info(request, result.message or f"Bid {result.bid}")
+        elif result.placed:
+            # Outbid by an automatic bid of the high bidder
+            messages.warning(request, result.message)
+        else:
+            messages.error(request, result.message)
 
-            return redirect(reverse(listing, args=[listing_id]))
+    # redirect to ./listings/<listing_id>
+    return redirect(reverse('listing', args=[listing_id]))
 
 
 @login_required
@@ -312,50 +377,125 @@ def comment(request, listing_id):
             comment.listing = l
             comment.user = request.user
             comment.save()
-            return redirect(reverse('listing', args=[listing_id]))
         else:
-            for field, error in comment_form.errors:
-                message.error(request, str(error))
-            return redirect(reverse(listing, args=[listing_id]))
+            for error in comment_form.errors.get('comment', []):
+                messages.error(request, f'comment: {error}')
+
+    return redirect(reverse('listing', args=[listing_id]))
 
 
 @login_required
 def watch(request, listing_id):
     """Switch state of watchlist for passed listing."""
-    l = get_object_or_404(ListingModel, pk=listing_id)
-
     # If listing is watchlisted already
-    if request.user.watchlist.filter(pk=listing_id).exists():
-        request.user.watchlist.remove(l)
+    if listing_id in watched_ids(request.user):
+        request.user.watchlist.remove(listing_id)
     # Listing is new
     else:
+        l = get_object_or_404(ListingModel, pk=listing_id)
         request.user.watchlist.add(l)
 
     return redirect(reverse('listing', args=[listing_id]))
 
 
 @login_required
+@cache_headers
+@condition(etag_func=watchlist_etag)
 def watchlist(request):
-    """Returns all watchlisted user listings."""
-    watchlist_listings = request.user.watchlist.all()
+    """Returns watchlisted user listings (ending soonest first)."""
+    # Single query: bid columns are stored on listing, status annotated
+    listings = ListingModel.objects.filter(
+        watchers=request.user).with_status()
+    try:
+        page = keyset_paginate(listings, 'end_datetime',
+                               cursor=request.GET.get('cursor'),
+                               size=page_size(request))
+    except InvalidCursor:
+        raise Http404()
     return render(request, 'auctions/watchlist.html',
-                  {'watchlist_listings': watchlist_listings})
+                  {'watchlist_listings': page, 'page': page,
+                   'Status': ListingModel.Status})
+
+
+@login_required
+def watchlist_bulk(request):
+    """Watch/unwatch many listings with one request."""
+    if request.method != 'POST':
+        return redirect(reverse('watchlist'))
+
+    form = WatchlistBulkForm(request.POST)
+    if form.is_valid():
+        listings = form.cleaned_data['listings']
+        # Single INSERT/DELETE for all listings
+        if form.cleaned_data['action'] == WatchlistBulkForm.ADD:
+            request.user.watchlist.add(*listings)
+            messages.success(request, _("Listings added to watchlist."))
+        else:
+            request.user.watchlist.remove(*listings)
+            messages.success(request, _("Listings removed from watchlist."))
+    else:
+        messages.error(request, _("No valid listings selected."))
+    return redirect(reverse('watchlist'))
 
 
 def listing_categories(request):
     """Render all categories as links to filter by them."""
-    categories = ListingModel.Category.choices
+    # Open listing count and price range per category (cached)
+    stats = category_stats(ListingModel.Category.values)
+    categories = [(value, label, stats[value])
+                  for value, label in ListingModel.Category.choices]
     return render(request, 'auctions/listings/categories.html',
                   {'categories': categories})
 
 
+@cache_headers
+@condition(etag_func=listings_etag)
 def listing_category(request, category):
-    """Display all listing with category."""
+    """Display open listings of category (ending soonest first)."""
     if category not in ListingModel.Category.values:
         raise Http404()
 
-    listings = ListingModel.objects.filter(category=category)
+    price_form, price_filters, page_query = price_range(request)
+    listings = ListingModel.objects.filter(
+        category=category, closed=False, **price_filters).with_status()
+    try:
+        page = keyset_paginate(listings, 'end_datetime',
+                               cursor=request.GET.get('cursor'),
+                               size=page_size(request))
+    except InvalidCursor:
+        raise Http404()
     category_label = dict(ListingModel.Category.choices)[category]
 
     return render(request, 'auctions/listings/category.html',
-                  {'listings': listings, 'category_label': category_label})
+                  {'listings': page, 'page': page,
+                   'category_label': category_label,
+                   'category': category,
+                   'price_form': price_form, 'page_query': page_query,
+                   'listings_version': listings_version(),
+                   'cache_timeout': LIST_FRAGMENT_TIMEOUT,
+                   'watched_ids': list(watched_ids(request.user)),
+                   'Status': ListingModel.Status})
+
+
+def search(request):
+    """Search listings by title/description text and filters."""
+    form = SearchForm(request.GET or None)
+    page = None
+    if form.is_valid():
+        filters = dict(form.cleaned_data)
+        query = filters.pop('q')
+        try:
+            page = search_listings(query, cursor=request.GET.get('cursor'),
+                                   size=page_size(request), **filters)
+        except InvalidCursor:
+            raise Http404()
+
+    # Keep search parameters in next page links
+    page_query = request.GET.copy()
+    page_query.pop('cursor', None)
+    page_query.pop('size', None)
+    return render(request, 'auctions/listings/search.html',
+                  {'form': form, 'page': page,
+                   'page_query': page_query.urlencode(),
+                   'watched_ids': watched_ids(request.user),
+                   'Status': ListingModel.Status})
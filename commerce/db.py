@@ -0,0 +1,178 @@
+"""
+Database layer configuration.
+
+- databases(): DATABASES of MySQL primary and read replicas from
+  environment, with persistent connections (CONN_MAX_AGE) checked
+  before reuse (CONN_HEALTH_CHECKS, DatabaseMiddleware) and optional
+  process-wide connection pool (DB_POOL, engine commerce.mysql_pool).
+- ReplicaRouter: reads of REPLICA_VIEWS (settings, view names) go to a
+  replica, everything else (writes, other views) to the primary.
+- DatabaseMiddleware: enables replica reads per request and gives
+  read-your-writes: request which wrote to the primary (bid, comment,
+  watch, login, ...) sets REPLICA_PIN_COOKIE, client's reads stay on
+  the primary for REPLICA_PIN_SECONDS (longer than replication lag).
+"""
+import os
+import queue
+import random
+import threading
+import time
+
+from asgiref.local import Local
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+REPLICA_PIN_COOKIE = 'db_primary'
+# Connection idle for longer is pinged before reuse (seconds)
+HEALTH_CHECK_INTERVAL = 5
+
+# Request (thread or async task) routing state
+_state = Local()
+
+
+def databases(environ=os.environ):
+    """
+    DATABASES from environment (defaults: docker-compose mysql service).
+
+    DB_REPLICA_HOSTS - comma separated hosts of read replicas;
+    DB_CONN_MAX_AGE - seconds to keep connection open (0 - per request);
+    DB_POOL=1 - return closed connections to pool of DB_POOL_SIZE.
+    """
+    pool = environ.get('DB_POOL', '') not in ('', '0')
+    primary = {
+        'ENGINE': ('commerce.mysql_pool' if pool
+                   else 'django.db.backends.mysql'),
+        'HOST': environ.get('DB_HOST', 'mysql'),  # container hostname
+        'PORT': int(environ.get('DB_PORT', 3306)),
+        'NAME': environ.get('DB_NAME', 'mysql'),
+        'USER': environ.get('DB_USER', 'mysql'),
+        'PASSWORD': environ.get('DB_PASSWORD', 'mysql'),
+        'CONN_MAX_AGE': int(environ.get('DB_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': True,
+        'POOL_SIZE': int(environ.get('DB_POOL_SIZE', 10)),
+    }
+    result = {DEFAULT_DB_ALIAS: primary}
+    hosts = [h for h in environ.get('DB_REPLICA_HOSTS', '').split(',') if h]
+    for number, host in enumerate(hosts, 1):
+        # Tests read the primary test database
+        result[f'replica{number}'] = dict(primary, HOST=host, REPLICA=True,
+                                          TEST={'MIRROR': DEFAULT_DB_ALIAS})
+    return result
+
+
+def replica_aliases():
+    return [alias for alias, options in connections.settings.items()
+            if options.get('REPLICA')]
+
+
+def replica_reads():
+    """Whether reads of current request go to replicas."""
+    return getattr(_state, 'replica_reads', False)
+
+
+class ReplicaRouter:
+    """Route reads of replica enabled requests to a random replica."""
+
+    def db_for_read(self, model, **hints):
+        if replica_reads():
+            return random.choice(replica_aliases())
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        # Also objects read from replica are saved to the primary
+        _state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        return True
+
+
+def check_connections():
+    """Close persistent connections dropped by server while idle."""
+    now = time.monotonic()
+    for connection in connections.all():
+        if (connection.connection is None or
+                not connection.settings_dict.get('CONN_HEALTH_CHECKS') or
+                connection.in_atomic_block):
+            continue
+        last_used = getattr(connection, 'health_checked_at', now)
+        if now - last_used > HEALTH_CHECK_INTERVAL and \
+                not connection.is_usable():
+            connection.close()
+        connection.health_checked_at = now
+
+
+class DatabaseMiddleware:
+    """Health checks of persistent connections and replica routing."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        check_connections()
+        _state.replica_reads = False
+        _state.wrote = False
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.replica_reads = False
+        if _state.wrote:
+            response.set_cookie(
+                REPLICA_PIN_COOKIE, '1', httponly=True, samesite='Lax',
+                max_age=getattr(settings, 'REPLICA_PIN_SECONDS', 10))
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        match = request.resolver_match
+        _state.replica_reads = (
+            request.method in ('GET', 'HEAD') and
+            REPLICA_PIN_COOKIE not in request.COOKIES and
+            match is not None and
+            match.view_name in getattr(settings, 'REPLICA_VIEWS', ()) and
+            bool(replica_aliases()))
+
+
+class PooledConnectionMixin:
+    """
+    DatabaseWrapper mixin: closed connection goes back to process-wide
+    pool of its database (rolled back) and is reused (after a ping) by
+    the next connect() of any thread, up to POOL_SIZE idle connections.
+    """
+    _pools = {}
+    _pools_lock = threading.Lock()
+
+    def _pool(self):
+        # Forked workers don't share parent connections
+        key = (os.getpid(), self.alias)
+        with self._pools_lock:
+            if key not in self._pools:
+                self._pools[key] = queue.LifoQueue(
+                    self.settings_dict.get('POOL_SIZE', 10))
+            return self._pools[key]
+
+    def get_new_connection(self, conn_params):
+        pool = self._pool()
+        while True:
+            try:
+                connection = pool.get_nowait()
+            except queue.Empty:
+                return super().get_new_connection(conn_params)
+            try:
+                connection.cursor().execute('SELECT 1')
+                return connection
+            except self.Database.Error:
+                # Dropped by server while pooled
+                try:
+                    connection.close()
+                except self.Database.Error:
+                    pass
+
+    def _close(self):
+        if self.connection is None:
+            return
+        try:
+            self.connection.rollback()
+            self._pool().put_nowait(self.connection)
+        except (queue.Full, self.Database.Error):
+            super()._close()
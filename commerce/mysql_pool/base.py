@@ -0,0 +1,8 @@
+"""MySQL backend with process-wide connection pool (commerce.db)."""
+from django.db.backends.mysql import base
+
+from commerce.db import PooledConnectionMixin
+
+
+class DatabaseWrapper(PooledConnectionMixin, base.DatabaseWrapper):
+    pass
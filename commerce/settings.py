@@ -10,13 +10,19 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/3.0/ref/settings/
 """
 
-# SECURITY WARNING: keep the secret key used in production secret!
-from .secret_key import SECRET_KEY
+from . import db
 from django.contrib.messages import constants
 from django.utils.translation import gettext_lazy as _
 
 import os
 
+# SECURITY WARNING: keep the secret key used in production secret!
+try:
+    from .secret_key import SECRET_KEY
+except ImportError:
+    # No local key file: from environment (production profile)
+    SECRET_KEY = os.environ.get('SECRET_KEY', '')
+
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
@@ -53,6 +59,8 @@ MIDDLEWARE = [
     'whitenoise.middleware.WhiteNoiseMiddleware',
 
     'django.middleware.security.SecurityMiddleware',
+    # Single "now" of the request (auctions.util_datetime)
+    'auctions.util_datetime.CurrentTimeMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.locale.LocaleMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -60,8 +68,24 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    # Connection health checks, replica reads (after session middleware)
+    'commerce.db.DatabaseMiddleware',
 ]
 
+# Per-request instrumentation (auctions.instrumentation), opt-in:
+# metrics at /metrics for staff and INTERNAL_IPS, cProfile of every
+# INSTRUMENTATION_PROFILE_EVERY-th request (0 - never)
+INSTRUMENTATION = os.environ.get('INSTRUMENTATION', '') == '1'
+INSTRUMENTATION_PROFILE_EVERY = int(
+    os.environ.get('INSTRUMENTATION_PROFILE_EVERY', 0))
+INSTRUMENTATION_PROFILE_DIR = os.environ.get(
+    'INSTRUMENTATION_PROFILE_DIR', os.path.join(BASE_DIR, 'profiles'))
+INTERNAL_IPS = [ip for ip in os.environ.get(
+    'INTERNAL_IPS', '127.0.0.1').split(',') if ip]
+if INSTRUMENTATION:
+    # Measures everything but static files (after whitenoise)
+    MIDDLEWARE.insert(1, 'auctions.instrumentation.InstrumentationMiddleware')
+
 ROOT_URLCONF = 'commerce.urls'
 
 TEMPLATES = [
@@ -75,6 +99,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',  # access user from template
                 'django.contrib.messages.context_processors.messages',
+                'auctions.context_processors.watchlist',
             ],
         },
     },
@@ -86,18 +111,44 @@ WSGI_APPLICATION = 'commerce.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/3.0/ref/settings/#databases
 
-DATABASES = {
-    # mysql -h 127.0.0.1 -P 3306 -u root -p
+# MySQL primary (mysql -h 127.0.0.1 -P 3306 -u root -p) and read
+# replicas, persistent/pooled connections: see commerce/db.py
+
+DATABASES = db.databases()
+DATABASE_ROUTERS = ['commerce.db.ReplicaRouter']
+
+# Views reading replicas (url names with namespace), unless client
+# wrote recently
+REPLICA_VIEWS = ['index', 'listing', 'listing_category', 'watchlist']
+# Client reads the primary for this long after a write (seconds)
+REPLICA_PIN_SECONDS = 10
+
+# Cache (rendered page fragments)
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+# Local-memory by default, any Django cache backend via environment
+# (e.g. CACHE_BACKEND=django.core.cache.backends.memcached.PyMemcacheCache)
+
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.mysql',
-        'HOST': 'mysql',  # mysql - container hostname
-        'PORT': 3306,
-        'NAME': 'mysql',
-        'USER': 'mysql',
-        'PASSWORD': 'mysql',
+        'BACKEND': os.environ.get(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', 'auctions'),
     }
 }
 
+# Email (notifications, manage.py send_notifications)
+# https://docs.djangoproject.com/en/3.2/topics/email/
+# Console by default, SMTP etc. via environment (tests use locmem)
+
+EMAIL_BACKEND = os.environ.get(
+    'EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
+EMAIL_HOST = os.environ.get('EMAIL_HOST', 'localhost')
+EMAIL_PORT = int(os.environ.get('EMAIL_PORT', 25))
+DEFAULT_FROM_EMAIL = os.environ.get(
+    'DEFAULT_FROM_EMAIL', 'auctions@localhost')
+# Absolute links in notifications
+AUCTIONS_SITE_URL = os.environ.get('SITE_URL', 'http://localhost:8000')
+
 # User model for authentication (default: auth.User)
 AUTH_USER_MODEL = 'auctions.User'
 
@@ -150,6 +201,10 @@ STATICFILES_DIRS = []
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
+# Listing photos and their resized variants (auctions.images)
+MEDIA_URL = '/media/'
+MEDIA_ROOT = os.environ.get('MEDIA_ROOT', os.path.join(BASE_DIR, 'media'))
+
 
 # Change default message tags tex
 MESSAGE_TAGS = {
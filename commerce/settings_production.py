@@ -0,0 +1,69 @@
+"""
+Production settings profile
+(DJANGO_SETTINGS_MODULE=commerce.settings_production).
+
+Everything environment specific comes from environment variables:
+SECRET_KEY (required), ALLOWED_HOSTS (comma separated), DEBUG,
+database (commerce/db.py), REDIS_URL, email (commerce/settings.py).
+Served by gunicorn (gunicorn.conf.py), static files by whitenoise.
+"""
+import os
+
+from django.core.exceptions import ImproperlyConfigured
+
+from .settings import *  # noqa: F401,F403
+from .settings import MIDDLEWARE, TEMPLATES
+
+DEBUG = os.environ.get('DEBUG', '') == '1'
+
+SECRET_KEY = os.environ.get('SECRET_KEY', '')
+if not SECRET_KEY:
+    raise ImproperlyConfigured("SECRET_KEY environment variable is not set.")
+
+ALLOWED_HOSTS = [host for host in os.environ.get(
+    'ALLOWED_HOSTS', 'localhost').split(',') if host]
+
+# Server workers (and background workers) are separate processes: cache
+# (fragment versions, watched ids, category counts) and event broker
+# are shared through Redis
+REDIS_URL = os.environ.get('REDIS_URL', 'redis://localhost:6379/0')
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND',
+                                  'django_redis.cache.RedisCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', REDIS_URL),
+    }
+}
+AUCTIONS_BROKER = os.environ.get('AUCTIONS_BROKER',
+                                 'auctions.broker.RedisBroker')
+
+# Compress responses (static files are pre-compressed by whitenoise)
+_security = MIDDLEWARE.index('django.middleware.security.SecurityMiddleware')
+MIDDLEWARE = MIDDLEWARE[:_security + 1] + \
+    ['django.middleware.gzip.GZipMiddleware'] + MIDDLEWARE[_security + 1:]
+
+# Templates are compiled once per process
+TEMPLATES = [dict(TEMPLATES[0], APP_DIRS=False, OPTIONS=dict(
+    TEMPLATES[0]['OPTIONS'], loaders=[
+        ('django.template.loaders.cached.Loader', [
+            'django.template.loaders.filesystem.Loader',
+            'django.template.loaders.app_directories.Loader',
+        ]),
+    ]))]
+
+# Static files have hashed names (manifest storage, collectstatic):
+# whitenoise serves them with far-future cache headers
+WHITENOISE_MAX_AGE = 365 * 24 * 3600
+
+# HTTPS terminated by proxy in front of the application server
+SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https')
+SESSION_COOKIE_SECURE = os.environ.get('SECURE_COOKIES', '1') == '1'
+CSRF_COOKIE_SECURE = SESSION_COOKIE_SECURE
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {'console': {'class': 'logging.StreamHandler'}},
+    'root': {'handlers': ['console'],
+             'level': os.environ.get('LOG_LEVEL', 'INFO')},
+}
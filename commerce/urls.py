@@ -15,10 +15,22 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import include, path
+from django.conf import settings
 from django.conf.urls.i18n import i18n_patterns
 
+from auctions import images, instrumentation
+
 urlpatterns = i18n_patterns(
     path("admin/", admin.site.urls),
     path("rosetta/", include("rosetta.urls")),
     path("", include("auctions.urls"))
-)
\ No newline at end of file
+) + [
+    # JSON API (clients don't follow language redirects)
+    path("api/v1/", include("auctions.api_urls")),
+    # Prometheus metrics (settings.INSTRUMENTATION), scraped without
+    # language prefix
+    path("metrics", instrumentation.metrics, name="metrics"),
+    # Listing photos (language independent, cached forever)
+    path(f"{settings.MEDIA_URL.strip('/')}/<path:path>", images.media,
+         name="media"),
+]
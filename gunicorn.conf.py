@@ -0,0 +1,71 @@
+"""
+Gunicorn configuration: production serving of commerce project.
+
+    gunicorn -c gunicorn.conf.py
+
+SERVER_MODE=wsgi (default) - threaded sync workers of commerce.wsgi;
+SERVER_MODE=asgi - uvicorn workers of commerce.asgi (listing event
+streams hold a connection each, so async workers serve them).
+WEB_CONCURRENCY and THREADS override worker counts derived from CPUs.
+Several workers need cache and event broker shared between processes
+(settings_production), startup is refused otherwise.
+"""
+import multiprocessing
+import os
+
+
+def worker_count(mode, cpus, environ=os.environ):
+    """Worker processes: 2 * CPUs + 1 (sync), one per CPU (async)."""
+    if environ.get('WEB_CONCURRENCY'):
+        return int(environ['WEB_CONCURRENCY'])
+    return cpus if mode == 'asgi' else 2 * cpus + 1
+
+
+def process_local_state(settings):
+    """Settings of per-process state, stale or lost in other workers."""
+    problems = []
+    for alias, cache in settings.CACHES.items():
+        if cache['BACKEND'].endswith('.LocMemCache'):
+            problems.append(f"{alias} cache is LocMemCache")
+    broker = getattr(settings, 'AUCTIONS_BROKER',
+                     'auctions.broker.InProcessBroker')
+    if broker.endswith('.InProcessBroker'):
+        problems.append("event broker is InProcessBroker")
+    return problems
+
+
+def on_starting(server):
+    if server.cfg.workers > 1:
+        from django.conf import settings
+        problems = process_local_state(settings)
+        if problems:
+            raise RuntimeError(
+                f"{server.cfg.workers} workers with per-process state "
+                f"({', '.join(problems)}): configure shared cache and "
+                "broker (REDIS_URL) or set WEB_CONCURRENCY=1.")
+
+
+mode = os.environ.get('SERVER_MODE', 'wsgi')
+os.environ.setdefault('DJANGO_SETTINGS_MODULE',
+                      'commerce.settings_production')
+
+bind = os.environ.get('BIND', '0.0.0.0:8000')
+workers = worker_count(mode, multiprocessing.cpu_count())
+if mode == 'asgi':
+    wsgi_app = 'commerce.asgi:application'
+    worker_class = 'uvicorn.workers.UvicornWorker'
+else:
+    wsgi_app = 'commerce.wsgi:application'
+    worker_class = 'gthread'
+    threads = int(os.environ.get('THREADS', 4))
+
+# Load application once in master, forked workers share its memory
+# (database connections are opened by workers, after fork)
+preload_app = True
+# Recycle workers against slow memory growth
+max_requests = int(os.environ.get('MAX_REQUESTS', 2000))
+max_requests_jitter = max_requests // 10
+timeout = 30
+# Keep-alive connections behind a proxy
+keepalive = 5
+accesslog = '-'